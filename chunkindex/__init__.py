@@ -12,6 +12,17 @@
 #See the License for the specific language governing permissions and
 #limitations under the License.
 
-from chunkindex.core.hdf import create_index, read_slice
+from chunkindex.core.hdf import create_index, read_slice, read_slice_async
+from chunkindex.core.index_cache import IndexCache
+from chunkindex.core.reader import ChunkIndexReader
 from chunkindex.core.zran_reference_filesystem import ZranReferenceFileSystem
-from chunkindex.core.zran_zarr_store import ZranStore
+try:
+    # The zarr v2 store API has been removed from zarr 3
+    from chunkindex.core.zran_zarr_store import ZranStore
+except ImportError:
+    pass
+try:
+    # The zarr v3 store API is only provided by zarr 3
+    from chunkindex.core.zran_zarr3_store import ZranStoreV3
+except ImportError:
+    pass
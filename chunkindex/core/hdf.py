@@ -12,50 +12,119 @@
 #See the License for the specific language governing permissions and
 #limitations under the License.
 import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import Iterable, BinaryIO
 from math import ceil
 import h5py
 import numpy as np
-import chunkindex.core.zran_xarray
-import chunkindex.core.zran_h5py
 import chunkindex.core.zran_index
+import chunkindex.core.index_writer
+import chunkindex.core.index_format
+import chunkindex.core.index_cache
+import chunkindex.core.reader
 from chunkindex.util.multi_dimensional_slice import MultiDimensionalSlice
 
 SPAN = 102400  # 100kB
 WINDOW_LENGTH = chunkindex.core.zran_index.WINDOW_LENGTH
-MASKANDSCALE = True
-METHOD = 'h5py'
+MASKANDSCALE = chunkindex.core.reader.MASKANDSCALE
+METHOD = chunkindex.core.reader.METHOD
+METADATA = chunkindex.core.reader.METADATA
+MAX_WORKERS = chunkindex.core.reader.MAX_WORKERS
+MAX_GAP = chunkindex.core.reader.MAX_GAP
+INDEX_VERSION = chunkindex.core.index_format.INDEX_VERSION
+TASKS_PER_WORKER = 4  # number of tasks per worker in a parallel index build
+
+# Cache of the opened index files shared by the calls to read_slice(), for the index files given by their path
+INDEX_CACHE = chunkindex.core.index_cache.IndexCache()
+
+
+def _default_cache(index: BinaryIO | str | os.PathLike) -> chunkindex.core.index_cache.IndexCache | None:
+    # Return the cache used when none is given: the shared cache for a path, None for a file object, which is then
+    # opened by the cache of the reader of the call and closed with it, so that the shared cache keeps no reference to
+    # the file objects of the callers
+    return INDEX_CACHE if isinstance(index, (str, os.PathLike)) else None
 
 
 def chunkid_str(chunk_offset: tuple[int], chunk_size: tuple[int]) -> str:
     return '.'.join([str(int(o / s)) for o, s in zip(chunk_offset, chunk_size)])
 
 
-def create_index(index_path: str | os.PathLike, dataset: str | os.PathLike, span=SPAN) -> None:
+def create_index(index_path: str | os.PathLike, dataset: str | os.PathLike, span=SPAN, workers: int = 1,
+                 version: int = INDEX_VERSION) -> None:
     """
     Build the indexes for each chunk of each variable of the input dataset and write the index generated into a netcdf
     file.
 
-    :param index_path: a file path or file-like object in which the index will be written as a netcdf file
-    :param dataset: a file path or file-like object of the NetCDF-4/HDF5 dataset.
+    When `workers` is greater than 1, the zran indexes of the chunks are built in a pool of processes. Each worker
+    opens the dataset, reads its own compressed chunks and builds their indexes, while the calling process is the
+    single writer of the index file. The chunks are written in the same order as in the sequential build so that
+    both produce the same index file.
+
+    :param index_path: a file path in which the index will be written as a netcdf file
+    :param dataset: a file path or file-like object of the NetCDF-4/HDF5 dataset (a file path is required when
+    `workers` is greater than 1).
     :param span: number of uncompressed bytes between the index points. Default: 100kB
+    :param workers: number of processes used to build the chunk indexes. None uses the number of CPUs. Default: 1
+    :param version: version of the layout of the index file (see chunkindex.core.index_format). Default: 2
     """
 
     if os.path.exists(index_path):
         raise FileExistsError(f"{index_path} already exists")
 
-    # Define the encoding options for the index windows
-    encoding = {
-        'window': {
-            'dtype': 'int8',
-            'zlib': True,
-            'complevel': 1,
-            'shuffle': False,
-            'chunksizes': [1, WINDOW_LENGTH]
-        }
-    }
+    if workers is None:
+        workers = os.cpu_count()
+
+    # List the chunks to index, then close the dataset before starting any worker process
+    with h5py.File(dataset) as ds:
+        variables = _list_chunks(ds)
+
+    # Open the index file once for the whole build
+    with chunkindex.core.index_writer.IndexWriter(index_path, version=version) as writer:
+
+        # Declare the variables to index
+        for name, _, chunk_grid, var_span, _, metadata in variables:
+            writer.add_variable(name, chunk_grid, var_span, metadata)
+
+        if workers <= 1:
+            # Sequential build: read and index the chunks one after another
+            with h5py.File(dataset) as ds:
+                for name, chunk_size, _, var_span, chunks, _ in variables:
+                    dsid = ds[name].id
+                    for chunk_offset, byte_offset in chunks:
+                        index = _index_chunk(dsid, chunk_offset, var_span)
+                        writer.write(_chunk_path(name, chunk_offset, chunk_size), index, byte_offset)
+            return
+
+        # Parallel build: split the chunks of each variable into tasks and let the workers build their indexes
+        tasks = []
+        for name, chunk_size, _, var_span, chunks, _ in variables:
+            batch = max(1, ceil(len(chunks) / (workers * TASKS_PER_WORKER)))
+            for i in range(0, len(chunks), batch):
+                tasks.append((name, chunk_size, var_span, chunks[i:i + batch]))
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dataset,)) as executor:
+            # The results are yielded in the order of the tasks, i.e. in the order of the sequential build
+            for (name, chunk_size, _, chunks), indexes in zip(tasks, executor.map(_index_chunks, tasks)):
+                for (chunk_offset, byte_offset), index in zip(chunks, indexes):
+                    writer.write(_chunk_path(name, chunk_offset, chunk_size), index, byte_offset)
+
+
+def _chunk_path(name: str, chunk_offset: tuple[int], chunk_size: tuple[int]) -> str:
+    # Define the name of the chunk: e.g. var/0.1
+    return name + '/' + chunkid_str(chunk_offset, chunk_size)
+
 
-    def _index_variable(name, item):
+def _list_chunks(ds: h5py.File) -> list[tuple]:
+    """
+    List the chunks of the variables to index in a dataset.
+
+    :param ds: the opened NetCDF-4/HDF5 dataset
+    :return: a list of (name, chunk size, chunk grid, span, chunks, metadata) tuples, one per variable to index, where
+    chunks is the list of the (chunk offset, byte offset) of the chunks of the variable.
+    """
+    variables = []
+
+    def _list_variable(name, item):
 
         # Do not process groups
         if isinstance(item, h5py.Group):
@@ -67,38 +136,86 @@ def create_index(index_path: str | os.PathLike, dataset: str | os.PathLike, span
 
         #  Only process regular variables
 
-        # Get the chunk size for that variable
-        chunk_size = item.chunks
         # Get the variable id to access low-level HDF5 API and iterate over its chunks
         dsid = item.id
         span = min(ceil(item.nbytes/dsid.get_num_chunks()/3), 2000000)
 
-        def gen_index(chunk):
-            # Read the compressed data from the chunk
-            compressed_data = dsid.read_direct_chunk(chunk.chunk_offset)[1]
-            # Create the zran index for that chunk with one index point every SPAN uncompressed bytes
-            index = chunkindex.core.zran_xarray.create_index(compressed_data, span=span)
-            # Define the name of the chunk: e.g. var/0.1
-            chunk_id = name + '/' + chunkid_str(chunk.chunk_offset, chunk_size)
-            # Write the zran_xarray index to the netcdf file
-            index.to_netcdf(index_path, group=chunk_id, mode="a", encoding=encoding)
+        # List the offsets of all the chunks in that variable, in the chunk grid and in the dataset
+        chunks = []
+        dsid.chunk_iter(lambda chunk: chunks.append((chunk.chunk_offset, chunk.byte_offset)))
 
-        # Loop over all the chunks in that variable
-        dsid.chunk_iter(gen_index)
+        # Compute the number of chunks along each dimension
+        chunk_grid = tuple(ceil(n / c) for n, c in zip(item.shape, item.chunks))
 
-    # Open the netCDF dataset
-    with h5py.File(dataset) as ds:
-        # Create an index for each variable in the dataset
-        ds.visititems(_index_variable)
+        variables.append((name, item.chunks, chunk_grid, span, chunks, _variable_metadata(item)))
+
+    # List the chunks of each variable in the dataset
+    ds.visititems(_list_variable)
+
+    return variables
+
+
+def _variable_metadata(item: h5py.Dataset) -> dict:
+    """
+    Return the metadata of a variable stored in the index to read its chunks without opening the dataset.
+
+    :param item: the h5py dataset of the variable
+    :return: the metadata as a dictionary of attributes (see chunkindex.core.index_format)
+    """
+    # Get the identifiers of the filters of the pipeline
+    plist = item.id.get_create_plist()
+    filters = [plist.get_filter(i)[0] for i in range(plist.get_nfilters())]
+
+    metadata = {
+        'shape': np.array(item.shape, dtype='i8'),
+        'chunks': np.array(item.chunks, dtype='i8'),
+        'dtype': np.dtype(item.dtype).str,
+        'filters': np.array(filters, dtype='i4'),
+    }
+    if item.fillvalue is not None and np.dtype(item.dtype).kind in 'biuf':
+        metadata['fill_value'] = np.array([item.fillvalue], dtype=item.dtype)
+
+    # Get the CF attributes
+    for name in chunkindex.core.index_format.CF_ATTRS:
+        if name in item.attrs:
+            metadata['cf' + name if name.startswith('_') else 'cf_' + name] = item.attrs[name]
+
+    return metadata
+
+
+def _index_chunk(dsid: h5py.h5d.DatasetID, chunk_offset: tuple[int], span: int) -> chunkindex.core.zran_index.Index:
+    # Read the compressed data from the chunk
+    compressed_data = dsid.read_direct_chunk(chunk_offset)[1]
+    # Create the zran index for that chunk with one index point every span uncompressed bytes
+    return chunkindex.core.zran_index.create_index(compressed_data, span=span)
+
+
+# Dataset opened once in each worker process of a parallel index build
+_worker_dataset = None
+
+
+def _init_worker(dataset: str | os.PathLike) -> None:
+    global _worker_dataset
+    _worker_dataset = h5py.File(dataset)
+
+
+def _index_chunks(task: tuple) -> list[chunkindex.core.zran_index.Index]:
+    # Build the indexes of a batch of chunks of one variable in a worker process
+    name, _, span, chunks = task
+    dsid = _worker_dataset[name].id
+    return [_index_chunk(dsid, chunk_offset, span) for chunk_offset, _ in chunks]
 
 
 def read_slice(dataset: BinaryIO, index: BinaryIO, var: str,
                nd_slice: MultiDimensionalSlice | Iterable[slice] | Iterable[tuple],
-               maskandscale=MASKANDSCALE, method: str=METHOD):
+               maskandscale=MASKANDSCALE, method: str=METHOD,
+               cache: chunkindex.core.index_cache.IndexCache = None, metadata: str = METADATA,
+               max_workers: int = MAX_WORKERS, max_gap: int = MAX_GAP):
     """
     Read a slice of data from within a variable in a HDF5 dataset.
 
-    This function makes use of zran index to read and uncompress partial chunks of data.
+    This function makes use of zran index to read and uncompress partial chunks of data. The metadata of the variable
+    is read at each call: use a ChunkIndexReader to read several slices from the same dataset.
 
     Usage example:
 
@@ -112,125 +229,68 @@ def read_slice(dataset: BinaryIO, index: BinaryIO, var: str,
     :param nd_slice: slice or multidimensional slice corresponding to the data to access in the variable `var`.
     :param maskandscale: turn on or off automatic conversion of data (apply scale_factor and add_offset) and masked Fillvalue
     :param method: select which lib to use h5py or xarray
+    :param cache: the cache of the opened index files and chunk indexes. Default: an index file given by its path is
+    kept open in INDEX_CACHE, a cache shared by all the calls of the process, and reopened when it has been modified.
+    An index file object is opened for the call only
+    :param metadata: read the metadata of the variable from the 'dataset' (with h5py) or from the 'index' (version 2),
+    in which case only the byte ranges of the chunks to decompress are read from the dataset
+    :param max_workers: number of threads that read and decompress the chunks of the slice at the same time
+    :param max_gap: the compressed ranges separated by at most max_gap bytes are read with a single request
     :return: the slice of data read.
     """
 
-    if not isinstance(nd_slice, MultiDimensionalSlice):
-        nd_slice = MultiDimensionalSlice(nd_slice)
+    if cache is None:
+        cache = _default_cache(index)
 
-    # Open the HDF5 dataset
-    with h5py.File(dataset) as ds:
+    # Read the metadata of the variable and the slice of data
+    with chunkindex.core.reader.ChunkIndexReader(dataset, index, maskandscale=maskandscale, method=method,
+                                                 cache=cache, metadata=metadata, max_workers=max_workers,
+                                                 max_gap=max_gap) as reader:
+        return reader.read(var, nd_slice)
 
-        # Get the dataset variable var
-        dsvar = ds[var]
-
-        # If maskandscale is activated get attribute
-        if maskandscale:
-            # Get the list of attribute of variable var
-            liste_att = dsvar.attrs.keys()
-            # get _FillValue attribute if exists
-            if '_FillValue' in liste_att:
-                fillvalue = dsvar.attrs['_FillValue'][0]
-            else:
-                fillvalue = False
-            # get scale_factor attribute if exists
-            if 'scale_factor' in liste_att:
-                scale_factor = dsvar.attrs['scale_factor'][0]
-            else:
-                scale_factor = 1
-            # get offset attribute if exists
-            if 'add_offset' in liste_att:
-                offset = dsvar.attrs['add_offset'][0]
-            else:
-                offset = 0
-
-        # Get the chunks shape
-        chunk_size = dsvar.chunks
-
-        # Get the number of bytes in one sample (bytes-per-sample)
-        bps = np.dtype(dsvar.dtype).itemsize
-
-        # Get the chunks locations in the dataset as slices
-        chunks_slices = list(dsvar.iter_chunks())
-
-        # Compute the intersection of the chunks with the ndslice we want to read
-        chunks_slice_intersections = [MultiDimensionalSlice(s).intersection_with(nd_slice) for s in chunks_slices]
-        # Get the id of the chunks for which the intersection is not empty
-        chunks_to_read = np.where([inter.samples > 0 for inter in chunks_slice_intersections])[0]
 
-        # Get the variable id to access low-level HDF5 API and iterate over its chunks
-        dsid = dsvar.id
-
-        # Create an array that fake that variable
-        fake_var = np.empty(dsvar.shape, dsvar.dtype)
-
-        # Loop over all the chunks of that variable
-        for chunk_id in chunks_to_read:
-
-            # Create an array that fake a chunk in that variable
-            fake_chunk = np.empty(chunk_size, dsvar.dtype)
-
-            # Get the chunk offset
-            chunk_info = dsid.get_chunk_info(chunk_id)
-            chunk_offset = chunk_info.chunk_offset
-
-            # Identify the slice to read in that chunk
-            chunk_slice_intersection = chunks_slice_intersections[chunk_id]
-
-            # Transpose this intersection relative to the origin of the chunk
-            # to get the location of the slice in the chunk
-            chunk_slice = chunks_slices[chunk_id]
-            chunk_origin = [s.start for s in chunk_slice]
-            slice_in_chunk = MultiDimensionalSlice(
-                [slice(s.start - o, s.stop - o, s.step) for s, o in zip(chunk_slice_intersection, chunk_origin)])
-
-            # Compute the index of the slice in the chunk
-            slice_indices = np.arange(0, np.prod(chunk_size)).reshape(chunk_size)[slice_in_chunk].flatten()
-            offset_in_chunk = slice_indices[0]
-            length_in_chunk = slice_indices[-1] - offset_in_chunk + 1
-
-            # ---------------------------------------------------------------------------------------------------------
-            # NOTE:
-            # By computing an offset and a length rather than utilizing only the indices identified in the list
-            # slice_indices, we make the choice to read all the sample from the first indice up to the last indice
-            # even if there are some sample that are not need (i.e. samples that are not identified in the list
-            # slice_indices). We make this choice to avoid multiple calls to the function decompress_shuffle().
-            # Indeed, each call to this function may imply an HTTP request with some latency. To minimize the latency
-            # we prefer minimizing the number of call to this function even if this implies downloading a few more data
-            # than strictly necessary.
-            # This behavior may change in the future.
-            # ---------------------------------------------------------------------------------------------------------
-
-            # Move the file pointer to the beginning of the chunk
-            dataset.seek(chunk_info.byte_offset)
-
-            # Define the name of the group in the index: e.g. var/0.1
-            index_group = var + '/' + chunkid_str(chunk_offset, chunk_size)
-            # Open the index
-            if method == 'h5py':
-                zindex = chunkindex.core.zran_h5py.open_index(index, group=index_group)
-            else:
-                zindex = chunkindex.core.zran_xarray.open_index(index, group=index_group)
-            # Decompress the data
-            decompressed_byte_array = zindex.decompress(dataset, offset_in_chunk*bps, length_in_chunk*bps,
-                                                            shuffle=dsvar.shuffle, bps=bps, whence=1)
-
-            # Fill the fake chunk with the decompressed data
-            if 'decompressed_byte_array' in locals():
-                fake_chunk = fake_chunk.flatten()
-                fake_chunk[range(offset_in_chunk, offset_in_chunk + length_in_chunk)] = np.frombuffer(
-                    decompressed_byte_array, dtype=dsvar.dtype)
-                fake_chunk = fake_chunk.reshape(chunk_size)
-                fake_var[chunk_slice_intersection] = fake_chunk[slice_in_chunk]
-
-    # Apply scale_factor, offset and mask Fillvalue data
-    if maskandscale:
-        if fillvalue:
-            # Apply mask and scaling
-            fake_var = np.ma.masked_where(fake_var==fillvalue, fake_var)*scale_factor + offset
-        else:
-            # No fillvalue, apply only scaling
-            fake_var = fake_var*scale_factor + offset
-
-
-    return fake_var[nd_slice]
+async def read_slice_async(dataset: str, index: BinaryIO, var: str,
+                           nd_slice: MultiDimensionalSlice | Iterable[slice] | Iterable[tuple],
+                           fs, maskandscale=MASKANDSCALE, method: str = METHOD,
+                           cache: chunkindex.core.index_cache.IndexCache = None, metadata: str = 'index',
+                           max_workers: int = MAX_WORKERS, max_gap: int = MAX_GAP):
+    """
+    Read a slice of data from within a variable in a HDF5 dataset through an asynchronous fsspec filesystem.
+
+    The compressed byte ranges needed by all the chunks of the slice are fetched at once with the filesystem, which
+    lets an HTTP or object store filesystem send the requests concurrently. The index is read with h5py and the chunks
+    are decompressed in threads, outside of the event loop.
+
+    Usage example:
+
+        fs = fsspec.filesystem('http', asynchronous=True)
+        data = await chunkindex.read_slice_async("https://host/dataset.nc", "dataset_index.nc",
+                                                 "my_nc_variable", ((300, 305), (300, 305)), fs)
+
+    :param dataset: the path of the NetCDF-4/HDF5 dataset in the filesystem `fs`.
+    :param index: a file path or an opened file object that contains the index data in netCDF-4 format.
+    :param var: the name of the dataset variable we want to access to.
+    :param nd_slice: slice or multidimensional slice corresponding to the data to access in the variable `var`.
+    :param fs: the asynchronous fsspec filesystem of the dataset
+    :param maskandscale: turn on or off automatic conversion of data (apply scale_factor and add_offset) and masked Fillvalue
+    :param method: select which lib to use h5py or xarray
+    :param cache: the cache of the opened index files and chunk indexes. Default: an index file given by its path is
+    kept open in INDEX_CACHE, a cache shared by all the calls of the process, and reopened when it has been modified.
+    An index file object is opened for the call only
+    :param metadata: read the metadata of the variable from the 'index' (version 2) or from the 'dataset', in which
+    case the path of the dataset must also be readable by h5py
+    :param max_workers: number of threads that read the index and decompress the chunks of the slice
+    :param max_gap: the compressed ranges separated by at most max_gap bytes are fetched with a single request
+    :return: the slice of data read.
+    """
+
+    if cache is None:
+        cache = _default_cache(index)
+
+    reader = chunkindex.core.reader.ChunkIndexReader(dataset, index, maskandscale=maskandscale, method=method,
+                                                     cache=cache, metadata=metadata, max_workers=max_workers, fs=fs,
+                                                     max_gap=max_gap)
+    try:
+        return await reader.read_async(var, nd_slice)
+    finally:
+        reader.close()
@@ -0,0 +1,209 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import contextlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any
+import h5py as h5
+from chunkindex.core import zran_h5py
+from chunkindex.core import zran_xarray
+from chunkindex.core import zran_index
+
+MAX_FILES = 16  # maximum number of index files kept open
+MAX_INDEXES = 1024  # maximum number of chunk indexes kept open
+
+
+class IndexCache:
+    """
+    Bounded LRU cache of the opened index files and chunk indexes.
+
+    Opening an index file implies reading the HDF5 superblock and B-trees, which costs several requests when the index
+    is read through HTTP. The IndexCache keeps the index files and the chunk indexes opened across the calls so that
+    they are opened only once.
+
+    The index files are identified by the object passed to open_index(): a file path or a file object. A file object
+    that has been closed is removed from the cache. The entries of a file path are removed when the file has been
+    modified or replaced since it was opened, which is checked with os.stat() at each call.
+
+    Usage example:
+
+        cache = IndexCache()
+        zindex = cache.open_index(index, 'var/0.1')
+        print(cache.opens_avoided)
+    """
+
+    def __init__(self, max_files: int = MAX_FILES, max_indexes: int = MAX_INDEXES):
+        """
+        Create an IndexCache object.
+
+        :param max_files: maximum number of index files kept open
+        :param max_indexes: maximum number of chunk indexes kept open
+        """
+        self.max_files = max_files
+        self.max_indexes = max_indexes
+        self.files = OrderedDict()
+        self.indexes = OrderedDict()
+        # os.stat() signature of the index files given by their path, when they were opened
+        self.signatures = {}
+        self.lock = threading.RLock()
+        # Counters of the cache hits and misses
+        self.file_hits = 0
+        self.file_misses = 0
+        self.index_hits = 0
+        self.index_misses = 0
+
+    @property
+    def opens_avoided(self) -> int:
+        """
+        Return the number of index openings that have been avoided thanks to the cache.
+        """
+        return self.index_hits + self.file_hits
+
+    @property
+    def stats(self) -> dict:
+        """
+        Return the counters of the cache.
+        """
+        return {
+            'file_hits': self.file_hits,
+            'file_misses': self.file_misses,
+            'index_hits': self.index_hits,
+            'index_misses': self.index_misses,
+            'opens_avoided': self.opens_avoided,
+        }
+
+    def open_index(self, index: Any, group: str, method: str = 'h5py') -> zran_index.Index:
+        """
+        Return the index of a chunk, opening the index file only if it is not already opened.
+
+        :param index: a file path or an opened file object that contains the index data in netCDF-4 format
+        :param group: the path of the chunk in the index, e.g. var/0.1
+        :param method: select which lib to use h5py or xarray
+        :return: the index of the chunk
+        """
+        with self.lock:
+            self._remove_changed(index)
+
+            # Look for the chunk index
+            key = (index, group, method)
+            zindex = self.indexes.get(key)
+            if zindex is not None:
+                self.indexes.move_to_end(key)
+                self.index_hits += 1
+                return zindex
+            self.index_misses += 1
+
+            # Remove the entries of the index files closed since the last call
+            self._remove_closed()
+
+            # Open the chunk index
+            if method == 'h5py':
+                zindex = zran_h5py.get_index(self._open_file(index), group)
+            else:
+                zindex = zran_xarray.open_index(index, group=group)
+
+            # Add it to the cache
+            self.indexes[key] = zindex
+            if len(self.indexes) > self.max_indexes:
+                _, evicted = self.indexes.popitem(last=False)
+                self._close_index(evicted)
+
+            return zindex
+
+    def open_file(self, index: Any) -> h5.File:
+        """
+        Return the h5py index file, opening it only if it is not already opened.
+
+        :param index: a file path or an opened file object that contains the index data in netCDF-4 format
+        :return: the opened h5py index file
+        """
+        with self.lock:
+            self._remove_changed(index)
+            return self._open_file(index)
+
+    def _open_file(self, index: Any) -> h5.File:
+        with self.lock:
+            f = self.files.get(index)
+            if f is not None:
+                self.files.move_to_end(index)
+                self.file_hits += 1
+                return f
+            self.file_misses += 1
+
+            # Open the index file and add it to the cache
+            f = h5.File(index)
+            self.files[index] = f
+            if len(self.files) > self.max_files:
+                self._remove_file(next(iter(self.files)))
+
+            return f
+
+    @staticmethod
+    def _signature(index: Any) -> tuple | None:
+        # Return the identity of the current version of an index file given by its path, None for a file object
+        if isinstance(index, (str, os.PathLike)):
+            with contextlib.suppress(OSError):
+                st = os.stat(index)
+                return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+        return None
+
+    def _remove_changed(self, index: Any) -> None:
+        # Remove the entries of an index file that has been modified or replaced since it was opened
+        signature = self._signature(index)
+        if signature is None:
+            return
+        if self.signatures.get(index, signature) != signature:
+            for key in [key for key in self.indexes if key[0] == index]:
+                self._close_index(self.indexes.pop(key))
+            if index in self.files:
+                self._remove_file(index)
+        self.signatures[index] = signature
+        # Forget the signatures of the files that are no longer in the cache
+        if len(self.signatures) > self.max_files + self.max_indexes:
+            opened = set(self.files) | {key[0] for key in self.indexes}
+            self.signatures = {i: sig for i, sig in self.signatures.items() if i in opened or i == index}
+
+    def _remove_file(self, index: Any) -> None:
+        # Remove the chunk indexes opened from that file, then close it
+        for key in [key for key in self.indexes if key[0] == index and key[2] == 'h5py']:
+            del self.indexes[key]
+        with contextlib.suppress(Exception):
+            self.files.pop(index).close()
+
+    def _remove_closed(self) -> None:
+        # Remove the index files whose file object has been closed by the caller
+        for index in [index for index in self.files if getattr(index, 'closed', False)]:
+            self._remove_file(index)
+        for key in [key for key in self.indexes if getattr(key[0], 'closed', False)]:
+            self._close_index(self.indexes.pop(key))
+
+    @staticmethod
+    def _close_index(zindex: zran_index.Index) -> None:
+        # Close the xarray datasets, h5py groups are closed with their file
+        if isinstance(zindex, zran_xarray.Index):
+            with contextlib.suppress(Exception):
+                zindex.ds.close()
+
+    def clear(self) -> None:
+        """
+        Close all the index files and chunk indexes of the cache.
+        """
+        with self.lock:
+            for zindex in self.indexes.values():
+                self._close_index(zindex)
+            self.indexes.clear()
+            for index in list(self.files):
+                self._remove_file(index)
+            self.signatures.clear()
@@ -0,0 +1,110 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Layout of the index files.
+
+Version 1: one group per chunk (e.g. var/0.1) that contains the zran index of that chunk as written by
+zran_xarray.Index.to_netcdf().
+
+Version 2: one group per variable (e.g. var) that contains the zran indexes of all its chunks in a few flat arrays:
+
+    group var {
+    dimensions:
+        chunk = number of chunks in the chunk grid
+        point = number of index points of all the chunks
+        win = 32768
+        chunk_field = 5
+        point_field = 4
+    variables:
+        int64 chunk_table(chunk, chunk_field)  // first_point, n_points, compressed_size, uncompressed_size, byte_offset
+        int64 point_table(point, point_field)  // chunk, outloc, inloc, bits
+        byte window(point, win)
+
+    // group attributes:
+            :chunk_grid = number of chunks along each dimension
+            :mode = mode
+            :span = span
+            // metadata of the variable in the dataset
+            :shape = shape of the variable
+            :chunks = shape of the chunks
+            :dtype = data type of the variable, e.g. "<i4"
+            :filters = identifiers of the HDF5 filters of the pipeline, e.g. 2 (shuffle), 1 (deflate)
+            :fill_value = value of the uninitialized samples
+            :cf_FillValue, :cf_scale_factor, :cf_add_offset = CF attributes of the variable, if defined
+    }
+
+The chunks are numbered in the row-major order of the chunk grid, so that the index points of a chunk are found with a
+single lookup in the chunk table. The points of a chunk are stored contiguously in the point table and in the windows
+array, starting at first_point. The chunks that are not allocated in the dataset have a byte_offset of -1.
+
+With the location of the chunks in the dataset and the metadata of the variables, a slice of data can be read using
+only the index and range reads of the dataset, i.e. without opening the dataset with h5py.
+
+The version is stored in the chunkindex_version attribute of the root group.
+"""
+from typing import Iterable
+import numpy as np
+
+INDEX_VERSION = 2
+VERSION_ATTR = 'chunkindex_version'
+CHUNK_FIELDS = ('first_point', 'n_points', 'compressed_size', 'uncompressed_size', 'byte_offset')
+POINT_FIELDS = ('chunk', 'outloc', 'inloc', 'bits')
+CF_ATTRS = ('_FillValue', 'scale_factor', 'add_offset')
+# HDF5 filters supported by the partial decompression of the chunks
+H5Z_FILTER_DEFLATE = 1
+H5Z_FILTER_SHUFFLE = 2
+
+
+def index_version(attrs) -> int:
+    """
+    Return the version of an index file.
+
+    :param attrs: the attributes of the root group of the index file
+    :return: the version of the index file layout
+    """
+    version = attrs.get(VERSION_ATTR, 1)
+    return int(np.asarray(version).flatten()[0])
+
+
+def split_chunk_path(path: str) -> tuple[str, tuple[int]]:
+    """
+    Split the path of a chunk into the name of its variable and its location in the chunk grid.
+
+    :param path: path of the chunk e.g.: 'group_1/x/0.1'
+    :return: the name of the variable and the location of the chunk e.g.: ('group_1/x', (0, 1))
+    """
+    var, _, key = path.rpartition('/')
+    return var, tuple(int(i) for i in key.split('.'))
+
+
+def chunk_path(var: str, chunk_coords: Iterable[int]) -> str:
+    """
+    Return the path of a chunk from the name of its variable and its location in the chunk grid.
+
+    :param var: the name of the variable e.g.: 'group_1/x'
+    :param chunk_coords: the location of the chunk in the chunk grid e.g.: (0, 1)
+    :return: the path of the chunk e.g.: 'group_1/x/0.1'
+    """
+    return var + '/' + '.'.join(str(int(c)) for c in chunk_coords)
+
+
+def chunk_number(chunk_coords: Iterable[int], chunk_grid: Iterable[int]) -> int:
+    """
+    Return the number of a chunk in the row-major order of the chunk grid.
+
+    :param chunk_coords: the location of the chunk in the chunk grid
+    :param chunk_grid: the number of chunks along each dimension
+    :return: the number of the chunk
+    """
+    return int(np.ravel_multi_index(tuple(chunk_coords), tuple(int(n) for n in chunk_grid)))
@@ -0,0 +1,231 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import os
+import h5py
+import numpy as np
+from chunkindex.core import zran_index
+from chunkindex.core import index_format
+
+WINDOW_LENGTH = zran_index.WINDOW_LENGTH
+BATCH_SIZE = 256  # number of chunk indexes kept in memory before being written
+# Name of the dimension scales that are netCDF-4 dimensions without a coordinate variable
+NC_DIMENSION_WITHOUT_VARIABLE = 'This is a netCDF dimension but not a netCDF variable.%10d'
+TABLE_CHUNK_SIZE = 4096  # number of rows in the HDF5 chunks of the chunk and point tables
+
+
+class IndexWriter:
+    """
+    The IndexWriter writes the zran indexes of many chunks into a single netcdf index file.
+
+    The index file is opened once for the whole build and the chunk indexes are written by batches.
+
+    With the version 2 layout (see index_format), the index points of all the chunks of a variable are appended to
+    a few flat arrays. The variables must be declared with add_variable() before writing the index of their chunks.
+
+    With the version 1 layout, each chunk index is stored in its own group with the same netCDF-4 layout as
+    zran_xarray.Index.to_netcdf().
+
+    Both layouts can be read by zran_xarray.open_index() and zran_h5py.open_index(). The file is written with h5py
+    because the cost of creating a group with the netCDF-4 library grows with the number of groups in the file.
+
+    Usage example:
+
+        with IndexWriter("dataset_index.nc") as writer:
+            writer.add_variable("var", chunk_grid=(2, 2), span=102400)
+            writer.write("var/0.1", index)
+    """
+
+    def __init__(self, index_path: str | os.PathLike, batch_size: int = BATCH_SIZE,
+                 version: int = index_format.INDEX_VERSION):
+        """
+        Create an IndexWriter object.
+
+        :param index_path: the path of the netcdf index file to create
+        :param batch_size: number of chunk indexes kept in memory before being written to the file
+        :param version: version of the layout of the index file (1 or 2)
+        """
+        if version not in (1, 2):
+            raise ValueError(f"Unsupported index version: {version}")
+        self.batch_size = batch_size
+        self.version = version
+        self.pending = []
+        # Open the index file for the whole build
+        # Note: the creation order is tracked as required by the netCDF-4 format
+        self.ds = h5py.File(index_path, mode='w', track_order=True)
+        if version > 1:
+            self.ds.attrs[index_format.VERSION_ATTR] = np.array([version], dtype='i4')
+
+    def add_variable(self, name: str, chunk_grid: tuple[int], span: int, metadata: dict = None) -> None:
+        """
+        Declare a variable whose chunk indexes will be written in the index file.
+
+        This is only required by the version 2 layout.
+
+        :param name: name of the variable in the dataset, e.g. group_1/var
+        :param chunk_grid: number of chunks along each dimension of the variable
+        :param span: number of uncompressed bytes between the index points of the chunks of that variable
+        :param metadata: (Optional) metadata of the variable in the dataset stored as attributes of its group:
+        shape, chunks, dtype, filters, fill_value and CF attributes (see index_format)
+        """
+        if self.version == 1:
+            return
+
+        # Create the group of the variable
+        group = self.ds.create_group(name, track_order=True)
+        group.attrs['chunk_grid'] = np.array(chunk_grid, dtype='i8')
+        group.attrs['mode'] = np.array([zran_index.MODE_ZLIB], dtype='i8')
+        group.attrs['span'] = np.array([span], dtype='i8')
+        for attr, value in (metadata or {}).items():
+            group.attrs[attr] = value
+
+        # Create the dimensions as netCDF-4 dimension scales without variable
+        n_chunks = int(np.prod(chunk_grid))
+        dims = {}
+        n_chunk_fields = len(index_format.CHUNK_FIELDS)
+        n_point_fields = len(index_format.POINT_FIELDS)
+        for dim, size, maxsize in (('chunk', n_chunks, n_chunks),
+                                   ('point', 0, None),
+                                   ('win', WINDOW_LENGTH, WINDOW_LENGTH),
+                                   ('chunk_field', n_chunk_fields, n_chunk_fields),
+                                   ('point_field', n_point_fields, n_point_fields)):
+            dims[dim] = group.create_dataset(dim, shape=(size,), maxshape=(maxsize,), dtype='f4')
+            dims[dim].make_scale(NC_DIMENSION_WITHOUT_VARIABLE % size)
+
+        # Create the chunk table: chunks without index have no index point and are not allocated in the dataset
+        fill = np.zeros((n_chunks, n_chunk_fields), dtype='i8')
+        fill[:, 0] = -1
+        fill[:, 4] = -1
+        chunk_table = group.create_dataset('chunk_table', data=fill,
+                                           chunks=(min(n_chunks, TABLE_CHUNK_SIZE), n_chunk_fields))
+        chunk_table.attrs['fields'] = ' '.join(index_format.CHUNK_FIELDS)
+
+        # Create the point table and the windows, which grow with the chunks written
+        point_table = group.create_dataset('point_table', shape=(0, n_point_fields), maxshape=(None, n_point_fields),
+                                           dtype='i8', chunks=(TABLE_CHUNK_SIZE, n_point_fields))
+        point_table.attrs['fields'] = ' '.join(index_format.POINT_FIELDS)
+        window = group.create_dataset('window', shape=(0, WINDOW_LENGTH), maxshape=(None, WINDOW_LENGTH), dtype='i1',
+                                      chunks=(1, WINDOW_LENGTH), compression='gzip', compression_opts=1)
+
+        # Attach the dimensions to the variables
+        for variable, variable_dims in ((chunk_table, ('chunk', 'chunk_field')),
+                                        (point_table, ('point', 'point_field')), (window, ('point', 'win'))):
+            for i, dim in enumerate(variable_dims):
+                variable.dims[i].attach_scale(dims[dim])
+
+    def write(self, chunk_id: str, index: zran_index.Index, byte_offset: int = -1) -> None:
+        """
+        Add the index of a chunk to the index file.
+
+        :param chunk_id: the name of the chunk in the index file, e.g. var/0.1
+        :param index: the zran index of the chunk
+        :param byte_offset: (Optional, only stored by the version 2 layout) the location of the chunk in the dataset
+        """
+        self.pending.append((chunk_id, index, byte_offset))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the pending chunk indexes to the index file.
+        """
+        if self.version == 1:
+            for chunk_id, index, _ in self.pending:
+                self._write_group(chunk_id, index)
+        else:
+            # Group the pending chunk indexes by variable, keeping their order
+            variables = {}
+            for chunk_id, index, byte_offset in self.pending:
+                var, chunk_coords = index_format.split_chunk_path(chunk_id)
+                variables.setdefault(var, []).append((chunk_coords, index, byte_offset))
+            for var, indexes in variables.items():
+                self._append_points(var, indexes)
+        self.pending = []
+        self.ds.flush()
+
+    def _write_group(self, chunk_id: str, index: zran_index.Index) -> None:
+        # Create the group of the chunk, e.g. var/0.1
+        group = self.ds.create_group(chunk_id, track_order=True)
+
+        # Define the global attributes
+        for name in ('uncompressed_size', 'compressed_size', 'mode', 'span'):
+            group.attrs[name] = np.array([getattr(index, name)], dtype='i8')
+
+        # Create the dimensions as netCDF-4 dimension scales: outloc is a coordinate variable,
+        # win is a dimension without variable
+        outloc = group.create_dataset('outloc', data=np.array([p.outloc for p in index.points], dtype='i8'))
+        outloc.make_scale('outloc')
+        win = group.create_dataset('win', shape=(WINDOW_LENGTH,), dtype='f4')
+        win.make_scale(NC_DIMENSION_WITHOUT_VARIABLE % WINDOW_LENGTH)
+
+        # Write the windows and the location of the index points. The datasets are created with their final size
+        # and written at once.
+        windows = np.vstack([np.frombuffer(p.window, dtype='b') for p in index.points])
+        window = group.create_dataset('window', data=windows, chunks=(1, WINDOW_LENGTH),
+                                      compression='gzip', compression_opts=1)
+        window.dims[0].attach_scale(outloc)
+        window.dims[1].attach_scale(win)
+        for name in ('inloc', 'bits'):
+            variable = group.create_dataset(name, data=np.array([getattr(p, name) for p in index.points], dtype='i8'))
+            variable.dims[0].attach_scale(outloc)
+
+    def _append_points(self, var: str, indexes: list[tuple[tuple[int], zran_index.Index, int]]) -> None:
+        # Append the index points of a batch of chunks of a variable to its point table and windows
+        group = self.ds[var]
+        chunk_grid = group.attrs['chunk_grid']
+        point_table = group['point_table']
+        first_point = point_table.shape[0]
+        n_points = sum(len(index.points) for _, index, _ in indexes)
+
+        # Build the rows of the chunk table and of the point table
+        chunk_numbers = []
+        chunk_rows = np.empty((len(indexes), len(index_format.CHUNK_FIELDS)), dtype='i8')
+        point_rows = np.empty((n_points, len(index_format.POINT_FIELDS)), dtype='i8')
+        windows = np.empty((n_points, WINDOW_LENGTH), dtype='i1')
+        row = 0
+        for i, (chunk_coords, index, byte_offset) in enumerate(indexes):
+            chunk = index_format.chunk_number(chunk_coords, chunk_grid)
+            chunk_numbers.append(chunk)
+            chunk_rows[i] = (first_point + row, len(index.points), index.compressed_size, index.uncompressed_size,
+                             byte_offset)
+            for p in index.points:
+                point_rows[row] = (chunk, p.outloc, p.inloc, p.bits)
+                windows[row] = np.frombuffer(p.window, dtype='i1')
+                row += 1
+
+        # Grow the point dimension and write the batch at once
+        for name in ('point', 'point_table', 'window'):
+            group[name].resize(first_point + n_points, axis=0)
+        point_table[first_point:] = point_rows
+        group['window'][first_point:] = windows
+
+        # Write the rows of the chunk table in increasing chunk order as required by h5py
+        order = np.argsort(chunk_numbers)
+        group['chunk_table'][np.asarray(chunk_numbers)[order]] = chunk_rows[order]
+
+    def close(self) -> None:
+        """
+        Write the pending chunk indexes and close the index file.
+        """
+        if self.ds:
+            self.flush()
+            self.ds.close()
+
+    # Define __enter__() and __exit()__ methods to allow the context manager
+    # i.e. allow using the with statement as follow:
+    #    with IndexWriter(index_path) as writer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
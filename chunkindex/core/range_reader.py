@@ -0,0 +1,256 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Thread-safe reads of byte ranges of a dataset.
+
+The chunks of a slice can be read by several threads at the same time, which cannot share the file pointer of a single
+file object. A RangeReader reads byte ranges at absolute offsets without moving a shared file pointer, and a RangeFile
+presents the bytes of a chunk as a file object that Index.decompress() can seek and read.
+
+The byte ranges required by all the chunks of a slice can also be read at once: the ranges closer than a gap are merged
+(see coalesce_ranges()) and read with a single request each, e.g. with the cat_ranges() method of a fsspec filesystem,
+and the requested ranges are handed to the decompression as memoryviews of the merged buffers, without copy.
+"""
+import os
+import threading
+import time
+from typing import BinaryIO, Iterable
+
+MAX_GAP = 64 * 1024  # maximum number of unrequested bytes read between two ranges to merge them (bytes)
+
+
+def coalesce_ranges(starts: Iterable[int], ends: Iterable[int],
+                    max_gap: int = MAX_GAP) -> tuple[list[tuple[int, int]], list[tuple[int, int, int]]]:
+    """
+    Merge the byte ranges that overlap or are separated by at most max_gap bytes.
+
+    :param starts: the offsets of the beginning of the ranges (in bytes)
+    :param ends: the offsets of the end of the ranges, excluded (in bytes)
+    :param max_gap: the maximum number of bytes between two ranges to merge them
+    :return: the merged ranges as (start, end), in increasing order, and the location of each range in the merged
+    ranges as (number of the merged range, start, end), in the order of the ranges
+    """
+    ranges = [(int(start), int(end)) for start, end in zip(starts, ends)]
+    merged = []
+    numbers = [0] * len(ranges)
+    for i in sorted(range(len(ranges)), key=lambda i: ranges[i]):
+        start, end = ranges[i]
+        if merged and start <= merged[-1][1] + max_gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+        numbers[i] = len(merged) - 1
+
+    locations = [(number, start - merged[number][0], end - merged[number][0])
+                 for number, (start, end) in zip(numbers, ranges)]
+    return [tuple(m) for m in merged], locations
+
+
+def split_buffers(buffers: list[bytes], locations: list[tuple[int, int, int]]) -> list[memoryview]:
+    """
+    Return the requested ranges as memoryviews of the buffers of the merged ranges (see coalesce_ranges()).
+
+    :param buffers: the bytes of the merged ranges
+    :param locations: the location of each requested range in the merged ranges
+    :return: the bytes of each requested range, without copy
+    """
+    views = [memoryview(buffer) for buffer in buffers]
+    return [views[number][start:end] for number, start, end in locations]
+
+
+class RangeReader:
+    """
+    Thread-safe reader of byte ranges of a file path or of a file object.
+
+    - a file path is opened once and read with os.pread(),
+    - a file object backed by a file descriptor is read with os.pread(),
+    - a fsspec file object is read with the cat_file() method of its filesystem,
+    - any other file object is read with seek() and read() under a lock.
+
+    Usage example:
+
+        with RangeReader("dataset.nc") as reader:
+            data = reader.read(offset, length)
+    """
+
+    def __init__(self, dataset: str | os.PathLike | BinaryIO):
+        """
+        Create a RangeReader object.
+
+        :param dataset: the path or the opened file object of the dataset
+        """
+        self.dataset = dataset
+        self.lock = threading.Lock()
+        self.owned = None
+        self.fileno = None
+        self.fs = None
+        # Time spent reading (s), and number of reads and bytes read
+        self.read_time = 0.
+        self.reads = 0
+        self.bytes_read = 0
+
+        if isinstance(dataset, (str, os.PathLike)):
+            # Open the file once for all the threads
+            self.owned = open(dataset, 'rb')
+            self.file = self.owned
+        else:
+            self.file = dataset
+
+        if hasattr(self.file, 'fs') and hasattr(self.file, 'path'):
+            self.fs = self.file.fs
+        elif hasattr(os, 'pread'):
+            try:
+                self.fileno = self.file.fileno()
+            except (AttributeError, OSError, ValueError):
+                self.fileno = None
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        Read a range of bytes.
+
+        :param offset: the offset of the range from the beginning of the file (in bytes)
+        :param length: the length of the range (in bytes)
+        :return: the bytes read
+        """
+        start = time.perf_counter()
+        if self.fs is not None:
+            data = self.fs.cat_file(self.file.path, start=offset, end=offset + length)
+        elif self.fileno is not None:
+            data = os.pread(self.fileno, length, offset)
+        else:
+            with self.lock:
+                position = self.file.tell()
+                self.file.seek(offset)
+                data = self.file.read(length)
+                self.file.seek(position)
+        with self.lock:
+            self.read_time += time.perf_counter() - start
+            self.reads += 1
+            self.bytes_read += len(data)
+        return data
+
+    def read_ranges(self, starts: Iterable[int], ends: Iterable[int], max_gap: int = MAX_GAP) -> list[memoryview]:
+        """
+        Read several ranges of bytes at once.
+
+        The ranges closer than max_gap bytes are merged and read with a single request. A fsspec file is read with one
+        call to the cat_ranges() method of its filesystem, which may send the requests concurrently.
+
+        :param starts: the offsets of the beginning of the ranges from the beginning of the file (in bytes)
+        :param ends: the offsets of the end of the ranges, excluded (in bytes)
+        :param max_gap: the maximum number of bytes between two ranges to merge them
+        :return: the bytes of each range, as memoryviews of the buffers of the merged ranges
+        """
+        merged, locations = coalesce_ranges(starts, ends, max_gap)
+        if self.fs is not None and merged:
+            start = time.perf_counter()
+            buffers = self.fs.cat_ranges([self.file.path] * len(merged), [m[0] for m in merged],
+                                         [m[1] for m in merged])
+            with self.lock:
+                self.read_time += time.perf_counter() - start
+                self.reads += len(merged)
+                self.bytes_read += sum(len(buffer) for buffer in buffers)
+        else:
+            buffers = [self.read(start, end - start) for start, end in merged]
+        return split_buffers(buffers, locations)
+
+    def close(self) -> None:
+        """
+        Close the file opened by the reader, if any.
+        """
+        if self.owned is not None:
+            self.owned.close()
+            self.owned = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class RangeFile:
+    """
+    Read-only file object over the bytes of a dataset from a base offset, e.g. the beginning of a chunk.
+
+    Each RangeFile has its own file pointer: several threads can read the dataset through their own RangeFile.
+    """
+
+    def __init__(self, reader: RangeReader, base: int):
+        """
+        Create a RangeFile object.
+
+        :param reader: the range reader of the dataset
+        :param base: the offset in the dataset of the beginning of the file (in bytes)
+        """
+        self.reader = reader
+        self.base = int(base)
+        self.position = 0
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 0:
+            self.position = offset
+        elif whence == 1:
+            self.position += offset
+        else:
+            raise ValueError('Seeking from the end of a RangeFile is not supported')
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, length: int = -1) -> bytes:
+        if length is None or length < 0:
+            raise ValueError('The length of the read is required')
+        data = self.reader.read(self.base + self.position, length)
+        self.position += len(data)
+        return data
+
+
+class BufferFile:
+    """
+    Read-only file object over byte ranges already read, e.g. the compressed ranges of a chunk fetched concurrently.
+
+    The reads must fall within one of the ranges. The ranges may be memoryviews, in which case the reads return
+    memoryviews of them, without copy.
+    """
+
+    def __init__(self, buffers: list[tuple[int, bytes]]):
+        """
+        Create a BufferFile object.
+
+        :param buffers: a list of (offset, data) of the byte ranges, data being bytes or a memoryview
+        """
+        self.buffers = sorted(buffers, key=lambda buffer: buffer[0])
+        self.position = 0
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 0:
+            self.position = offset
+        elif whence == 1:
+            self.position += offset
+        else:
+            raise ValueError('Seeking from the end of a BufferFile is not supported')
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, length: int = -1) -> bytes:
+        for offset, data in self.buffers:
+            if offset <= self.position and self.position + length <= offset + len(data):
+                start = self.position - offset
+                self.position += length
+                return data[start:start + length]
+        raise ValueError(f"The range [{self.position}, {self.position + length}) has not been read")
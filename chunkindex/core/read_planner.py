@@ -0,0 +1,178 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Planning of the partial decompression of a chunk.
+
+The samples of a slice in a chunk are made of several ranges of contiguous bytes in the uncompressed data. Each range
+can be decompressed separately, starting from the closest zran index point before it, at the cost of one more read of
+compressed data, or together with the previous range, at the cost of reading and inflating the data in between.
+
+The planner chooses between the two with a simple cost model of a read:
+
+    cost = latency + compressed bytes read / bandwidth + uncompressed bytes inflated / inflate_rate
+"""
+from dataclasses import dataclass, field
+import numpy as np
+
+LATENCY = 0.02  # latency of a read request (s)
+BANDWIDTH = 100e6  # bandwidth of the reads (bytes/s)
+INFLATE_RATE = 300e6  # uncompressed bytes inflated per second
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """
+    Cost model of the reads of compressed data.
+    """
+    latency: float = LATENCY
+    bandwidth: float = BANDWIDTH
+    inflate_rate: float = INFLATE_RATE
+
+    def cost(self, compressed_bytes: int, inflated_bytes: int, reads: int = 1) -> float:
+        """
+        Return the estimated time (s) of reads of compressed data.
+
+        :param compressed_bytes: the number of compressed bytes read
+        :param inflated_bytes: the number of uncompressed bytes inflated
+        :param reads: the number of reads
+        :return: the estimated time in seconds
+        """
+        return reads * self.latency + compressed_bytes / self.bandwidth + inflated_bytes / self.inflate_rate
+
+
+@dataclass
+class Read:
+    """
+    One read of compressed data and its decompression from a zran index point.
+    """
+    # Location of the starting index point in the uncompressed (out) and compressed (in) data
+    point_outloc: int
+    point_inloc: int
+    # Uncompressed bytes decompressed: [start, stop)
+    start: int
+    stop: int
+    # End of the compressed bytes read
+    compressed_stop: int
+    # Ranges of uncompressed bytes served by the read: (start, stop, location in the output buffer)
+    ranges: list = field(default_factory=list)
+
+    @property
+    def compressed_bytes(self) -> int:
+        return self.compressed_stop - self.point_inloc
+
+    @property
+    def inflated_bytes(self) -> int:
+        return self.stop - self.point_outloc
+
+
+@dataclass
+class Plan:
+    """
+    The reads chosen to decompress several ranges of a chunk.
+    """
+    reads: list
+    cost_model: CostModel
+
+    @property
+    def requested_bytes(self) -> int:
+        """
+        Return the number of uncompressed bytes requested.
+        """
+        return sum(stop - start for read in self.reads for start, stop, _ in read.ranges)
+
+    @property
+    def compressed_bytes(self) -> int:
+        """
+        Return the number of compressed bytes read.
+        """
+        return sum(read.compressed_bytes for read in self.reads)
+
+    @property
+    def inflated_bytes(self) -> int:
+        """
+        Return the number of uncompressed bytes inflated.
+        """
+        return sum(read.inflated_bytes for read in self.reads)
+
+    @property
+    def cost(self) -> float:
+        """
+        Return the estimated time (s) of the plan.
+        """
+        return self.cost_model.cost(self.compressed_bytes, self.inflated_bytes, len(self.reads))
+
+    def __str__(self) -> str:
+        lines = [f"{len(self.reads)} read(s), {self.requested_bytes} bytes requested, "
+                 f"{self.compressed_bytes} compressed bytes read, {self.inflated_bytes} bytes inflated, "
+                 f"estimated cost {self.cost * 1000:.3f} ms"]
+        for read in self.reads:
+            lines.append(f"  point {read.point_outloc}: inflate [{read.start}, {read.stop}) "
+                         f"from compressed [{read.point_inloc}, {read.compressed_stop}), {len(read.ranges)} range(s)")
+        return '\n'.join(lines)
+
+
+def plan_reads(index, ranges: np.ndarray, cost_model: CostModel = None) -> Plan:
+    """
+    Plan the reads to decompress several ranges of the uncompressed data of a chunk.
+
+    The ranges are visited in increasing order. Each range either extends the current read up to its end, or starts a
+    new read from the closest index point before it, whichever costs less according to the cost model.
+
+    :param index: the zran index of the chunk (zran_index.Index or one of its subclasses)
+    :param ranges: an array of shape (n, 2) of the (start, stop) of the ranges in the uncompressed data (in bytes), in
+    increasing order and without overlap
+    :param cost_model: the cost model of the reads. Default: CostModel()
+    :return: the plan of the reads
+    """
+    if cost_model is None:
+        cost_model = CostModel()
+    outloc = np.asarray(index.outloc, dtype='i8')
+    inloc = np.asarray(index.inloc, dtype='i8')
+    bits = np.asarray(getattr(index, 'bits', np.zeros_like(inloc)), dtype='i8')
+    compressed_size = int(index.compressed_size)
+
+    def point(loc):
+        # Location of the closest index point before loc, keeping one more byte if some bits of the previous byte are
+        # required
+        i = int(np.searchsorted(outloc, loc, side='right')) - 1
+        return int(outloc[i]), int(inloc[i] - (bits[i] > 0))
+
+    def compressed_stop(loc):
+        # End of the compressed data required to inflate up to loc, i.e. the index point after loc
+        i = int(np.searchsorted(outloc, loc, side='right'))
+        return int(inloc[i]) if i < len(inloc) else compressed_size
+
+    reads = []
+    destination = 0
+    for start, stop in np.asarray(ranges, dtype='i8').reshape(-1, 2).tolist():
+        if stop <= start:
+            continue
+        point_outloc, point_inloc = point(start)
+        new_cost = cost_model.cost(compressed_stop(stop) - point_inloc, stop - point_outloc)
+        if reads:
+            read = reads[-1]
+            extend_cost = cost_model.cost(compressed_stop(stop) - read.compressed_stop, stop - read.stop, reads=0)
+            if extend_cost <= new_cost:
+                # Extend the current read up to the end of that range
+                read.stop = stop
+                read.compressed_stop = compressed_stop(stop)
+                read.ranges.append((start, stop, destination))
+                destination += stop - start
+                continue
+
+        # Start a new read from the closest index point
+        reads.append(Read(point_outloc, point_inloc, start, stop, compressed_stop(stop), [(start, stop, destination)]))
+        destination += stop - start
+
+    return Plan(reads, cost_model)
@@ -0,0 +1,473 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from math import ceil
+from typing import Callable, Iterable, Iterator, BinaryIO
+import h5py
+import numpy as np
+from chunkindex.core import index_cache
+from chunkindex.core import index_format
+from chunkindex.core import read_planner
+from chunkindex.core.range_reader import RangeReader, BufferFile, MAX_GAP, coalesce_ranges, split_buffers
+from chunkindex.util.multi_dimensional_slice import MultiDimensionalSlice, chunk_intersections, linear_offset_ranges
+
+MASKANDSCALE = True
+METHOD = 'h5py'
+# Where the metadata of the variables is read: in the dataset (with h5py) or in the index (version 2 only)
+METADATA = 'dataset'
+# Number of threads that read the chunks of a slice
+MAX_WORKERS = 1
+
+
+@dataclass
+class VariableInfo:
+    """
+    Metadata of a variable of a NetCDF-4/HDF5 dataset required to read its chunks with a zran index.
+    """
+    name: str
+    shape: tuple[int]
+    chunks: tuple[int]
+    dtype: np.dtype
+    shuffle: bool
+    # Value of the uninitialized samples (i.e. of the chunks that are not allocated in the dataset)
+    fill: object
+    # CF attributes: None when the attribute is not defined
+    fillvalue: object
+    scale_factor: object
+    add_offset: object
+    # Byte offset and compressed size of each chunk in the dataset, indexed by the location of the chunk in the chunk
+    # grid. The offset is -1 for the chunks that are not allocated.
+    byte_offsets: np.ndarray
+    byte_sizes: np.ndarray
+
+    @property
+    def chunk_grid(self) -> tuple[int]:
+        """
+        Return the number of chunks along each dimension.
+        """
+        return self.byte_offsets.shape
+
+    @property
+    def bps(self) -> int:
+        """
+        Return the number of bytes in one sample (bytes-per-sample).
+        """
+        return self.dtype.itemsize
+
+    @classmethod
+    def from_hdf5(cls, dsvar: h5py.Dataset) -> 'VariableInfo':
+        """
+        Read the metadata of a variable from a HDF5 dataset.
+
+        :param dsvar: the h5py dataset of the variable
+        :return: the metadata of the variable
+        """
+        # Get the CF attributes
+        attrs = {}
+        for name in ('_FillValue', 'scale_factor', 'add_offset'):
+            attrs[name] = dsvar.attrs[name][0] if name in dsvar.attrs else None
+
+        # Get the location of each chunk in the dataset
+        chunk_grid = tuple(ceil(n / c) for n, c in zip(dsvar.shape, dsvar.chunks))
+        byte_offsets = np.full(chunk_grid, -1, dtype='i8')
+        byte_sizes = np.zeros(chunk_grid, dtype='i8')
+
+        def add_chunk(chunk_info):
+            chunk_coords = tuple(o // c for o, c in zip(chunk_info.chunk_offset, dsvar.chunks))
+            byte_offsets[chunk_coords] = chunk_info.byte_offset
+            byte_sizes[chunk_coords] = chunk_info.size
+
+        dsvar.id.chunk_iter(add_chunk)
+
+        return cls(name=dsvar.name.lstrip('/'), shape=dsvar.shape, chunks=dsvar.chunks, dtype=np.dtype(dsvar.dtype),
+                   shuffle=dsvar.shuffle, fill=dsvar.fillvalue, fillvalue=attrs['_FillValue'],
+                   scale_factor=attrs['scale_factor'], add_offset=attrs['add_offset'],
+                   byte_offsets=byte_offsets, byte_sizes=byte_sizes)
+
+    @classmethod
+    def from_index(cls, group: h5py.Group) -> 'VariableInfo':
+        """
+        Read the metadata of a variable from its group in an index file (version 2).
+
+        :param group: the h5py group of the variable in the index file
+        :return: the metadata of the variable
+        """
+        attrs = group.attrs
+        if 'dtype' not in attrs:
+            raise ValueError(f"The index of {group.name} does not contain the metadata of the variable, "
+                             "rebuild it with create_index()")
+
+        # Only the deflate and shuffle filters can be decompressed with the zran index
+        filters = [int(f) for f in np.atleast_1d(attrs['filters'])]
+        unsupported = set(filters) - {index_format.H5Z_FILTER_DEFLATE, index_format.H5Z_FILTER_SHUFFLE}
+        if unsupported:
+            raise NotImplementedError(f"Unsupported HDF5 filters {sorted(unsupported)} in {group.name}")
+
+        # Get the CF attributes
+        cf_attrs = {}
+        for name in index_format.CF_ATTRS:
+            key = 'cf' + name if name.startswith('_') else 'cf_' + name
+            cf_attrs[name] = np.atleast_1d(attrs[key])[0] if key in attrs else None
+
+        dtype = np.dtype(attrs['dtype'])
+        fill = np.atleast_1d(attrs['fill_value'])[0] if 'fill_value' in attrs else 0
+        chunk_grid = tuple(int(n) for n in np.atleast_1d(attrs['chunk_grid']))
+
+        # Get the location of each chunk in the dataset
+        chunk_table = group['chunk_table'][:]
+        byte_offsets = chunk_table[:, index_format.CHUNK_FIELDS.index('byte_offset')].reshape(chunk_grid)
+        byte_sizes = chunk_table[:, index_format.CHUNK_FIELDS.index('compressed_size')].reshape(chunk_grid)
+        byte_sizes = np.where(byte_offsets < 0, 0, byte_sizes)
+
+        return cls(name=group.name.lstrip('/'), shape=tuple(int(n) for n in np.atleast_1d(attrs['shape'])),
+                   chunks=tuple(int(c) for c in np.atleast_1d(attrs['chunks'])), dtype=dtype,
+                   shuffle=index_format.H5Z_FILTER_SHUFFLE in filters, fill=dtype.type(fill),
+                   fillvalue=cf_attrs['_FillValue'], scale_factor=cf_attrs['scale_factor'],
+                   add_offset=cf_attrs['add_offset'], byte_offsets=byte_offsets, byte_sizes=byte_sizes)
+
+
+class ChunkIndexReader:
+    """
+    The ChunkIndexReader reads slices of data from the variables of a NetCDF-4/HDF5 dataset using a zran index.
+
+    The metadata of each variable (shape, chunks, data type, filters, CF attributes and location of the chunks in the
+    dataset) is read only once, at the first access to the variable, and kept for the lifetime of the reader. The next
+    reads only cost the reading and decompression of the data itself.
+
+    With metadata='index', the metadata is read from the index file (version 2) instead of the dataset: the dataset is
+    then never opened with h5py, and only the byte ranges of the chunks to decompress are read from it.
+
+    In each chunk, the reads of compressed data are planned according to a latency and bandwidth cost model (see
+    read_planner). The plans of the last read are kept in the plans attribute, by chunk.
+
+    The compressed ranges required by all the chunks of a slice are read at once, before their decompression: the ranges
+    closer than max_gap bytes are merged in a single read, e.g. a single HTTP range request (see range_reader).
+
+    With max_workers > 1, the chunks of a slice are planned and decompressed by a pool of threads. The time spent in
+    each stage of the last read is kept in the timings attribute.
+
+    With an asynchronous fsspec filesystem, read_async() fetches all the compressed ranges of a slice at once. The
+    dataset is then the path of the dataset in the filesystem, and the metadata is usually read from the index.
+
+    Usage example:
+
+        with open("dataset.nc", mode='rb') as ds:
+            with open("dataset_index.nc", mode='rb') as index:
+                with ChunkIndexReader(ds, index) as reader:
+                    reader.read("my_group/my_nc_variable", ((300, 305), (300, 305)))
+    """
+
+    def __init__(self, dataset: BinaryIO, index: BinaryIO, maskandscale=MASKANDSCALE, method: str = METHOD,
+                 cache: index_cache.IndexCache = None, metadata: str = METADATA,
+                 cost_model: read_planner.CostModel = None, max_workers: int = MAX_WORKERS, fs=None,
+                 max_gap: int = MAX_GAP):
+        """
+        Create a ChunkIndexReader object.
+
+        :param dataset: the opened file object of the NetCDF-4/HDF5 dataset.
+        :param index: an opened file object that contains the index data in netCDF-4 format.
+        :param maskandscale: turn on or off automatic conversion of data (apply scale_factor and add_offset) and
+        masked Fillvalue
+        :param method: select which lib to use h5py or xarray
+        :param cache: the cache of the opened index files and chunk indexes. Default: a cache owned by the reader
+        :param metadata: read the metadata of the variables from the 'dataset' or from the 'index'
+        :param cost_model: the latency and bandwidth model used to plan the reads of compressed data in each chunk.
+        Default: read_planner.CostModel()
+        :param max_workers: number of threads that read and decompress the chunks of a slice at the same time
+        :param fs: (only for read_async()) the asynchronous fsspec filesystem of the dataset, whose path is then given
+        by the dataset parameter
+        :param max_gap: the compressed ranges of a slice separated by at most max_gap bytes are read with a single
+        request (see range_reader.coalesce_ranges())
+        """
+        if metadata not in ('dataset', 'index'):
+            raise ValueError(f"Invalid metadata source: {metadata}, expected 'dataset' or 'index'")
+        self.dataset = dataset
+        self.index = index
+        self.maskandscale = maskandscale
+        self.method = method
+        self.cache = index_cache.IndexCache() if cache is None else cache
+        # The cache created by the reader is cleared when the reader is closed
+        self.owns_cache = cache is None
+        self.metadata = metadata
+        self.cost_model = read_planner.CostModel() if cost_model is None else cost_model
+        self.max_workers = max_workers
+        self.fs = fs
+        self.max_gap = max_gap
+        # Plans of the reads of the last call to read(), by chunk
+        self.plans = {}
+        # Time spent in each stage of the last call to read() (s), summed over the chunks for the chunk stages
+        self.timings = {}
+        self.variables = {}
+        self.h5 = None
+        self.range_reader = None
+        self.executor = None
+
+    def variable(self, var: str) -> VariableInfo:
+        """
+        Return the metadata of a variable, reading it from the dataset or the index at the first access.
+
+        :param var: the name of the dataset variable
+        :return: the metadata of the variable
+        """
+        info = self.variables.get(var)
+        if info is None and self.metadata == 'index':
+            info = VariableInfo.from_index(self.cache.open_file(self.index)[var])
+            self.variables[var] = info
+        elif info is None:
+            if self.h5 is None:
+                self.h5 = h5py.File(self.dataset)
+            info = VariableInfo.from_hdf5(self.h5[var])
+            self.variables[var] = info
+        return info
+
+    def read(self, var: str, nd_slice: MultiDimensionalSlice | Iterable[slice] | Iterable[tuple]):
+        """
+        Read a slice of data from within a variable of the dataset.
+
+        The decompressed samples are written directly into an array sized to the slice: the memory used by a read
+        depends on the size of the slice, not on the size of the variable.
+
+        :param var: the name of the dataset variable we want to access to.
+        :param nd_slice: slice or multidimensional slice corresponding to the data to access in the variable `var`.
+        :return: the slice of data read.
+        """
+        start = time.perf_counter()
+        info, out, tasks, timings = self._prepare(var, nd_slice)
+
+        # Plan the reads of the chunks, in parallel if several workers are allowed
+        planned = self._map(lambda task: self._plan_chunk(var, info, *task), tasks)
+
+        # Read the compressed ranges of all the chunks at once: the close ranges are merged in a single read
+        if self.range_reader is None:
+            self.range_reader = RangeReader(self.dataset)
+        fetched = time.perf_counter()
+        starts, ends = self._compressed_ranges(info, tasks, planned)
+        buffers = iter(self.range_reader.read_ranges(starts, ends, self.max_gap))
+        timings['read'] = time.perf_counter() - fetched
+
+        # Decompress the chunks from the ranges read: each chunk fills its own part of the output array
+        chunk_files = self._chunk_files(tasks, planned, buffers, timings)
+        for stage_timings in self._map(lambda args: self._decompress_chunk(info, out, *args),
+                                       [(zindex, plan, chunk_file, *task) for task, (_, zindex, plan, _), chunk_file
+                                        in zip(tasks, planned, chunk_files)]):
+            timings.update(stage_timings)
+
+        return self._finish(info, out, timings, start)
+
+    async def read_async(self, var: str, nd_slice: MultiDimensionalSlice | Iterable[slice] | Iterable[tuple]):
+        """
+        Read a slice of data from within a variable of the dataset through an asynchronous fsspec filesystem.
+
+        The reads of all the chunks of the slice are planned first, then all the compressed ranges they require are
+        fetched at once with the filesystem, and the chunks are decompressed in the executor of the reader.
+
+        :param var: the name of the dataset variable we want to access to.
+        :param nd_slice: slice or multidimensional slice corresponding to the data to access in the variable `var`.
+        :return: the slice of data read.
+        """
+        if self.fs is None:
+            raise ValueError('An asynchronous fsspec filesystem is required to read a slice asynchronously')
+        loop = asyncio.get_running_loop()
+        executor = self._executor() if self.max_workers > 1 else None
+
+        # Read the metadata of the variable and plan the reads of the chunks (the index files are read with h5py)
+        start = time.perf_counter()
+        info, out, tasks, timings = await loop.run_in_executor(executor, self._prepare, var, nd_slice)
+        planned = await asyncio.gather(*[loop.run_in_executor(executor, self._plan_chunk, var, info, *task)
+                                         for task in tasks])
+
+        # Fetch the compressed ranges of all the chunks at once: the close ranges are merged in a single request
+        fetched = time.perf_counter()
+        starts, ends = self._compressed_ranges(info, tasks, planned)
+        merged, locations = coalesce_ranges(starts, ends, self.max_gap)
+        merged_buffers = await self.fs._cat_ranges([self.dataset] * len(merged), [m[0] for m in merged],
+                                                   [m[1] for m in merged])
+        buffers = iter(split_buffers(merged_buffers, locations))
+        timings['read'] = time.perf_counter() - fetched
+
+        # Decompress the chunks from the fetched ranges
+        chunk_files = self._chunk_files(tasks, planned, buffers, timings)
+        for stage_timings in await asyncio.gather(*[
+                loop.run_in_executor(executor, self._decompress_chunk, info, out, zindex, plan, chunk_file, *task)
+                for task, (_, zindex, plan, _), chunk_file in zip(tasks, planned, chunk_files)]):
+            timings.update(stage_timings)
+
+        return self._finish(info, out, timings, start)
+
+    def _prepare(self, var: str, nd_slice: MultiDimensionalSlice | Iterable[slice] | Iterable[tuple]) -> tuple:
+        # Get the metadata of the variable, allocate the output array, fill the chunks that are not allocated and list
+        # the chunks to read as (chunk coordinates, slice in the chunk, slice in the output array) tasks.
+        # Return the metadata, the output array, the tasks and the time spent in each stage.
+        if not isinstance(nd_slice, MultiDimensionalSlice):
+            nd_slice = MultiDimensionalSlice(nd_slice)
+
+        start = time.perf_counter()
+        timings = Counter()
+
+        # Get the metadata of the variable
+        info = self.variable(var)
+        if len(nd_slice) != len(info.shape):
+            raise ValueError('Dimension mismatch')
+        timings['metadata'] = time.perf_counter() - start
+
+        # Resolve the bounds of the slice in the variable
+        nd_slice = MultiDimensionalSlice([slice(*s.indices(n)) for s, n in zip(nd_slice, info.shape)])
+        if any(s.step <= 0 for s in nd_slice):
+            raise NotImplementedError('Only slices with a positive step are supported')
+
+        # Allocate the array of the slice
+        out = np.empty([len(range(s.start, s.stop, s.step)) for s in nd_slice], info.dtype)
+        self.plans = {}
+
+        # Compute the intersection of the chunks with the slice: the chunks to read, the location of the samples to
+        # read in each chunk and their location in the output array
+        chunks_to_read, slices_in_chunk, slices_in_out = chunk_intersections(nd_slice, info.shape, info.chunks)
+
+        # List the chunks to read
+        tasks = []
+        for chunk_coords, in_chunk, in_out in zip(chunks_to_read, slices_in_chunk, slices_in_out):
+            chunk_coords = tuple(int(c) for c in chunk_coords)
+            slice_in_chunk = MultiDimensionalSlice([slice(*s) for s in in_chunk.tolist()])
+            slice_in_out = tuple(slice(*s) for s in in_out.tolist())
+
+            # Get the chunk location in the dataset
+            if info.byte_offsets[chunk_coords] < 0:
+                # The chunk is not allocated: it only contains uninitialized samples
+                out[slice_in_out] = info.fill
+                continue
+            tasks.append((chunk_coords, slice_in_chunk, slice_in_out))
+        timings['intersection'] = time.perf_counter() - start - timings['metadata']
+
+        return info, out, tasks, timings
+
+    def _plan_chunk(self, var: str, info: VariableInfo, chunk_coords: tuple[int], slice_in_chunk: MultiDimensionalSlice,
+                    slice_in_out: tuple[slice]) -> tuple:
+        # Open the index of a chunk and plan the reads of the samples of the slice in the chunk.
+        # Return the path of the chunk in the index, its index, the plan of the reads and the time spent in each stage.
+        start = time.perf_counter()
+
+        # Define the name of the group in the index: e.g. var/0.1
+        index_group = index_format.chunk_path(var, chunk_coords)
+        # Open the index, or get it from the cache if it is already opened
+        zindex = self.cache.open_index(self.index, index_group, self.method)
+
+        # Compute the ranges of contiguous samples of the slice in the chunk, and plan their reads: close ranges are
+        # decompressed together, distant ranges separately from their closest index point (see read_planner)
+        ranges = linear_offset_ranges(slice_in_chunk, info.chunks) * info.bps
+        plan = zindex.plan_ranges(ranges, shuffle=info.shuffle, bps=info.bps, cost_model=self.cost_model)
+        # Read the windows of the index points of all the reads at once
+        zindex.prefetch_points([read.start for read in plan.reads])
+
+        return index_group, zindex, plan, {'index': time.perf_counter() - start}
+
+    @staticmethod
+    def _compressed_ranges(info: VariableInfo, tasks: list, planned: list) -> tuple[list[int], list[int]]:
+        # Return the (starts, ends) in the dataset of the compressed ranges of the planned reads of all the chunks
+        starts, ends = [], []
+        for task, (_, _, plan, _) in zip(tasks, planned):
+            byte_offset = int(info.byte_offsets[task[0]])
+            starts += [byte_offset + read.point_inloc for read in plan.reads]
+            ends += [byte_offset + read.compressed_stop for read in plan.reads]
+        return starts, ends
+
+    def _chunk_files(self, tasks: list, planned: list, buffers: Iterator, timings: Counter) -> list[BufferFile]:
+        # Record the plans and timings of the chunks, and return a file object over the compressed ranges read for each
+        # chunk, taken in order from buffers
+        chunk_files = []
+        for task, (index_group, _, plan, index_timings) in zip(tasks, planned):
+            self.plans[index_group] = plan
+            timings.update(index_timings)
+            chunk_files.append(BufferFile([(read.point_inloc, next(buffers)) for read in plan.reads]))
+        return chunk_files
+
+    def _decompress_chunk(self, info: VariableInfo, out: np.ndarray, zindex, plan: read_planner.Plan, chunk_file,
+                          chunk_coords: tuple[int], slice_in_chunk: MultiDimensionalSlice,
+                          slice_in_out: tuple[slice]) -> dict:
+        # Decompress the samples of the slice in a chunk, read from the chunk file, and write them in their place in
+        # the output array. Return the time spent in each stage.
+        start = time.perf_counter()
+        ranges = linear_offset_ranges(slice_in_chunk, info.chunks) * info.bps
+
+        # The decompressed samples are the samples of the slice in the chunk in row-major order: they are decompressed
+        # directly in the output array if their place in it is contiguous, e.g. for a slice of whole rows
+        target = out[slice_in_out]
+        in_place = target.flags.c_contiguous
+        if not in_place:
+            target = np.empty(target.shape, dtype=info.dtype)
+        zindex.decompress_ranges(chunk_file, ranges, shuffle=info.shuffle, bps=info.bps, whence=0, plan=plan,
+                                 out=target)
+        decompressed = time.perf_counter()
+
+        if not in_place:
+            out[slice_in_out] = target
+
+        return {'decompress': decompressed - start, 'assemble': time.perf_counter() - decompressed}
+
+    def _finish(self, info: VariableInfo, out: np.ndarray, timings: Counter, start: float):
+        # Apply scale_factor, offset and mask Fillvalue data, and record the timings of the read
+        if self.maskandscale:
+            scale_factor = 1 if info.scale_factor is None else info.scale_factor
+            offset = 0 if info.add_offset is None else info.add_offset
+            if info.fillvalue is not None:
+                # Apply mask and scaling
+                out = np.ma.masked_where(out == info.fillvalue, out) * scale_factor + offset
+            else:
+                # No fillvalue, apply only scaling
+                out = out * scale_factor + offset
+
+        timings['total'] = time.perf_counter() - start
+        self.timings = dict(timings)
+        return out
+
+    def _map(self, function: Callable, items: list) -> list:
+        # Apply a function to the items, with the thread pool of the reader if several workers are allowed
+        if self.max_workers > 1 and len(items) > 1:
+            return list(self._executor().map(function, items))
+        return [function(item) for item in items]
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Return the thread pool of the reader
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def close(self) -> None:
+        """
+        Close the HDF5 dataset opened to read the metadata of the variables, and stop the threads of the reader. The
+        index files opened by the cache of the reader are closed, unless the cache was given by the caller.
+        """
+        if self.h5 is not None:
+            self.h5.close()
+            self.h5 = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.range_reader is not None:
+            self.range_reader.close()
+            self.range_reader = None
+        if self.owns_cache:
+            self.cache.clear()
+
+    # Define __enter__() and __exit()__ methods to allow the context manager
+    # i.e. allow using the with statement as follow:
+    #    with ChunkIndexReader(dataset, index) as reader:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
@@ -14,16 +14,17 @@
 import xarray
 import h5py as h5
 from chunkindex.core import zran_index
+from chunkindex.core import index_format
 import numpy as np
 from functools import cached_property
 
 
-class Index(zran_index.Index):
+class Index(zran_index.ArrayIndex):
     """
     The zran_h5py.Index handles a zran index stored in a h5py dataset.
     """
 
-    def __init__(self, index: zran_index.Index | h5._hl.group.Group):
+    def __init__(self, index: zran_index.Index | h5._hl.group.Group, chunk: int = None):
         """
         Create a xarray dataset that contains the zran index data.
 
@@ -44,8 +45,17 @@ class Index(zran_index.Index):
         // global attributes:
                 :uncompressed_size = uncompressed_size
                 :compressed_size = compressed_size
+
+        A h5py group of a version 2 index file (see index_format) contains the indexes of all the chunks of a variable.
+        In that case, the number of the chunk in the chunk grid is also required.
+
+        :param index: a zran_index.Index object or the h5py group that contains the index data
+        :param chunk: (only for a version 2 index) the number of the chunk in the chunk grid of the variable
         """
 
+        self.chunk = chunk
+        # Windows read in advance by prefetch_points(), by number of the point in the chunk
+        self.prefetched = {}
         if isinstance(index, zran_index.Index):
             # Get the outloc, inloc and bits
             outloc = [p.outloc for p in index.points]
@@ -78,28 +88,59 @@ class Index(zran_index.Index):
         else:
             raise TypeError("A ZranIndex or a h5._hl.group.Group is required to build a ZranXarrayDataset")
 
+    @cached_property
+    def chunk_row(self):
+        # Row of the chunk in the chunk table of a version 2 index (see index_format.CHUNK_FIELDS):
+        # first_point, n_points, compressed_size, uncompressed_size, byte_offset
+        return self.ds['chunk_table'][self.chunk]
+
+    @cached_property
+    def point_rows(self):
+        # Rows of the points of the chunk in the point table of a version 2 index: chunk, outloc, inloc, bits
+        first_point, n_points = self.chunk_row[:2]
+        return self.ds['point_table'][first_point:first_point + n_points]
+
+    @cached_property
+    def first_point(self):
+        return 0 if self.chunk is None else int(self.chunk_row[0])
+
     @cached_property
     def outloc(self):
+        if self.chunk is not None:
+            return self.point_rows[:, 1]
         return self.ds['outloc'][:]
 
     @cached_property
     def inloc(self):
+        if self.chunk is not None:
+            return self.point_rows[:, 2]
         return self.ds['inloc'][:]
 
     @cached_property
     def bits(self):
+        if self.chunk is not None:
+            return self.point_rows[:, 3]
         return self.ds['bits'][:]
 
+    @cached_property
+    def windows(self):
+        # The windows are read from the h5py dataset only when the points are used (see zran_index.ArrayIndex)
+        return self.ds['window']
+
     @cached_property
     def window(self):
-        return self.ds['window'][:]
+        return self.ds['window'][self.first_point:self.first_point + len(self.outloc)]
 
     @cached_property
     def uncompressed_size(self):
+        if self.chunk is not None:
+            return self.chunk_row[3]
         return self.ds.attrs['uncompressed_size'][0]
 
     @cached_property
     def compressed_size(self):
+        if self.chunk is not None:
+            return self.chunk_row[2]
         return self.ds.attrs['compressed_size'][0]
 
     @cached_property
@@ -114,21 +155,6 @@ class Index(zran_index.Index):
     def win(self):
         return self.ds.win
 
-    def get_point(self, loc) -> zran_index.Index.Point:
-        """
-        Return the closest zran index point before loc from the data store in the xarray dataset.
-
-        :param loc: location (in bytes) in the decompressed data
-        :return: the closest zran index point before outloc as a ZranIndex.Point object
-        """
-        # Get the location of the closest index point before loc
-        outloc = np.searchsorted(self.ds['outloc'][:], loc, side='right') - 1
-        # Create the zran index point
-        return zran_index.Index.Point(outloc=self.ds['outloc'][outloc],
-                                      inloc=self.ds['inloc'][outloc],
-                                      bits=self.ds['bits'][outloc],
-                                      window=self.ds['window'][outloc].tobytes())
-
     def to_index(self) -> zran_index.Index:
         """
         Convert a ZranIndexDataset object to a ZranIndex object.
@@ -173,6 +199,25 @@ def create_index(*args, **kwargs):
 def open_index(*args, **kwargs):
     """
     Overloads h5.File() method.
+
+    The group keyword argument is the path of the chunk in the index, e.g. var/0.1. Both the version 1 and the
+    version 2 index layouts are supported (see index_format).
+    """
+    return get_index(h5.File(*args), kwargs['group'])
+
+
+def get_index(f: h5.File, group: str) -> Index:
     """
-    ds = h5.File(*args)[kwargs['group']]
-    return Index(ds)
+    Return the index of a chunk from an opened index file.
+
+    :param f: the opened index file
+    :param group: the path of the chunk in the index, e.g. var/0.1
+    :return: the index of the chunk
+    """
+    if index_format.index_version(f.attrs) < 2:
+        return Index(f[group])
+
+    # Find the chunk in the chunk table of its variable
+    var, chunk_coords = index_format.split_chunk_path(group)
+    var_group = f[var]
+    return Index(var_group, chunk=index_format.chunk_number(chunk_coords, var_group.attrs['chunk_grid']))
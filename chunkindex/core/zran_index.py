@@ -11,15 +11,26 @@
 #WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #See the License for the specific language governing permissions and
 #limitations under the License.
+import asyncio
+import contextlib
+import functools
 import numpy as np
+import zlib
 import zran
 import bisect
-from chunkindex.util.shuffle import unshuffle
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from chunkindex.util.shuffle import unshuffle_into
+from chunkindex.core import read_planner
+from chunkindex.core.range_reader import BufferFile
+from collections import OrderedDict
 from functools import lru_cache, cached_property
 from typing import BinaryIO
 
 MODE_ZLIB = 15
 WINDOW_LENGTH = 32768
+MAX_CONTEXTS = 16  # number of decompression contexts kept by an index
+CURSOR_READ_SIZE = 256 * 1024  # number of compressed bytes read at once by an InflateCursor
+SKIP_SIZE = 1024 * 1024  # maximum number of uncompressed bytes inflated at once to skip data
 
 
 def read_offset(f: BinaryIO, offset: int, length: int, whence: 0 | 1 | 2 = 0) -> bytes:
@@ -48,6 +59,129 @@ def read_offset(f: BinaryIO, offset: int, length: int, whence: 0 | 1 | 2 = 0) ->
     return data
 
 
+# Order of the code lengths of the code length alphabet in a dynamic deflate block header (RFC 1951, 3.2.7)
+CODE_LENGTH_ORDER = (16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15)
+
+
+@lru_cache
+def empty_block(n_bits: int) -> tuple[bytes, int]:
+    """
+    Return an empty dynamic deflate block whose length in bits is congruent to n_bits modulo 8.
+
+    zlib's inflatePrime(), used by zran to start the decompression in the middle of a byte, is not available in
+    Python. Instead, the compressed data is preceded by this block, which outputs nothing and ends exactly where the
+    data starts, so that the byte alignment of the compressed data (required by the stored blocks) is kept.
+
+    The block only codes the end-of-block symbol (length 1), with a code length code of the symbols 0, 1, 17 and 18
+    (length 2). Its length is adjusted by the way the 256 zero code lengths of the literals are coded.
+
+    :param n_bits: the number of bits (1 to 7) of the last byte of the block
+    :return: the block, with zeros in the unused bits of its last byte, and its length in bits
+    """
+    # Choose the numbers of zero code lengths coded with the symbols 0 and 17 to get the right length:
+    # header (17 bits), code length code (18 x 3 bits), two symbols 18 (2 x 9 bits), the code lengths of the
+    # end-of-block symbol and of the distance (2 x 2 bits) and the end-of-block symbol (1 bit)
+    n0, n17 = next((n0, n17) for n0 in range(8) for n17 in range(2)
+                   if (94 + 5 * n17 + 2 * n0) % 8 == n_bits % 8)
+
+    block = 0
+    length = 0
+
+    def put(value, n, huffman=False):
+        # Write n bits: the values from their least significant bit, the Huffman codes from their most significant bit
+        nonlocal block, length
+        for i in range(n):
+            bit = (value >> (n - 1 - i if huffman else i)) & 1
+            block |= bit << length
+            length += 1
+
+    # Header: not the last block, dynamic Huffman codes, 257 literal/length codes, 1 distance code, 18 code length codes
+    for value, n in ((0, 1), (2, 2), (0, 5), (0, 5), (14, 4)):
+        put(value, n)
+    # Code length code: the canonical codes of the symbols 0, 1, 17, 18 are 00, 01, 10, 11
+    codes = {0: 0b00, 1: 0b01, 17: 0b10, 18: 0b11}
+    for symbol in CODE_LENGTH_ORDER[:18]:
+        put(2 if symbol in codes else 0, 3)
+    # Code lengths of the 256 literals: zero
+    for _ in range(n0):
+        put(codes[0], 2, huffman=True)
+    if n17:
+        put(codes[17], 2, huffman=True)
+        put(0, 3)
+    zeros = 256 - n0 - 3 * n17
+    for repeat in (zeros // 2, zeros - zeros // 2):
+        put(codes[18], 2, huffman=True)
+        put(repeat - 11, 7)
+    # Code lengths of the end-of-block symbol (1) and of the distance (0)
+    put(codes[1], 2, huffman=True)
+    put(codes[0], 2, huffman=True)
+    # End of block: the only code of length 1
+    put(0, 1, huffman=True)
+
+    return block.to_bytes((length + 7) // 8, 'little'), length
+
+
+class InflateContext:
+    """
+    Reusable context of the decompression of raw deflate data from a zran index point with zlib.
+
+    The zlib stream is primed once with the window of the point (and the empty block that replaces the bits before the
+    point, see empty_block()): each decompression from that point then only copies the primed stream, instead of
+    building a new zran index with the 32 KB window.
+
+    Unlike zran.decompress(), zlib releases the GIL while inflating, so that several pieces of data can be inflated at
+    the same time by several threads, with the same context.
+    """
+    __slots__ = ('bits', 'decompressor')
+
+    def __init__(self, bits: int, window: bytes):
+        """
+        Create an InflateContext object.
+
+        :param bits: the number of bits of the index point in the byte before it
+        :param window: the 32 KB of uncompressed data before the index point
+        """
+        self.bits = int(bits)
+        self.decompressor = zlib.decompressobj(wbits=-15, zdict=bytes(window))
+        if self.bits:
+            # All the bytes of the empty block but the last one, which is merged with the first byte of the data
+            self.decompressor.decompress(empty_block(8 - self.bits)[0][:-1])
+
+    def inflate(self, compressed_data: bytes, offset: int, length: int) -> bytes:
+        """
+        Decompress data from the index point.
+
+        :param compressed_data: the compressed data from the index point, starting one byte before it if bits > 0, as
+        bytes or any object supporting the buffer protocol, e.g. a memoryview
+        :param offset: offset of the data to retrieve from the index point (in bytes)
+        :param length: length of the data to retrieve (in bytes)
+        :return: the uncompressed data
+        """
+        decompressor = self.decompressor.copy()
+        if self.bits:
+            # The deflate stream starts in the high bits of the first byte: its low bits end the empty block, then the
+            # rest of the data is inflated without copying it
+            block, _ = empty_block(8 - self.bits)
+            decompressor.decompress(bytes([block[-1] | (compressed_data[0] & (0xff << (8 - self.bits)) & 0xff)]))
+            compressed_data = memoryview(compressed_data)[1:]
+        return decompressor.decompress(compressed_data, offset + length)[offset:]
+
+
+def inflate(compressed_data: bytes, bits: int, window: bytes, offset: int, length: int) -> bytes:
+    """
+    Decompress raw deflate data from a zran index point with zlib (see InflateContext).
+
+    :param compressed_data: the compressed data from the index point, starting one byte before it if bits > 0, as bytes
+    or any object supporting the buffer protocol, e.g. a memoryview
+    :param bits: the number of bits of the index point in the byte before it
+    :param window: the 32 KB of uncompressed data before the index point
+    :param offset: offset of the data to retrieve from the index point (in bytes)
+    :param length: length of the data to retrieve (in bytes)
+    :return: the uncompressed data
+    """
+    return InflateContext(bits, window).inflate(compressed_data, offset, length)
+
+
 class Index(zran.Index):
     """
     The zran_index.Index class is an interface to the zran.Index class.
@@ -97,9 +231,30 @@ class Index(zran.Index):
         lo = bisect.bisect(self.outloc, loc) - 1
         return self.points[lo]
 
+    def get_points(self, locs: list[int]) -> list[zran.Point]:
+        """
+        Return the closest zran index point before each of several locations.
+
+        :param locs: locations (in bytes) in the decompressed data
+        :return: the closest zran index point before each location
+        """
+        numbers = np.searchsorted(np.asarray(self.outloc, dtype='i8'), np.asarray(locs, dtype='i8'), side='right') - 1
+        return [self.points[number] for number in numbers.tolist()]
+
+    def prefetch_points(self, locs: list[int]) -> None:
+        """
+        Read at once the index points that will be used to decompress data from several locations.
+
+        The points of a zran_index.Index are in memory: the subclasses that read their points from a file override this
+        method.
+
+        :param locs: locations (in bytes) in the decompressed data
+        """
+        pass
+
     # Read and decompress only the required amount of data
     def decompress(self, f: BinaryIO | bytes, offset: int, length: int, whence: int = 1,
-                   shuffle: bool = False, bps: int = None) -> bytes:
+                   shuffle: bool = False, bps: int = None, threads: int = 1) -> bytes:
         """
         Partially decompress a binary stream using a zran index.
 
@@ -115,6 +270,8 @@ class Index(zran.Index):
          - the file’s end (2).
         :param shuffle: whether the shuffle filter has been applied before the data compression
         :param bps: (only required if shuffle=True) number of bytes per sample in the data
+        :param threads: number of threads used to inflate the data. With several threads, the data is split at the
+        index points and the pieces are inflated in parallel.
         :return: the uncompressed byte array.
         """
 
@@ -122,25 +279,102 @@ class Index(zran.Index):
         if shuffle:
             if not bps:
                 raise ValueError('bps is required when shuffle = True')
-            return self.decompress_shuffle(f, int(offset / bps), int(length / bps), bps)
+            return self.decompress_shuffle(f, int(offset / bps), int(length / bps), bps, whence=whence,
+                                           threads=threads)
 
-        # Get the starting index point
-        starting_point = self.get_point(offset)
+        # Inflate the pieces of data between the index points in parallel
+        if threads > 1:
+            out = np.empty(int(length), dtype='u1')
+            self.decompress_into(f, out, offset, whence=whence, threads=threads)
+            return out.tobytes()
 
-        # Compute the offsets corresponding to the starting access point
-        # in the decompressed (out) and compressed (in) data
-        offset_out = starting_point.outloc
-        # Keep one more byte if some bits are required from the previous byte
-        offset_in = starting_point.inloc - int(starting_point.bits > 0)
+        # Find the compressed data required to decompress the data we want to retrieve
+        starting_point, offset_in, length_in = self._compressed_range(offset, length)
+
+        # Read compressed data from the input file
+        if isinstance(f, bytes):
+            compressed_data = f[offset_in:offset_in+length_in]
+        else:
+            compressed_data = read_offset(f, offset_in, length_in, whence=whence)
+
+        # Decompress the data read using the index
+        return self._inflate(compressed_data, starting_point, offset_in, offset, length)
+
+    def decompress_into(self, f: BinaryIO | bytes, out, offset: int, whence: int = 1, shuffle: bool = False,
+                        bps: int = None, threads: int = 1) -> int:
+        """
+        Partially decompress a binary stream using a zran index, into a buffer provided by the caller.
+
+        Same as decompress(), except that the uncompressed data is written, un-shuffled if required, into `out`
+        instead of a new bytes object: `out` can be a view into the final result array, e.g. out=array[i:j].
+
+        :param f: input file object containing the data compressed with deflate
+        :param out: a writable C-contiguous buffer (bytearray, memoryview, numpy array...) whose length in bytes is the
+        length of the uncompressed data to retrieve
+        :param offset: offset from which to retrieve the uncompressed data (in bytes)
+        :param whence: (Optional) Whether the `offset` is relative to the beginning of the input file `f` (0), or the
+        current position (default=1)
+        :param shuffle: whether the shuffle filter has been applied before the data compression
+        :param bps: (only required if shuffle=True) number of bytes per sample in the data
+        :param threads: number of threads used to inflate the data (see decompress())
+        :return: the number of bytes written in out
+        """
+        buffer = np.frombuffer(out, dtype='u1')
+        length = len(buffer)
+
+        if shuffle:
+            if not bps:
+                raise ValueError('bps is required when shuffle = True')
+            self._decompress_shuffle_into(f, buffer.reshape(-1, bps), offset // bps, bps, whence=whence,
+                                          threads=threads)
+            return length
+
+        # Find and read the compressed data required to decompress the data we want to retrieve. The pieces inflated
+        # in parallel find their own starting point
+        offset_in, length_in = self._compressed_bounds(offset, length)
+        if isinstance(f, bytes):
+            compressed_data = f[offset_in:offset_in+length_in]
+        else:
+            compressed_data = read_offset(f, offset_in, length_in, whence=whence)
+
+        if threads > 1:
+            # Inflate the pieces of data between the index points in parallel
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                for future in self._inflate_pieces(executor, compressed_data, offset_in, offset, length, buffer):
+                    future.result()
+        else:
+            buffer[:] = np.frombuffer(self._inflate(compressed_data, self.get_point(offset), offset_in, offset,
+                                                    length), dtype='u1')
+        return length
+
+    def _inflate_pieces(self, executor: Executor, compressed_data: bytes, offset_in: int, offset: int, length: int,
+                        out: np.ndarray) -> list[Future]:
+        # Split the data at the index points and submit the inflation of each piece into its place in the out array.
+        # The compressed data has been read from offset_in.
+        bounds = [offset] + [int(o) for o in self.outloc if offset < o < offset + length] + [offset + length]
 
-        # Create a new index point with modified offset
-        new_index_point = Index.Point(inloc=int(starting_point.bits > 0), outloc=0,
-                                      bits=starting_point.bits, window=starting_point.window)
+        def inflate_piece(piece_offset, piece_length):
+            point, piece_in, piece_length_in = self._compressed_range(piece_offset, piece_length)
+            data = compressed_data[piece_in - offset_in:piece_in - offset_in + piece_length_in]
+            out[piece_offset - offset:piece_offset - offset + piece_length] = np.frombuffer(
+                self._inflate(data, point, piece_in, piece_offset, piece_length), dtype='u1')
 
-        # Create an index object
-        index = Index(points=[new_index_point],
-                      compressed_size=int(self.compressed_size - offset_in),
-                      uncompressed_size=int(self.uncompressed_size - offset_out), span=self.span)
+        return [executor.submit(inflate_piece, start, stop - start) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def _compressed_range(self, offset: int, length: int) -> tuple[zran.Point, int, int]:
+        # Return the starting index point and the (offset, length) of the compressed data required to decompress
+        # length bytes from offset in the uncompressed data
+        return self.get_point(offset), *self._compressed_bounds(offset, length)
+
+    def _compressed_bounds(self, offset: int, length: int) -> tuple[int, int]:
+        # Return the (offset, length) of the compressed data required to decompress length bytes from offset in the
+        # uncompressed data, without reading the window of the starting index point
+
+        # Get the number of the starting index point
+        number = bisect.bisect(self.outloc, offset) - 1
+
+        # Keep one more byte if some bits are required from the previous byte
+        offset_in = self.inloc[number] - int(self._point_bits(number) > 0)
 
         # Find the location in the compressed data of the index point after the data we want to retrieve,
         # i.e. after offset + length in the uncompressed data
@@ -148,41 +382,461 @@ class Index(zran.Index):
         # Compute the compressed data length we need to read between the two access points
         # Note: we will read up to the end of the compressed file if we go beyond the last index point
         end_in = self.inloc[hi] if hi < len(self.inloc) else self.compressed_size
-        length_in = end_in - offset_in
+        return int(offset_in), int(end_in - offset_in)
 
-        # Read compressed data from the input file
-        if isinstance(f, bytes):
-            compressed_data = f[offset_in:offset_in+length_in]
+    def _point_bits(self, number: int) -> int:
+        # Return the number of bits of an index point in the byte before it
+        return int(self.points[number].bits)
+
+    def _inflate(self, compressed_data: bytes, starting_point: zran.Point, offset_in: int, offset: int,
+                 length: int) -> bytes:
+        # Decompress length bytes from offset in the uncompressed data, from the compressed data read from offset_in
+        return self.inflate_context(starting_point).inflate(compressed_data, int(offset - starting_point.outloc),
+                                                            int(length))
+
+    @cached_property
+    def contexts(self) -> OrderedDict:
+        # Decompression contexts of the index points, by location of the point in the uncompressed data
+        return OrderedDict()
+
+    def inflate_context(self, point: zran.Point) -> InflateContext:
+        """
+        Return the decompression context of an index point, reused by the decompressions from that point.
+
+        At most MAX_CONTEXTS contexts are kept by the index, the least recently used ones are dropped first.
+
+        :param point: an index point of the index
+        :return: the decompression context of the point
+        """
+        key = int(point.outloc)
+        context = self.contexts.get(key)
+        if context is not None:
+            # The context may have been dropped by another thread in the meantime
+            with contextlib.suppress(KeyError):
+                self.contexts.move_to_end(key)
+            return context
+        context = InflateContext(point.bits, point.window)
+        self.contexts[key] = context
+        while len(self.contexts) > MAX_CONTEXTS:
+            with contextlib.suppress(KeyError):
+                self.contexts.popitem(last=False)
+        return context
+
+    def cursor(self, f: BinaryIO | bytes, whence: int = 1, shuffle: bool = False, bps: int = None) -> 'InflateCursor':
+        """
+        Return a cursor that keeps the decompression state between sequential reads (see InflateCursor).
+
+        :param f: input file object containing the data compressed with deflate, or the compressed data
+        :param whence: (Optional) Whether the offsets are relative to the beginning of the input file `f` (0), or the
+        current position (default=1)
+        :param shuffle: whether the shuffle filter has been applied before the data compression
+        :param bps: (only required if shuffle=True) number of bytes per sample in the data
+        :return: the cursor
+        """
+        return InflateCursor(self, f, whence=whence, shuffle=shuffle, bps=bps)
+
+    def plan_ranges(self, ranges: np.ndarray, shuffle: bool = False, bps: int = None,
+                    cost_model: read_planner.CostModel = None) -> read_planner.Plan:
+        """
+        Plan the reads required to decompress several ranges of the uncompressed data (see decompress_ranges()).
+
+        :param ranges: an array of shape (n, 2) of the (start, stop) of the ranges of uncompressed data to retrieve (in
+        bytes), in increasing order and without overlap
+        :param shuffle: whether the shuffle filter has been applied before the data compression
+        :param bps: (only required if shuffle=True) number of bytes per sample in the data
+        :param cost_model: the cost model of the reads. Default: read_planner.CostModel()
+        :return: the plan of the reads
+        """
+        ranges = np.asarray(ranges, dtype='i8').reshape(-1, 2)
+        if shuffle:
+            if not bps:
+                raise ValueError('bps is required when shuffle = True')
+            # The bytes of the samples of a range are in bps ranges of the shuffled stream, one per byte plane
+            n_samples = int(self.uncompressed_size) // bps
+            ranges = (ranges // bps)[None, :, :] + (np.arange(bps) * n_samples)[:, None, None]
+
+        return read_planner.plan_reads(self, ranges.reshape(-1, 2), cost_model)
+
+    def decompress_ranges(self, f: BinaryIO | bytes, ranges: np.ndarray, whence: int = 1, shuffle: bool = False,
+                          bps: int = None, cost_model: read_planner.CostModel = None,
+                          plan: read_planner.Plan = None, out=None) -> tuple[bytes, read_planner.Plan]:
+        """
+        Partially decompress several ranges of a binary stream using a zran index.
+
+        The reads of compressed data are planned with read_planner.plan_reads(): close ranges are decompressed
+        together, distant ranges are decompressed separately from their closest index point.
+
+        :param f: input file object containing the data compressed with deflate
+        :param ranges: an array of shape (n, 2) of the (start, stop) of the ranges of uncompressed data to retrieve (in
+        bytes), in increasing order and without overlap
+        :param whence: (Optional) Whether the offsets are relative to the beginning of the input file `f` (0), or the
+        current position (default=1)
+        :param shuffle: whether the shuffle filter has been applied before the data compression
+        :param bps: (only required if shuffle=True) number of bytes per sample in the data
+        :param cost_model: the cost model of the reads. Default: read_planner.CostModel()
+        :param plan: (Optional) the plan of the reads, if already computed with plan_ranges()
+        :param out: (Optional) a writable C-contiguous buffer in which the uncompressed bytes of the ranges are written
+        (see decompress_into()), instead of a new bytes object
+        :return: the uncompressed bytes of the ranges, concatenated (or out), and the plan of the reads.
+        """
+        if plan is None:
+            plan = self.plan_ranges(ranges, shuffle=shuffle, bps=bps, cost_model=cost_model)
+
+        # The ranges are written in out, except the byte planes of shuffled data, which are un-shuffled into out
+        if out is None or shuffle:
+            buffer = np.empty(plan.requested_bytes, dtype='u1')
         else:
-            compressed_data = read_offset(f, offset_in, length_in, whence=whence)
+            buffer = np.frombuffer(out, dtype='u1')
+
+        # Decompress each read and copy the requested ranges in the buffer
+        for read in plan.reads:
+            if len(read.ranges) == 1 and tuple(read.ranges[0][:2]) == (read.start, read.stop):
+                # The read serves a single range: decompress it in its place
+                destination = read.ranges[0][2]
+                self.decompress_into(f, buffer[destination:destination + read.stop - read.start], read.start,
+                                     whence=whence)
+                continue
+            data = np.frombuffer(self.decompress(f, read.start, read.stop - read.start, whence=whence), dtype='u1')
+            for start, stop, destination in read.ranges:
+                buffer[destination:destination + stop - start] = data[start - read.start:stop - read.start]
 
-        # Decompress the data read using the index
-        return zran.decompress(compressed_data, index, offset - offset_out, int(length))
+        if shuffle:
+            # Un-shuffle the byte planes: the buffer contains the bytes of each plane of the samples, plane by plane
+            unshuffled = np.empty(plan.requested_bytes, dtype='u1') if out is None else out
+            unshuffle_into(buffer, bps, unshuffled)
+            buffer = unshuffled
+        return (buffer.tobytes() if out is None else out), plan
+
+    async def decompress_async(self, fs, path: str, offset: int, length: int, base: int = 0, shuffle: bool = False,
+                               bps: int = None, cost_model: read_planner.CostModel = None,
+                               executor: Executor = None) -> bytes:
+        """
+        Partially decompress a binary stream read through an asynchronous fsspec filesystem using a zran index.
 
-    def decompress_shuffle(self, f: BinaryIO, offset: int, length: int, bps: int) -> bytes:
+        The compressed ranges required by the planned reads (see decompress_ranges()) are fetched at the same time with
+        the filesystem, then the data is decompressed in an executor.
+
+        :param fs: an asynchronous fsspec filesystem, e.g. fsspec.filesystem('http', asynchronous=True)
+        :param path: the path of the dataset in the filesystem
+        :param offset: offset from which to retrieve the uncompressed data (in bytes)
+        :param length: length of the uncompressed data chunk to retrieve (in bytes)
+        :param base: the offset of the compressed data in the dataset, e.g. the byte offset of the chunk (in bytes)
+        :param shuffle: whether the shuffle filter has been applied before the data compression
+        :param bps: (only required if shuffle=True) number of bytes per sample in the data
+        :param cost_model: the cost model of the reads. Default: read_planner.CostModel()
+        :param executor: the executor of the decompression. Default: the default executor of the event loop
+        :return: the uncompressed byte array.
+        """
+        plan = self.plan_ranges([[offset, offset + length]], shuffle=shuffle, bps=bps, cost_model=cost_model)
+
+        # Fetch the compressed ranges of all the reads at once
+        starts = [base + read.point_inloc for read in plan.reads]
+        ends = [base + read.compressed_stop for read in plan.reads]
+        buffers = await fs._cat_ranges([path] * len(starts), starts, ends)
+
+        # Decompress the data from the fetched ranges
+        f = BufferFile([(read.point_inloc, data) for read, data in zip(plan.reads, buffers)])
+        data, _ = await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(self.decompress_ranges, f, [[offset, offset + length]], whence=0,
+                                        shuffle=shuffle, bps=bps, plan=plan))
+        return data
+
+    def decompress_shuffle(self, f: BinaryIO | bytes, offset: int, length: int, bps: int, whence: int = 1,
+                           threads: int = 1) -> bytes:
         """
         Decompress a chunk of data applying un-shuffling if required.
 
+        The bps byte planes of the samples are decompressed from a single read of the union of the compressed data they
+        require, and each plane is written in its place in the output buffer, i.e. un-shuffled, as it is inflated.
+
         :param f:          open file object pointer set at the beginning of the chunk
-        :param offset:     offset of the area we want to decompress in that chunk (in bytes)
-        :param length:     length of the area we want to decompress in that chunk (in bytes)
+        :param offset:     offset of the area we want to decompress in that chunk (in samples)
+        :param length:     length of the area we want to decompress in that chunk (in samples)
         :param bps:        number of bytes per sample in the data
+        :param whence:     (Optional) Whether the offsets are relative to the beginning of the input file `f` (0), or
+        the current position (default=1)
+        :param threads:    number of threads used to inflate the byte planes, and their pieces between the index
+        points, in parallel
         :return: the decompressed binary array
         """
 
+        out = np.empty((int(length), bps), dtype='u1')
+        self._decompress_shuffle_into(f, out, offset, bps, whence=whence, threads=threads)
+        return out.tobytes()
+
+    def _decompress_shuffle_into(self, f: BinaryIO | bytes, out: np.ndarray, offset: int, bps: int, whence: int = 1,
+                                 threads: int = 1) -> None:
+        # Decompress the samples from offset (in samples) into out, an array of shape (length, bps) of unsigned bytes:
+        # the byte i of the samples is the byte plane i of the shuffled data (see decompress_shuffle())
+        length = len(out)
+
         # Compute the number of samples in the chunk
         n_samples = int(self.uncompressed_size / bps)
 
-        # Create the data stream
-        binary_stream = b''
-        # Decompress each portion of the data stream, one portion per byte
-        for i in range(bps):
-            # Decompress the data
-            binary_stream += self.decompress(f, offset, length, whence=1)
-            offset += n_samples
+        # Find the compressed data required by each byte plane
+        planes = [self._compressed_bounds(i * n_samples + offset, length) for i in range(bps)]
+
+        # Merge the overlapping or adjacent compressed ranges, and read them
+        merged = []
+        for offset_in, length_in in sorted(planes):
+            if merged and offset_in <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], offset_in + length_in)
+            else:
+                merged.append([offset_in, offset_in + length_in])
+        reads = []
+        for start, stop in merged:
+            data = f[start:stop] if isinstance(f, bytes) else read_offset(f, start, stop - start, whence=whence)
+            reads.append((start, data))
+
+        # Decompress each plane in its place in the output buffer: the byte i of each sample
+        executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        futures = []
+        for i, (offset_in, length_in) in enumerate(planes):
+            start, data = next((start, data) for start, data in reads if start <= offset_in < start + len(data))
+            compressed_data = data[offset_in - start:offset_in - start + length_in]
+            if executor is not None:
+                futures += self._inflate_pieces(executor, compressed_data, offset_in, i * n_samples + offset, length,
+                                                out[:, i])
+            else:
+                out[:, i] = np.frombuffer(self._inflate(compressed_data, self.get_point(i * n_samples + offset),
+                                                        offset_in, i * n_samples + offset, length), dtype='u1')
+        if executor is not None:
+            with executor:
+                for future in futures:
+                    future.result()
+
+
+class ArrayIndex(Index):
+    """
+    Compact zran index whose points are loaded on demand.
+
+    The locations of the index points are kept in NumPy arrays, and the 32 KB windows are only read when a point is
+    used, from a backing store: a numpy array, a memory-mapped file (see from_index()) or a h5py dataset. The points
+    used to decompress several ranges can be looked up at once with get_points(), which reads their windows with a
+    single selection of the store.
+
+    Usage example:
+
+        index = ArrayIndex.from_index(create_index(compressed_data, span=span), path='windows.npy')
+        data = index.decompress(compressed_data, offset, length)
+    """
+
+    def __init__(self, outloc: np.ndarray, inloc: np.ndarray, bits: np.ndarray, windows, compressed_size: int,
+                 uncompressed_size: int, span: int, mode: int = MODE_ZLIB):
+        """
+        Create an ArrayIndex object.
+
+        :param outloc: the locations of the index points in the uncompressed data, in increasing order, starting at 0
+        :param inloc: the locations of the index points in the compressed data
+        :param bits: the number of bits of the index points in the byte before them
+        :param windows: the windows of the index points: an array-like of shape (points, 32768) indexed by the number of
+        the point, e.g. a numpy.memmap or a h5py dataset
+        :param compressed_size: the compressed size of the data to which this index applies
+        :param uncompressed_size: the uncompressed size of the data to which this index applies
+        :param span: number of uncompressed bytes between the index points
+        :param mode: the mode of the index
+        """
+        self.outloc = np.asarray(outloc, dtype='i8')
+        self.inloc = np.asarray(inloc, dtype='i8')
+        self.bits = np.asarray(bits, dtype='i8')
+        self.windows = windows
+        self.first_point = 0
+        self.compressed_size = int(compressed_size)
+        self.uncompressed_size = int(uncompressed_size)
+        self.span = span
+        self.mode = mode
+        # Windows read in advance by prefetch_points(), by number of the point
+        self.prefetched = {}
+
+    @classmethod
+    def from_index(cls, index: Index, path: str = None) -> 'ArrayIndex':
+        """
+        Convert an index whose points are in memory into an ArrayIndex.
+
+        :param index: the index to convert
+        :param path: (Optional) a .npy file in which the windows are written, then memory-mapped. Default: the windows
+        are kept in a numpy array
+        :return: the ArrayIndex
+        """
+        points = index.points
+        windows = np.empty((len(points), WINDOW_LENGTH), dtype='u1')
+        for row, point in zip(windows, points):
+            row[:] = np.frombuffer(bytes(point.window), dtype='u1')
+        if path is not None:
+            np.save(path, windows)
+            windows = np.load(path, mmap_mode='r')
+        return cls([p.outloc for p in points], [p.inloc for p in points], [p.bits for p in points], windows,
+                   index.compressed_size, index.uncompressed_size, index.span, mode=index.mode)
+
+    @property
+    def points(self) -> list[zran.Point]:
+        """
+        Return all the index points, reading all their windows.
+        """
+        return self.get_points(self.outloc)
+
+    def get_point(self, loc: int) -> zran.Point:
+        """
+        Return the closest zran index point before loc.
+
+        :param loc: location (in bytes) in the decompressed data
+        :return: the closest zran index point before loc
+        """
+        return self.get_points([loc])[0]
+
+    def get_points(self, locs: list[int]) -> list[zran.Point]:
+        """
+        Return the closest zran index point before each of several locations.
+
+        The points are found with a single vectorized search, and the windows that have not been prefetched are read
+        with a single selection of the store.
+
+        :param locs: locations (in bytes) in the decompressed data
+        :return: the closest zran index point before each location
+        """
+        numbers = np.searchsorted(self.outloc, np.asarray(locs, dtype='i8'), side='right') - 1
+        windows = self.prefetched
+        missing = [number for number in np.unique(numbers).tolist() if number not in windows]
+        if missing:
+            windows = {**windows, **dict(zip(missing, self._read_windows(missing)))}
+        return [Index.Point(outloc=int(self.outloc[number]), inloc=int(self.inloc[number]),
+                            bits=int(self.bits[number]), window=windows[number]) for number in numbers.tolist()]
+
+    def prefetch_points(self, locs: list[int]) -> None:
+        """
+        Read at once the windows of the index points that will be used to decompress data from several locations.
+
+        Only the windows of the last call are kept.
 
-        # Do unshuffling
-        return unshuffle(binary_stream, bps)
+        :param locs: locations (in bytes) in the decompressed data
+        """
+        numbers = np.unique(np.searchsorted(self.outloc, np.asarray(locs, dtype='i8'), side='right') - 1).tolist()
+        self.prefetched = dict(zip(numbers, self._read_windows(numbers))) if numbers else {}
+
+    def _point_bits(self, number: int) -> int:
+        return int(self.bits[number])
+
+    def _read_windows(self, numbers: list[int]) -> list[bytes]:
+        # Read the windows of the points, given by their numbers in increasing order, with a single selection
+        rows = self.windows[[self.first_point + number for number in numbers]]
+        return [row.tobytes() for row in rows]
+
+
+class InflateCursor:
+    """
+    Cursor that keeps the state of the decompression of a chunk between sequential reads.
+
+    A read that starts at or after the end of the previous one continues the decompression where it stopped: only the
+    new bytes are inflated, and the compressed data is read from where the previous read stopped. A read before the
+    current position, or after an index point beyond it, restarts from the closest index point.
+
+    For shuffled data, each byte plane has its own cursor.
+
+    Usage example:
+
+        cursor = index.cursor(f, whence=0)
+        for offset in range(0, index.uncompressed_size, length):
+            data = cursor.read(offset, length)
+    """
+
+    def __init__(self, index: 'Index', f: BinaryIO | bytes, whence: int = 1, shuffle: bool = False,
+                 bps: int = None, read_size: int = CURSOR_READ_SIZE):
+        """
+        Create an InflateCursor object.
+
+        :param index: the zran index of the chunk
+        :param f: input file object containing the data compressed with deflate, or the compressed data
+        :param whence: (Optional) Whether the offsets in the compressed data are relative to the beginning of the input
+        file `f` (0), or the current position (default=1)
+        :param shuffle: whether the shuffle filter has been applied before the data compression
+        :param bps: (only required if shuffle=True) number of bytes per sample in the data
+        :param read_size: the number of compressed bytes read at once
+        """
+        if shuffle and not bps:
+            raise ValueError('bps is required when shuffle = True')
+        self.index = index
+        self.f = f
+        self.whence = whence
+        self.bps = bps if shuffle else None
+        self.read_size = read_size
+        # Cursors of the byte planes of shuffled data
+        self.planes = [InflateCursor(index, f, whence, read_size=read_size) for _ in range(bps)] if shuffle else None
+        # Decompression state: the zlib stream, the position in the uncompressed data, the position of the next
+        # compressed bytes to read and the compressed bytes read but not inflated yet
+        self.decompressor = None
+        self.position = 0
+        self.position_in = 0
+        self.tail = b''
+        # Number of restarts from an index point and of uncompressed bytes inflated
+        self.restarts = 0
+        self.inflated_bytes = 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        Decompress length bytes from offset in the uncompressed data.
+
+        :param offset: offset from which to retrieve the uncompressed data (in bytes)
+        :param length: length of the uncompressed data to retrieve (in bytes)
+        :return: the uncompressed data, shorter than length if the end of the data is reached
+        """
+        if self.planes is not None:
+            # Read the byte i of the samples from the byte plane i
+            n_samples = int(self.index.uncompressed_size) // self.bps
+            planes = [plane.read(i * n_samples + offset // self.bps, min(length // self.bps,
+                                                                          max(0, n_samples - offset // self.bps)))
+                      for i, plane in enumerate(self.planes)]
+            out = np.empty((min(len(plane) for plane in planes), self.bps), dtype='u1')
+            for i, plane in enumerate(planes):
+                out[:, i] = np.frombuffer(plane, dtype='u1', count=len(out))
+            return out.tobytes()
+
+        point = self.index.get_point(offset)
+        if self.decompressor is None or offset < self.position or point.outloc > self.position:
+            self._restart(point)
+        # Skip the data up to offset, then inflate the data requested. The end of the data, or of the compressed data
+        # if it is truncated, stops the decompression
+        while self.position < offset:
+            if not self._inflate(min(offset - self.position, SKIP_SIZE)):
+                return b''
+        return self._inflate(length)
+
+    def _restart(self, point: zran.Point) -> None:
+        # Restart the decompression from an index point
+        context = self.index.inflate_context(point)
+        self.decompressor = context.decompressor.copy()
+        self.position = int(point.outloc)
+        self.position_in = int(point.inloc)
+        self.tail = b''
+        if context.bits:
+            # Merge the bits of the byte before the point with the end of the empty block (see InflateContext)
+            block, _ = empty_block(8 - context.bits)
+            first = self._read_compressed(self.position_in - 1, 1)[0]
+            self.decompressor.decompress(bytes([block[-1] | (first & (0xff << (8 - context.bits)) & 0xff)]))
+        self.restarts += 1
+
+    def _read_compressed(self, offset: int, length: int) -> bytes:
+        # Read compressed bytes from the input file or the compressed data
+        if isinstance(self.f, bytes):
+            return self.f[offset:offset + length]
+        return read_offset(self.f, offset, length, whence=self.whence)
+
+    def _inflate(self, length: int) -> bytes:
+        # Inflate length bytes from the current position, reading the compressed data by blocks of read_size bytes
+        pieces = []
+        while length > 0 and not self.decompressor.eof:
+            if not self.tail:
+                size = min(self.read_size, int(self.index.compressed_size) - self.position_in)
+                self.tail = self._read_compressed(self.position_in, size) if size > 0 else b''
+                if not self.tail:
+                    break
+                self.position_in += len(self.tail)
+            data = self.decompressor.decompress(self.tail, length)
+            self.tail = self.decompressor.unconsumed_tail
+            pieces.append(data)
+            length -= len(data)
+            self.position += len(data)
+        self.inflated_bytes += sum(len(piece) for piece in pieces)
+        return b''.join(pieces)
 
 
 def create_index(*args, **kwargs):
@@ -11,33 +11,118 @@
 #WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #See the License for the specific language governing permissions and
 #limitations under the License.
+import contextlib
 import io
+import math
 import os
-from typing import Generator, Iterable, Any
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generator, Iterable, Iterator, Any
 import numpy as np
 import json
 import xarray.backends
-from chunkindex.core import zran_xarray
+from chunkindex.core.index_cache import IndexCache
+from chunkindex.core.index_format import split_chunk_path, chunk_path
+from chunkindex.core.range_reader import RangeReader, RangeFile, BufferFile, MAX_GAP, coalesce_ranges, split_buffers
+from chunkindex.util.multi_dimensional_slice import linear_offset_bounds, slice_view, virtual_chunk_shape
 from fsspec.implementations.reference import ReferenceFileSystem, _protocol_groups
 
+MAX_METADATA = 1024  # maximum number of parsed .zarray kept
+MAX_FILES = 16  # maximum number of dataset files kept open
+MAX_WORKERS = 4  # number of threads that open the chunk indexes and decompress the chunks of a batch
+
+
+def _resolve_range(offset: int, length: int | None, size: int) -> tuple[int, int]:
+    # Resolve the offset and the length of a request in data of the given size as a slice does: a negative offset is
+    # relative to the end of the data, a length of None reads up to the end, and the range is clipped to the data
+    offset = max(0, int(offset) + size) if offset < 0 else min(int(offset), size)
+    length = size - offset if length is None else max(0, min(int(length), size - offset))
+    return offset, length
+
 
 class ZranReferenceFileSystem(ReferenceFileSystem):
     """
     The class ZranReferenceFileSystem herits of the class fsspec.implementations.reference.ReferenceFileSystem.
 
     It adds the capabilities to read partial chunks using a zran index.
+
+    The parsed .zarray of the variables, the opened chunk indexes and the opened dataset files are kept in bounded LRU
+    caches, so that the reads of several parts of the same chunks only open them once. The hits and misses of the
+    caches are given by cache_stats.
+
+    With virtual_chunk_size, the deflate compressed variables are presented with a finer grid of uncompressed virtual
+    chunks (see virtual_chunks()): each virtual chunk is a contiguous range of a chunk of the dataset, decompressed
+    with the zran index of that chunk. The clients that only read whole chunks, e.g. zarr.open() or
+    xarray.open_zarr() with dask, then decompress only the parts of the chunks they need. In this mode, the chunk paths
+    given to the methods of the filesystem are the paths of the virtual chunks.
     """
 
-    def __init__(self, index: str | os.PathLike[Any] | io.BufferedIOBase | xarray.backends.AbstractDataStore, **kwargs):
+    def __init__(self, index: str | os.PathLike[Any] | io.BufferedIOBase | xarray.backends.AbstractDataStore,
+                 index_cache: IndexCache = None, method: str = 'xarray', max_metadata: int = MAX_METADATA,
+                 max_files: int = MAX_FILES, max_workers: int = MAX_WORKERS, max_gap: int = MAX_GAP,
+                 virtual_chunk_size: int = None, **kwargs):
         """
         Create a ZranReferenceFileSystem object.
 
         :param index: a file path or file-like object or a xarray DataStore that contains the index data
         as a zran_xarray.Index object and that can be opened using xarray.open_dataset() method.
+        :param index_cache: the cache of the opened chunk indexes. Default: a cache owned by the filesystem
+        :param method: select which lib to use to open the chunk indexes: h5py or xarray
+        :param max_metadata: maximum number of parsed .zarray kept
+        :param max_files: maximum number of dataset files kept open
+        :param max_workers: number of threads that open the chunk indexes and decompress the chunks of a batch (see
+        get_partial_values_batch())
+        :param max_gap: the compressed ranges of a batch separated by at most max_gap bytes are fetched with a single
+        request
+        :param virtual_chunk_size: maximum size of the virtual chunks presented in place of the chunks of the deflate
+        compressed variables (in bytes). Default: the chunks of the dataset are presented
         :param kwargs: see fsspec.ReferenceFileSystem documentation.
         """
         self.index_path = index
-        super().__init__(**kwargs)
+        self.index_cache = IndexCache() if index_cache is None else index_cache
+        self.method = method
+        self.max_metadata = max_metadata
+        self.max_files = max_files
+        self.max_workers = max_workers
+        self.virtual_chunk_size = virtual_chunk_size
+        self.executor = None
+        self.metadata_cache = OrderedDict()
+        self.file_cache = OrderedDict()
+        # Number of users of the opened dataset files, and files evicted from the cache while they are used
+        self.file_users = Counter()
+        self.evicted_files = set()
+        self.cache_lock = threading.RLock()
+        # Counters of the hits and misses of the metadata and file caches
+        self.counters = Counter()
+        # max_gap is also used by ReferenceFileSystem.cat() to merge the ranges of the whole chunks
+        super().__init__(max_gap=max_gap, **kwargs)
+
+    @property
+    def cache_stats(self) -> dict:
+        """
+        Return the counters of the hits and misses of the metadata, index and file caches.
+        """
+        stats = {name: self.counters[name] for name in ('metadata_hits', 'metadata_misses', 'file_hits',
+                                                        'file_misses')}
+        stats.update({'index_hits': self.index_cache.index_hits, 'index_misses': self.index_cache.index_misses})
+        return stats
+
+    def _cached(self, cache: OrderedDict, key: Any, create: Callable, max_size: int, name: str,
+                evict: Callable = None) -> Any:
+        # Return the value of key in a LRU cache, creating it if needed, and count the hits and misses
+        with self.cache_lock:
+            if key in cache:
+                cache.move_to_end(key)
+                self.counters[name + '_hits'] += 1
+                return cache[key]
+            self.counters[name + '_misses'] += 1
+            value = cache[key] = create()
+            while len(cache) > max_size:
+                _, evicted = cache.popitem(last=False)
+                if evict is not None:
+                    evict(evicted)
+            return value
 
     def get_metadata(self, path: str, attrs: Iterable[str]) -> Generator:
         """
@@ -48,22 +133,211 @@ class ZranReferenceFileSystem(ReferenceFileSystem):
         :return: a list that contains the values of the attributes
         """
         # path example: 'x/0.0' where 'x' is the variable
-        var = path.split('/')[0]
-        return (json.loads(self.references[var + '/.zarray'])[a] for a in attrs)
+        var = path.rpartition('/')[0]
+        zarray = self._cached(self.metadata_cache, var, lambda: json.loads(self.references[var + '/.zarray']),
+                              self.max_metadata, 'metadata')
+        return (zarray[a] for a in attrs)
 
-    def get_partial_values(self, path: str, offset: int, length: int) -> bytes:
+    def decompressible(self, var: str) -> bool:
         """
-        Returns the data values read from the chunk defined by its path, but only from the offset and length.
+        Return whether the chunks of a variable are compressed with deflate, and optionally shuffled, so that any part
+        of them can be decompressed with their zran index.
 
-        This methods returns decompressed data.
+        :param var: the name of the variable e.g.: 'group_1/x'
+        :return: True if parts of the chunks of the variable can be decompressed
+        """
+        def create():
+            if var + '/.zarray' not in self.references:
+                return False
+            zarray = json.loads(self.references[var + '/.zarray'])
+            codecs = [f['id'] for f in (zarray['filters'] or []) + ([zarray['compressor']] if zarray['compressor']
+                                                                     else [])]
+            return 'zlib' in codecs and not set(codecs) - {'zlib', 'shuffle'}
 
-        :param path: path of the chunk in the dataset e.g.: 'x/0.0' where 'x' is the variable
-        :param offset: offset from which to read the data in the chunk (in bytes)
-        :param length: length of the uncompressed data chunk to retrieve (in bytes)
-        :return: the data read as a byte array.
+        return self._cached(self.metadata_cache, (var, 'decompressible'), create, self.max_metadata, 'metadata')
+
+    def virtual_chunks(self, var: str) -> tuple[int, ...] | None:
+        """
+        Return the shape of the virtual chunks of a variable.
+
+        The virtual chunks are the largest contiguous ranges of the chunks of at most virtual_chunk_size bytes, see
+        virtual_chunk_shape(). Only the variables compressed with deflate, and optionally shuffled, are rechunked.
+
+        :param var: the name of the variable e.g.: 'group_1/x'
+        :return: the shape of the virtual chunks, None if the chunks of the variable are presented as they are
+        """
+        if self.virtual_chunk_size is None:
+            return None
+
+        def create():
+            if not self.decompressible(var):
+                return None
+            chunks, dtype = self.get_metadata(var + '/.zarray', ('chunks', 'dtype'))
+            shape = virtual_chunk_shape(chunks, np.dtype(dtype).itemsize, self.virtual_chunk_size)
+            return None if list(shape) == list(chunks) else shape
+
+        return self._cached(self.metadata_cache, (var, 'virtual_chunks'), create, self.max_metadata, 'metadata')
+
+    def virtual_zarray(self, var: str) -> bytes:
+        """
+        Return the .zarray of a variable presented with virtual chunks: the virtual chunks are not compressed.
+
+        :param var: the name of the variable e.g.: 'group_1/x'
+        :return: the content of the .zarray file
+        """
+        zarray = json.loads(self.references[var + '/.zarray'])
+        zarray.update(chunks=list(self.virtual_chunks(var)), compressor=None, filters=None)
+        return json.dumps(zarray).encode()
+
+    def physical_chunk(self, path: str) -> tuple[str, int, int] | None:
+        """
+        Return the chunk of the dataset that contains a virtual chunk, and the range of the virtual chunk in it.
+
+        :param path: path of the virtual chunk e.g.: 'x/3.0'
+        :return: the path of the chunk of the dataset e.g.: 'x/1.0', the offset and the length of the virtual chunk in
+        the uncompressed data of that chunk (in bytes). None if the path is not a virtual chunk
+        """
+        var, _, name = path.rpartition('/')
+        if name.startswith('.') or self.virtual_chunks(var) is None:
+            return None
+        try:
+            _, coords = split_chunk_path(path)
+        except ValueError:
+            return None
+        shape = self.virtual_chunks(var)
+        chunks, dtype = self.get_metadata(path, ('chunks', 'dtype'))
+        if len(coords) != len(chunks):
+            return None
+
+        # The virtual chunks tile the chunks of the dataset
+        start = [c * n for c, n in zip(coords, shape)]
+        itemsize = np.dtype(dtype).itemsize
+        offset = int(np.ravel_multi_index([s % c for s, c in zip(start, chunks)], chunks)) * itemsize
+        return chunk_path(var, [s // c for s, c in zip(start, chunks)]), offset, math.prod(shape) * itemsize
+
+    def _physical_request(self, path: str, offset: int, length: int | None) -> tuple[str, int, int | None]:
+        # Return the (path, offset, length) of a request in the chunk of the dataset, for a request in a virtual chunk
+        location = self.physical_chunk(path)
+        if location is None:
+            return path, offset, length
+        path, chunk_offset, chunk_length = location
+        offset, length = _resolve_range(offset, length, chunk_length)
+        return path, chunk_offset + offset, length
+
+    def _virtual_zmetadata(self, path: str) -> bytes:
+        # Return the consolidated metadata of a group, with the .zarray of the variables presented with virtual chunks
+        group = path.rpartition('/')[0]
+        zmetadata = json.loads(super().cat_file(path))
+        for key in zmetadata['metadata']:
+            var, _, name = (group + '/' + key if group else key).rpartition('/')
+            if name == '.zarray' and self.virtual_chunks(var) is not None:
+                zmetadata['metadata'][key] = json.loads(self.virtual_zarray(var))
+        return json.dumps(zmetadata).encode()
+
+    def _cat_virtual(self, paths: list[str]) -> dict:
+        # Return the .zarray, the .zmetadata and the data of the virtual chunks among the paths, the virtual chunks
+        # being decompressed by a single get_partial_values_batch() call. The virtual chunks of missing chunks give a
+        # FileNotFoundError
+        if self.virtual_chunk_size is None:
+            return {}
+        out, chunk_paths = {}, []
+        for path in paths:
+            var, _, name = path.rpartition('/')
+            if name == '.zarray' and self.virtual_chunks(var) is not None:
+                out[path] = self.virtual_zarray(var)
+            elif name == '.zmetadata' and path in self.references:
+                out[path] = self._virtual_zmetadata(path)
+            elif self.physical_chunk(path) is not None:
+                chunk_paths.append(path)
+        for path, data in zip(chunk_paths, self.get_partial_values_batch([(path, 0, None) for path in chunk_paths])):
+            out[path] = FileNotFoundError(path) if data is None else data
+        return out
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        virtual = self._cat_virtual([path])
+        if path not in virtual:
+            return super().cat_file(path, start=start, end=end, **kwargs)
+        if isinstance(virtual[path], Exception):
+            raise virtual[path]
+        return virtual[path][start:end]
+
+    def cat(self, path, recursive=False, on_error='raise', **kwargs):
+        paths = [path] if isinstance(path, str) else list(path)
+        virtual = {} if recursive else self._cat_virtual(paths)
+        if not virtual:
+            return super().cat(path, recursive=recursive, on_error=on_error, **kwargs)
+
+        # Read the other paths as usual
+        others = [p for p in paths if p not in virtual]
+        out = super().cat(others, on_error=on_error, **kwargs) if others else {}
+        for p, data in virtual.items():
+            if isinstance(data, Exception) and on_error == 'raise':
+                raise data
+            if not isinstance(data, Exception) or on_error != 'omit':
+                out[p] = data
+        return out[path] if isinstance(path, str) else out
+
+    @contextlib.contextmanager
+    def open_dataset_file(self, proto: str, url: str) -> Iterator[RangeReader]:
         """
+        Return a range reader of a dataset file, opening the file only if it is not already opened.
+
+        The reader is used in a with block: a file evicted from the cache while other threads read it is only closed
+        at the end of the last block that uses it.
+
+        Usage example:
 
-        # Get the datatype of the variable read and the list of filters applied on this data
+            with fs.open_dataset_file(proto, url) as reader:
+                data = reader.read(offset, length)
+
+        :param proto: the protocol of the file
+        :param url: the url of the file
+        :return: the thread-safe range reader of the opened file
+        """
+        def open_file():
+            return RangeReader(self.fss[proto].open(url))
+
+        with self.cache_lock:
+            reader = self._cached(self.file_cache, (proto, url), open_file, self.max_files, 'file',
+                                  evict=self._close_file)
+            self.file_users[reader] += 1
+        try:
+            yield reader
+        finally:
+            with self.cache_lock:
+                self.file_users[reader] -= 1
+                if self.file_users[reader] == 0:
+                    del self.file_users[reader]
+                    if reader in self.evicted_files:
+                        self.evicted_files.discard(reader)
+                        reader.file.close()
+
+    def _close_file(self, reader: RangeReader) -> None:
+        # Close a dataset file removed from the cache, or defer it to its last user
+        with self.cache_lock:
+            if self.file_users[reader] > 0:
+                self.evicted_files.add(reader)
+            else:
+                self.file_users.pop(reader, None)
+                reader.file.close()
+
+    def clear_caches(self) -> None:
+        """
+        Close the chunk indexes and the dataset files kept open, forget the parsed metadata and shut down the pool of
+        threads of the batches.
+        """
+        with self.cache_lock:
+            self.index_cache.clear()
+            for reader in self.file_cache.values():
+                self._close_file(reader)
+            self.file_cache.clear()
+            self.metadata_cache.clear()
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def _filters(self, path: str) -> tuple[bool, int]:
+        # Return whether the shuffle filter is applied to the chunks of a variable, and the size of their samples
         dtype, filters = self.get_metadata(path, ('dtype', 'filters'))
         # Compute the number of bytes in on sample of data
         itemsize = np.dtype(dtype).itemsize
@@ -79,32 +353,179 @@ class ZranReferenceFileSystem(ReferenceFileSystem):
                     pass
                 else:
                     raise NotImplementedError(f"{type(self)} only support the shuffle filter")
+        return shuffle, itemsize
+
+    def get_partial_values(self, path: str, offset: int, length: int) -> bytes:
+        """
+        Returns the data values read from the chunk defined by its path, but only from the offset and length.
+
+        This methods returns decompressed data.
+
+        :param path: path of the chunk in the dataset e.g.: 'x/0.0' where 'x' is the variable
+        :param offset: offset from which to read the data in the chunk (in bytes)
+        :param length: length of the uncompressed data chunk to retrieve (in bytes)
+        :return: the data read as a byte array.
+        """
+
+        path, offset, length = self._physical_request(path, offset, length)
+        # Get the filters applied on the data of the variable read, and the number of bytes in one sample
+        shuffle, itemsize = self._filters(path)
 
         out = {}
         proto_dict = _protocol_groups(path, self.references)
         for proto, paths in proto_dict.items():
-            fs = self.fss[proto]
             urls, starts = [], []
-            for chunk_path in paths:
-                dataset_url, chunk_start, _ = self._cat_common(chunk_path)
+            for chunk in paths:
+                dataset_url, chunk_start, _ = self._cat_common(chunk)
                 urls.append(dataset_url)
                 starts.append(chunk_start)
 
-            for dataset_url, chunk_start, chunk_path in zip(urls, starts, paths):
+            for dataset_url, chunk_start, chunk in zip(urls, starts, paths):
                 if isinstance(dataset_url, bytes):
-                    out[chunk_path] = dataset_url
+                    # Chunk inlined in the references
+                    index = self.index_cache.open_index(self.index_path, chunk, self.method)
+                    out[chunk] = index.decompress(BufferFile([(0, dataset_url)]), offset, length, whence=0,
+                                                  shuffle=shuffle, bps=itemsize)
                 else:
-                    # Open the zran index used for the partial decompression of the data
-                    with zran_xarray.open_index(self.index_path, group=chunk_path) as index:
-                        # Open the dataset file
-                        with fs.open(dataset_url) as f:
-                            # Move to the beginning of the chunk
-                            f.seek(chunk_start)
-                            # Decompress and read length bytes from the offset
-                            bytes_out = index.decompress(f, offset, length, shuffle=shuffle, bps=itemsize)
-                    out[chunk_path] = bytes_out
+                    # Get the zran index used for the partial decompression of the data, and the dataset file
+                    index = self.index_cache.open_index(self.index_path, chunk, self.method)
+                    with self.open_dataset_file(proto, dataset_url) as reader:
+                        # Decompress and read length bytes from the offset in the chunk
+                        out[chunk] = index.decompress(RangeFile(reader, chunk_start), offset, length, whence=0,
+                                                      shuffle=shuffle, bps=itemsize)
 
         if len(out) == 1:
             out = list(out.values())[0]
 
         return out
+
+    def get_partial_values_batch(self, requests: Iterable[tuple[str, int, int]]) -> list[bytes]:
+        """
+        Returns the data values read from several parts of chunks, e.g. all the parts requested by a zarr selection.
+
+        The requests are served together:
+        - the chunk indexes are opened, and the reads of each request are planned, by a pool of threads,
+        - the compressed ranges of all the requests are fetched at once, with a single cat_ranges() call per protocol,
+          the ranges closer than max_gap bytes being merged: an asynchronous filesystem (e.g. HTTP or S3) fetches them
+          concurrently, in about one round trip,
+        - the requests are decompressed by the pool of threads.
+
+        :param requests: the (path, offset, length) of the requests: the path of the chunk e.g. 'x/0.0', the offset
+        from which to read the data in the chunk and the length of the uncompressed data to retrieve (in bytes). As in
+        the zarr stores, a negative offset is relative to the end of the chunk and a length of None reads up to the
+        end of the chunk.
+        :return: the decompressed data of each request, in the order of the requests, in its own buffer (None for the
+        chunks that do not exist)
+        """
+        requests = [self._physical_request(*request) for request in requests]
+        results = [None] * len(requests)
+
+        def plan(request):
+            # Open the index of the chunk and plan the reads of the request
+            path, offset, length = request
+            shuffle, itemsize = self._filters(path)
+            index = self.index_cache.open_index(self.index_path, path, self.method)
+            offset, length = _resolve_range(offset, length, int(index.uncompressed_size))
+            request_plan = index.plan_ranges([[offset, offset + length]], shuffle=shuffle, bps=itemsize)
+            index.prefetch_points([read.start for read in request_plan.reads])
+            return index, request_plan, shuffle, itemsize, offset, length
+
+        # Resolve the location of the chunks, and plan the reads of the requests in the chunks
+        located = []
+        for i, (path, _, _) in enumerate(requests):
+            try:
+                url, chunk_start, _ = self._cat_common(path)
+            except (KeyError, FileNotFoundError):
+                continue
+            located.append((i, url, chunk_start))
+        planned = self._map(plan, [requests[i] for i, _, _ in located])
+
+        # The compressed ranges of the chunks inlined in the references are taken from their data
+        buffers = {}
+        fetched = []
+        for j, (i, url, _) in enumerate(located):
+            if isinstance(url, bytes):
+                data = memoryview(url)
+                buffers.update({(j, k): data[read.point_inloc:read.compressed_stop]
+                                for k, read in enumerate(planned[j][1].reads)})
+            else:
+                fetched.append(j)
+
+        # Fetch the compressed ranges of all the other requests at once, by protocol
+        for proto, group in self._group_by_protocol([requests[located[j][0]][0] for j in fetched]).items():
+            urls, starts, ends, keys = [], [], [], []
+            for j in (fetched[n] for n in group):
+                i, url, chunk_start = located[j]
+                for k, read in enumerate(planned[j][1].reads):
+                    urls.append(url)
+                    starts.append(chunk_start + read.point_inloc)
+                    ends.append(chunk_start + read.compressed_stop)
+                    keys.append((j, k))
+            buffers.update(zip(keys, self._fetch_ranges(proto, urls, starts, ends)))
+
+        def decompress(j):
+            # Decompress a request from its compressed ranges directly into its own buffer
+            index, request_plan, shuffle, itemsize, offset, length = planned[j]
+            f = BufferFile([(read.point_inloc, buffers.pop((j, k))) for k, read in enumerate(request_plan.reads)])
+            out = bytearray(length)
+            index.decompress_ranges(f, [[offset, offset + length]], whence=0, shuffle=shuffle, bps=itemsize,
+                                    plan=request_plan, out=out)
+            return out
+
+        for j, data in enumerate(self._map(decompress, list(range(len(located))))):
+            results[located[j][0]] = data
+        return results
+
+    def _group_by_protocol(self, paths: list[str]) -> dict[str, list[int]]:
+        # Group the numbers of the requests by protocol of the url of their chunk
+        numbers = {}
+        for j, path in enumerate(paths):
+            numbers.setdefault(path, []).append(j)
+        return {proto: [j for path in group for j in numbers[path]]
+                for proto, group in _protocol_groups(list(numbers), self.references).items()}
+
+    def _fetch_ranges(self, proto: str, urls: list[str], starts: list[int], ends: list[int]) -> list[memoryview]:
+        # Fetch byte ranges with a single cat_ranges() call, merging the close ranges of the same file
+        merged, locations = [], []
+        by_url = {}
+        for i, url in enumerate(urls):
+            by_url.setdefault(url, []).append(i)
+        for url, indices in by_url.items():
+            url_merged, url_locations = coalesce_ranges([starts[i] for i in indices], [ends[i] for i in indices],
+                                                        self.max_gap)
+            locations += [(i, (number + len(merged), start, end)) for i, (number, start, end) in
+                          zip(indices, url_locations)]
+            merged += [(url, start, end) for start, end in url_merged]
+        buffers = self.fss[proto].cat_ranges([m[0] for m in merged], [m[1] for m in merged], [m[2] for m in merged])
+        views = split_buffers(buffers, [location for _, location in sorted(locations)])
+        return views
+
+    def _map(self, function: Callable, items: list) -> list:
+        # Apply a function to the items, with the thread pool of the filesystem if several workers are allowed
+        if self.max_workers > 1 and len(items) > 1:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return list(self.executor.map(function, items))
+        return [function(item) for item in items]
+
+    def get_partial_slice(self, path: str, nd_slice: Iterable[slice]) -> np.ndarray:
+        """
+        Returns a slice of the data of the chunk defined by its path.
+
+        Only the samples from the first to the last sample of the slice are decompressed, their range in the chunk is
+        computed from the bounds of the slice.
+
+        :param path: path of the chunk in the dataset e.g.: 'x/0.0' where 'x' is the variable
+        :param nd_slice: the multidimensional slice to read in the chunk
+        :return: the data of the slice.
+        """
+        dtype, chunks = self.get_metadata(path, ('dtype', 'chunks'))
+        dtype = np.dtype(dtype)
+        if self.physical_chunk(path) is not None:
+            chunks = self.virtual_chunks(path.rpartition('/')[0])
+
+        # Decompress the samples from the first to the last sample of the slice
+        start, stop = linear_offset_bounds(nd_slice, chunks)
+        data = self.get_partial_values(path, start * dtype.itemsize, (stop - start) * dtype.itemsize)
+
+        return slice_view(np.frombuffer(data, dtype=dtype), nd_slice, chunks).copy()
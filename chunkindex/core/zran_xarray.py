@@ -13,6 +13,7 @@
 #limitations under the License.
 import xarray
 from chunkindex.core import zran_index
+from chunkindex.core import index_format
 import numpy as np
 from functools import cached_property
 
@@ -113,6 +114,9 @@ class Index(zran_index.Index):
     def win(self):
         return self.ds.win
 
+    def _point_bits(self, number: int) -> int:
+        return int(self.bits[number])
+
     def get_point(self, loc) -> zran_index.Index.Point:
         """
         Return the closest zran index point before loc from the data store in the xarray dataset.
@@ -174,6 +178,46 @@ def create_index(*args, **kwargs):
 def open_index(*args, **kwargs):
     """
     Overloads xarray.open_dataset() method.
+
+    The group keyword argument is the path of the chunk in the index, e.g. var/0.1. Both the version 1 and the
+    version 2 index layouts are supported (see index_format): the layout is detected from the group of the variable,
+    which only contains a chunk table in the version 2 layout, so that a chunk index is opened with a single
+    xarray.open_dataset() call per group.
     """
-    ds = xarray.open_dataset(*args, **kwargs)
+    group = kwargs.pop('group', None)
+    try:
+        var, chunk_coords = index_format.split_chunk_path(group)
+    except (AttributeError, ValueError):
+        # Not the path of a chunk: open the group as it is
+        return Index(xarray.open_dataset(*args, group=group, **kwargs))
+
+    # Find the chunk in the chunk table of its variable
+    var_ds = xarray.open_dataset(*args, group=var, **kwargs)
+    if 'chunk_table' not in var_ds:
+        # Version 1 layout: one group per chunk
+        var_ds.close()
+        return Index(xarray.open_dataset(*args, group=group, **kwargs))
+    chunk = index_format.chunk_number(chunk_coords, var_ds.attrs['chunk_grid'])
+    first_point, n_points, compressed_size, uncompressed_size = var_ds['chunk_table'][chunk].values[:4]
+
+    # Select the index points of that chunk and present them with the version 1 layout
+    points = var_ds.isel(point=slice(first_point, first_point + n_points))
+    point_table = points['point_table'].values
+    ds = xarray.Dataset(
+        data_vars={
+            'window': (['outloc', 'win'], points['window'].variable.data),
+            'inloc': (['outloc'], point_table[:, 2]),
+            'bits': (['outloc'], point_table[:, 3]),
+        },
+        coords={
+            'outloc': (['outloc'], point_table[:, 1]),
+        },
+        attrs={
+            'uncompressed_size': uncompressed_size,
+            'compressed_size': compressed_size,
+            'mode': var_ds.attrs['mode'],
+            'span': var_ds.attrs['span']
+        }
+    )
+    ds.set_close(var_ds.close)
     return Index(ds)
@@ -0,0 +1,172 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import asyncio
+import json
+from typing import AsyncIterator, Iterable
+from zarr.abc.store import Store, ByteRequest, RangeByteRequest, OffsetByteRequest, SuffixByteRequest
+from zarr.core.buffer import Buffer, BufferPrototype
+from chunkindex.core.zran_reference_filesystem import ZranReferenceFileSystem
+
+
+class ZranStoreV3(Store):
+    """
+    Read-only zarr v3 store of the variables of a ZranReferenceFileSystem, with their chunks decompressed.
+
+    The variables compressed with deflate, and optionally shuffled, are presented uncompressed: their .zarray, also in
+    the consolidated .zmetadata, has no compressor nor filters, and the value of each chunk key is the uncompressed
+    data of the chunk. A byte range of a chunk is a slice of that value, decompressed alone with the zran index of the
+    chunk: the clients that request byte ranges of the chunks only decompress the parts they need. The other keys are
+    served as stored in the dataset.
+
+    The ZranReferenceFileSystem is synchronous: its calls run in the default executor of the event loop, and the chunks
+    requested together by get_partial_values() are served by a single get_partial_values_batch() call.
+
+    Usage example:
+
+        fs = chunkindex.ZranReferenceFileSystem(index=index_filename, fo=kerchunk_filename)
+        group = zarr.open_group(chunkindex.ZranStoreV3(fs), mode='r', zarr_format=2)
+        data = group['x'][0:10, 0:10]
+    """
+
+    supports_writes = False
+    supports_deletes = False
+    supports_listing = True
+
+    def __init__(self, fs: ZranReferenceFileSystem):
+        """
+        Create a ZranStoreV3 object.
+
+        :param fs: the reference filesystem of the dataset, with its zran index
+        """
+        super().__init__(read_only=True)
+        self.fs = fs
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, type(self)) and self.fs is other.fs
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} object at {hex(id(self))}>"
+
+    def _is_decompressed_chunk(self, key: str) -> bool:
+        # The metadata keys are e.g. '.zgroup', 'x/.zarray' or 'zarr.json', the chunk keys e.g. 'x/0.0'
+        var, _, name = key.rpartition('/')
+        return not name.startswith('.') and name != 'zarr.json' and self.fs.decompressible(var)
+
+    def _decompressed_zarray(self, var: str, zarray: dict) -> dict:
+        # Return the .zarray of a variable as presented by the store
+        if self.fs.decompressible(var):
+            zarray = dict(zarray, compressor=None, filters=None)
+        return zarray
+
+    @staticmethod
+    def _offset_length(byte_range: ByteRequest | None) -> tuple[int, int | None]:
+        # Convert a byte range into the (offset, length) of a request of get_partial_values_batch()
+        if byte_range is None:
+            return 0, None
+        if isinstance(byte_range, RangeByteRequest):
+            return byte_range.start, byte_range.end - byte_range.start
+        if isinstance(byte_range, OffsetByteRequest):
+            return byte_range.offset, None
+        if isinstance(byte_range, SuffixByteRequest):
+            return -byte_range.suffix, None
+        raise ValueError(f"Unexpected byte_range, got {byte_range}.")
+
+    def _cat(self, key: str, byte_range: ByteRequest | None) -> bytes | None:
+        # Read a key that is not a decompressed chunk, None if it does not exist
+        try:
+            data = self.fs.cat_file(key)
+        except (KeyError, FileNotFoundError):
+            return None
+
+        # Present the metadata of the decompressed variables
+        var, _, name = key.rpartition('/')
+        if name == '.zarray':
+            data = json.dumps(self._decompressed_zarray(var, json.loads(data))).encode()
+        elif name == '.zmetadata':
+            zmetadata = json.loads(data)
+            zmetadata['metadata'] = {k: self._decompressed_zarray(k.rpartition('/')[0], v)
+                                     if k.rpartition('/')[2] == '.zarray' else v
+                                     for k, v in zmetadata['metadata'].items()}
+            data = json.dumps(zmetadata).encode()
+
+        offset, length = self._offset_length(byte_range)
+        offset = max(0, offset + len(data)) if offset < 0 else offset
+        return data[offset:] if length is None else data[offset:offset + length]
+
+    async def get(self, key: str, prototype: BufferPrototype, byte_range: ByteRequest | None = None) -> Buffer | None:
+        """
+        Return the data of a key, or of a byte range of it.
+
+        :param key: the key e.g. 'x/.zarray' or 'x/0.0'
+        :param prototype: the prototype of the buffer returned
+        :param byte_range: the byte range to read. Default: the whole key
+        :return: the data read, None if the key does not exist
+        """
+        return (await self.get_partial_values(prototype, [(key, byte_range)]))[0]
+
+    async def get_partial_values(self, prototype: BufferPrototype,
+                                 key_ranges: Iterable[tuple[str, ByteRequest | None]]) -> list[Buffer | None]:
+        """
+        Return the data of several keys or byte ranges of keys, see get().
+
+        The chunks and the byte ranges of chunks are decompressed by a single get_partial_values_batch() call, which
+        fetches their compressed ranges at once, while the other keys are read concurrently.
+
+        :param prototype: the prototype of the buffers returned
+        :param key_ranges: the (key, byte range) of the requests
+        :return: the data of each request, in the order of the requests, None for the keys that do not exist
+        """
+        key_ranges = list(key_ranges)
+        chunks, others = [], []
+        for i, (key, _) in enumerate(key_ranges):
+            (chunks if self._is_decompressed_chunk(key) else others).append(i)
+
+        loop = asyncio.get_running_loop()
+        requests = [(key_ranges[i][0], *self._offset_length(key_ranges[i][1])) for i in chunks]
+        batch = loop.run_in_executor(None, self.fs.get_partial_values_batch, requests) if requests else None
+        whole = [loop.run_in_executor(None, self._cat, *key_ranges[i]) for i in others]
+
+        results = [None] * len(key_ranges)
+        for i, data in zip(others, await asyncio.gather(*whole)):
+            results[i] = data
+        if batch is not None:
+            for i, data in zip(chunks, await batch):
+                results[i] = data
+        return [None if data is None else prototype.buffer.from_bytes(data) for data in results]
+
+    async def exists(self, key: str) -> bool:
+        return key in self.fs.references
+
+    async def set(self, key: str, value: Buffer) -> None:
+        self._check_writable()
+
+    async def delete(self, key: str) -> None:
+        self._check_writable()
+
+    async def list(self) -> AsyncIterator[str]:
+        for key in list(self.fs.references):
+            yield key
+
+    async def list_prefix(self, prefix: str) -> AsyncIterator[str]:
+        for key in list(self.fs.references):
+            if key.startswith(prefix):
+                yield key
+
+    async def list_dir(self, prefix: str) -> AsyncIterator[str]:
+        # Yield the names of the keys and groups found just below the prefix
+        prefix = prefix.rstrip('/') + '/' if prefix.rstrip('/') else ''
+        names = dict.fromkeys(key[len(prefix):].split('/')[0] for key in list(self.fs.references)
+                              if key.startswith(prefix))
+        for name in names:
+            yield name
@@ -26,9 +26,9 @@ class ZranStore(zarr._storage.store.Store):
         return self._mutable_mapping[key]
 
     def get_partial_values(self, inputs):
-        out = b''.join(
-            [self._mutable_mapping.fs.get_partial_values(key, start, nitems) for key, (start, nitems) in inputs])
-        return [bytes(out)]
+        # Read all the parts of chunks at once: one buffer per input, in the order of the inputs
+        return self._mutable_mapping.fs.get_partial_values_batch(
+            [(key, start, nitems) for key, (start, nitems) in inputs])
 
     def __setitem__(self, key, value):
         if isinstance(value, np.ndarray):
@@ -0,0 +1,105 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Benchmark of the index file writing time with respect to the number of chunks.
+
+It compares the writing of each chunk index with zran_xarray.Index.to_netcdf(mode="a"), which reopens the index file
+for every chunk, with the IndexWriter which keeps the index file opened for the whole build, using either one group
+per chunk (version 1 layout) or the consolidated per-variable layout (version 2).
+
+Usage:
+    python bench_index_writer.py --chunks 100 1000 10000 100000 --legacy-max 10000
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+import zlib
+import numpy as np
+from chunkindex.core import zran_index, zran_xarray
+from chunkindex.core.index_writer import IndexWriter
+
+WINDOW_LENGTH = zran_index.WINDOW_LENGTH
+ENCODING = {
+    'window': {
+        'dtype': 'int8',
+        'zlib': True,
+        'complevel': 1,
+        'shuffle': False,
+        'chunksizes': [1, WINDOW_LENGTH]
+    }
+}
+
+
+def chunk_grid(n_chunks):
+    # Spread the chunks over a 2D grid of chunks
+    n = int(np.ceil(np.sqrt(n_chunks)))
+    return n, n
+
+
+def chunk_ids(n_chunks):
+    n = chunk_grid(n_chunks)[1]
+    return [f'var/{i // n}.{i % n}' for i in range(n_chunks)]
+
+
+def write_legacy(index_path, index, n_chunks):
+    for chunk_id in chunk_ids(n_chunks):
+        zran_xarray.Index(index).to_netcdf(index_path, group=chunk_id, mode="a", encoding=ENCODING)
+
+
+def write_index_writer_v1(index_path, index, n_chunks):
+    with IndexWriter(index_path, version=1) as writer:
+        for chunk_id in chunk_ids(n_chunks):
+            writer.write(chunk_id, index)
+
+
+def write_index_writer_v2(index_path, index, n_chunks):
+    with IndexWriter(index_path, version=2) as writer:
+        writer.add_variable('var', chunk_grid(n_chunks), index.span)
+        for chunk_id in chunk_ids(n_chunks):
+            writer.write(chunk_id, index)
+
+
+def main(n_chunks_list, legacy_max):
+    # Create the index of a small chunk of data with two index points
+    data = np.arange(32768, dtype='int32')
+    index = zran_index.create_index(zlib.compress(data.tobytes()), span=65536)
+
+    print(f"{'chunks':>8} {'method':>14} {'time (s)':>10} {'per chunk (ms)':>15}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path = os.path.join(tmp_dir, 'index.nc')
+        for n_chunks in n_chunks_list:
+            for method, function in (('to_netcdf', write_legacy), ('IndexWriter v1', write_index_writer_v1),
+                                     ('IndexWriter v2', write_index_writer_v2)):
+                if method == 'to_netcdf' and n_chunks > legacy_max:
+                    continue
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(index_path)
+                start = time.perf_counter()
+                function(index_path, index, n_chunks)
+                elapsed = time.perf_counter() - start
+                print(f"{n_chunks:>8} {method:>14} {elapsed:>10.2f} {elapsed / n_chunks * 1000:>15.3f}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the index file writing time.')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help='numbers of chunks to write')
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='maximum number of chunks written with to_netcdf(mode="a")')
+    args = parser.parse_args()
+
+    main(args.chunks, args.legacy_max)
@@ -0,0 +1,73 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Micro-benchmark of the computation of the range of samples of a slice in a chunk with respect to the chunk size.
+
+It compares the indexing of np.arange() over the whole chunk, formerly used by read_slice(), with the analytic
+computation of linear_offset_bounds() and linear_offset_ranges(), for a single sample and for a small block in the
+middle of a 3D chunk.
+
+Usage:
+    python bench_linear_offsets.py --sizes 10000 1000000 100000000 --arange-max 100000000
+"""
+import argparse
+import time
+import numpy as np
+from chunkindex.util.multi_dimensional_slice import linear_offset_bounds, linear_offset_ranges
+
+
+def arange_bounds(nd_slice, chunk_size):
+    slice_indices = np.arange(0, np.prod(chunk_size)).reshape(chunk_size)[nd_slice].flatten()
+    return slice_indices[0], slice_indices[-1] + 1
+
+
+def timeit(function, *args, repeat=5):
+    # Return the best time of several calls
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes, arange_max):
+    print(f"{'chunk size':>12} {'slice':>8} {'method':>22} {'time (us)':>12}")
+    for size in sizes:
+        # 3D chunk with a cubic shape
+        n = max(1, round(size ** (1 / 3)))
+        chunk_size = (n, n, n)
+        slices = {
+            'pixel': (slice(n // 2, n // 2 + 1),) * 3,
+            'block': (slice(n // 4, n // 4 + 8), slice(n // 4, n // 4 + 8), slice(n // 4, n // 4 + 8)),
+        }
+        for name, nd_slice in slices.items():
+            methods = [('linear_offset_bounds', linear_offset_bounds), ('linear_offset_ranges', linear_offset_ranges)]
+            if n ** 3 <= arange_max:
+                methods.insert(0, ('np.arange', arange_bounds))
+            for method, function in methods:
+                elapsed = timeit(function, nd_slice, chunk_size)
+                print(f"{n ** 3:>12} {name:>8} {method:>22} {elapsed * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the computation of the samples of a slice in a chunk.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000, 100000000],
+                        help='numbers of samples in the chunk')
+    parser.add_argument('--arange-max', type=int, default=100000000,
+                        help='maximum chunk size for the np.arange() method')
+    args = parser.parse_args()
+
+    main(args.sizes, args.arange_max)
@@ -0,0 +1,75 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Benchmark of the intra-chunk parallel inflate with respect to the number of threads.
+
+A chunk of random-walk data is compressed and indexed, then fully decompressed with Index.decompress(), serially and
+with several threads that inflate the pieces of data between the index points in parallel. The speedup is
+relative to the serial decompression.
+
+Usage:
+    python bench_parallel_inflate.py --size 64 --span 1000000 --threads 1 2 4 8 --shuffle
+"""
+import argparse
+import os
+import time
+import zlib
+import numpy as np
+from chunkindex.core import zran_index
+from chunkindex.util.shuffle import shuffle as shuffle_bytes
+
+
+def timeit(function, repeat=3):
+    # Return the best time of several calls
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(size, span, threads_list, shuffle):
+    # Create a chunk of float64 data (size in MB)
+    rng = np.random.default_rng(0)
+    data = np.cumsum(rng.normal(size=size * 2 ** 20 // 8)).astype('float64').tobytes()
+    if shuffle:
+        data = shuffle_bytes(data, 8)
+    compressed_data = zlib.compress(data, 1)
+    index = zran_index.create_index(compressed_data, span=span)
+
+    print(f"chunk: {len(data) / 2 ** 20:.0f} MB, compressed: {len(compressed_data) / 2 ** 20:.1f} MB, "
+          f"{len(index.points)} index points, shuffle: {shuffle}, {os.cpu_count()} CPU(s)")
+    print(f"{'threads':>8} {'time (s)':>10} {'MB/s':>10} {'speedup':>8}")
+
+    def decompress(threads):
+        return index.decompress(compressed_data, 0, len(data), whence=0, shuffle=shuffle, bps=8, threads=threads)
+
+    serial = timeit(lambda: decompress(1))
+    print(f"{'serial':>8} {serial:>10.3f} {len(data) / 2 ** 20 / serial:>10.1f} {1:>8.2f}")
+    for threads in threads_list:
+        elapsed = timeit(lambda: decompress(threads))
+        print(f"{threads:>8} {elapsed:>10.3f} {len(data) / 2 ** 20 / elapsed:>10.1f} {serial / elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the intra-chunk parallel inflate.')
+    parser.add_argument('--size', type=int, default=64, help='size of the uncompressed chunk (MB)')
+    parser.add_argument('--span', type=int, default=1000000, help='distance between the index points (bytes)')
+    parser.add_argument('--threads', type=int, nargs='+', default=[2, 4, 8], help='numbers of threads')
+    parser.add_argument('--shuffle', action='store_true', help='apply the shuffle filter to the chunk')
+    args = parser.parse_args()
+
+    main(args.size, args.span, args.threads, args.shuffle)
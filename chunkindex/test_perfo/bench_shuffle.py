@@ -0,0 +1,77 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Benchmark of the shuffle and unshuffle kernels with respect to the number of bytes per sample and the buffer size.
+
+The functions shuffle() and unshuffle(), which return new bytes, are compared with the kernels shuffle_into() and
+unshuffle_into(), which write into a preallocated buffer. The throughput is given in MB of buffer per second.
+
+Usage:
+    python bench_shuffle.py --bps 2 4 8 --sizes 1K 1M 64M 1G
+"""
+import argparse
+import time
+import numpy as np
+from chunkindex.util.shuffle import shuffle, unshuffle, shuffle_into, unshuffle_into
+
+UNITS = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30}
+
+
+def timeit(function, min_time=0.2):
+    # Return the best time of the calls during at least min_time seconds (at least 2 calls)
+    best = float('inf')
+    total = 0.
+    calls = 0
+    while total < min_time or calls < 2:
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        calls += 1
+    return best
+
+
+def parse_size(size):
+    # Convert a size such as 64M into bytes
+    if size[-1].upper() in UNITS:
+        return int(float(size[:-1]) * UNITS[size[-1].upper()])
+    return int(size)
+
+
+def main(bps_list, sizes):
+    print(f"{'size':>6} {'bps':>4} {'shuffle':>10} {'shuffle_into':>13} {'unshuffle':>10} {'unshuffle_into':>15}"
+          f"   (MB/s)")
+    for size in sizes:
+        for bps in bps_list:
+            n_bytes = parse_size(size) // bps * bps
+            data = np.random.default_rng(0).integers(0, 256, n_bytes, dtype='u1')
+            out = np.empty(n_bytes, dtype='u1')
+            times = [timeit(lambda: shuffle(data, bps)),
+                     timeit(lambda: shuffle_into(data, bps, out)),
+                     timeit(lambda: unshuffle(data, bps)),
+                     timeit(lambda: unshuffle_into(data, bps, out))]
+            rates = [n_bytes / 2 ** 20 / t for t in times]
+            print(f"{size:>6} {bps:>4} {rates[0]:>10.0f} {rates[1]:>13.0f} {rates[2]:>10.0f} {rates[3]:>15.0f}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the shuffle and unshuffle kernels.')
+    parser.add_argument('--bps', type=int, nargs='+', default=[2, 4, 8], help='numbers of bytes per sample')
+    parser.add_argument('--sizes', nargs='+', default=['1K', '64K', '1M', '16M', '256M', '1G'],
+                        help='buffer sizes, with an optional K, M or G suffix')
+    args = parser.parse_args()
+
+    main(args.bps, args.sizes)
@@ -0,0 +1,77 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""
+Microbenchmark of small reads of a chunk with respect to the number of samples read.
+
+Reads of 1 to 100 float64 samples at random locations of a chunk are decompressed with Index.decompress(), which
+reuses the decompression context of each index point, and with zran.decompress() from a new zran index built for the
+starting point at each call, as done before the decompression contexts. The compressed data is in memory: the time is
+the time of the decompression only.
+
+Usage:
+    python bench_small_reads.py --size 16 --span 100000 --samples 1 10 100 --reads 1000
+"""
+import argparse
+import time
+import zlib
+import numpy as np
+import zran
+from chunkindex.core import zran_index
+
+
+def decompress_zran(index, compressed_data, offset, length):
+    # Decompress from a new zran index built for the starting point
+    point, offset_in, length_in = index._compressed_range(offset, length)
+    new_index = zran_index.Index(points=[zran_index.Index.Point(inloc=int(point.bits > 0), outloc=0, bits=point.bits,
+                                                                window=point.window)],
+                                 compressed_size=int(index.compressed_size - offset_in),
+                                 uncompressed_size=int(index.uncompressed_size - point.outloc), span=index.span)
+    return zran.decompress(compressed_data[offset_in:offset_in + length_in], new_index, offset - point.outloc, length)
+
+
+def main(size, span, samples_list, reads):
+    # Create a chunk of float64 data (size in MB)
+    rng = np.random.default_rng(0)
+    data = np.cumsum(rng.normal(size=size * 2 ** 20 // 8)).astype('float64')
+    compressed_data = zlib.compress(data.tobytes(), 1)
+    index = zran_index.create_index(compressed_data, span=span)
+
+    print(f"chunk: {data.nbytes / 2 ** 20:.0f} MB, {len(index.points)} index points, {reads} reads")
+    print(f"{'samples':>8} {'zran (us/read)':>15} {'context (us/read)':>18} {'speedup':>8}")
+    for samples in samples_list:
+        offsets = rng.integers(0, len(data) - samples, reads) * 8
+        times = []
+        for decompress in (lambda o: decompress_zran(index, compressed_data, o, samples * 8),
+                           lambda o: index.decompress(compressed_data, o, samples * 8)):
+            start = time.perf_counter()
+            for offset in offsets:
+                decompress(int(offset))
+            times.append((time.perf_counter() - start) / reads * 1e6)
+        # Check the last read
+        offset = int(offsets[-1])
+        expected = data[offset // 8:offset // 8 + samples].tobytes()
+        assert index.decompress(compressed_data, offset, samples * 8) == expected
+        print(f"{samples:>8} {times[0]:>15.1f} {times[1]:>18.1f} {times[0] / times[1]:>8.2f}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the small reads of a chunk.')
+    parser.add_argument('--size', type=int, default=16, help='size of the uncompressed chunk (MB)')
+    parser.add_argument('--span', type=int, default=100000, help='distance between the index points (bytes)')
+    parser.add_argument('--samples', type=int, nargs='+', default=[1, 10, 100], help='numbers of samples per read')
+    parser.add_argument('--reads', type=int, default=1000, help='number of reads')
+    args = parser.parse_args()
+
+    main(args.size, args.span, args.samples, args.reads)
@@ -15,7 +15,7 @@ from pathlib import Path
 import xarray as xr
 import numpy as np
 import json
-import kerchunk.hdf
+import h5py
 import os
 import contextlib
 
@@ -80,6 +80,27 @@ def create_netcdf_dataset_test() -> Path:
     return dataset_path
 
 
+def create_netcdf_dataset_many_chunks(shape=(1000, 1000), chunk_size=(100, 100)) -> Path:
+    # Define the dataset path
+    dataset_dir = Path('data')
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    dataset_path = dataset_dir / 'ramp_many_chunks.nc'
+
+    # Create the dataset : a ramp with many small chunks
+    x = np.arange(np.prod(shape)).reshape(shape).astype('int32')
+    ds = xr.Dataset({'x': xr.DataArray(x)})
+    encoding = {'x': {'dtype': 'int32', 'zlib': True, 'complevel': 1, 'shuffle': True, 'chunksizes': chunk_size}}
+
+    # Remove it if it already exists
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(dataset_path)
+
+    # Write the dataset to a netcdf file
+    ds.to_netcdf(dataset_path, encoding=encoding)
+
+    return dataset_path
+
+
 def create_kerchunk_index(dataset_path: Path) -> Path:
 
     # Define the file path of the json file in which the informations
@@ -87,6 +108,7 @@ def create_kerchunk_index(dataset_path: Path) -> Path:
     json_path = dataset_path.with_suffix('.json')
 
     # Create the data structure
+    import kerchunk.hdf  # kerchunk is not compatible with all the versions of zarr
     h5chunks = kerchunk.hdf.SingleHdf5ToZarr(str(dataset_path)).translate()
 
     # Write it to a json file
@@ -94,3 +116,31 @@ def create_kerchunk_index(dataset_path: Path) -> Path:
         f_out.write(json.dumps(h5chunks))
 
     return json_path
+
+
+def create_references(dataset_path: Path, consolidated: bool = False) -> dict:
+    # Create the references of the deflate compressed variables of a dataset without kerchunk, in the same layout,
+    # optionally with the consolidated metadata
+    refs = {'.zgroup': json.dumps({'zarr_format': 2})}
+
+    def add(name, obj):
+        if isinstance(obj, h5py.Group):
+            refs[name + '/.zgroup'] = json.dumps({'zarr_format': 2})
+        elif obj.compression == 'gzip':
+            filters = [{'id': 'shuffle', 'elementsize': obj.dtype.itemsize}] if obj.shuffle else []
+            filters.append({'id': 'zlib', 'level': obj.compression_opts})
+            refs[name + '/.zarray'] = json.dumps({'chunks': obj.chunks, 'compressor': None, 'dtype': obj.dtype.str,
+                                                  'fill_value': None, 'filters': filters, 'order': 'C',
+                                                  'shape': obj.shape, 'zarr_format': 2})
+            refs[name + '/.zattrs'] = json.dumps({'_ARRAY_DIMENSIONS': [f'dim_{i}' for i in range(obj.ndim)]})
+            for i in range(obj.id.get_num_chunks()):
+                info = obj.id.get_chunk_info(i)
+                coords = [offset // chunk for offset, chunk in zip(info.chunk_offset, obj.chunks)]
+                refs[name + '/' + '.'.join(str(c) for c in coords)] = [str(dataset_path), info.byte_offset, info.size]
+
+    with h5py.File(dataset_path) as f:
+        f.visititems(add)
+    if consolidated:
+        refs['.zmetadata'] = json.dumps({'zarr_consolidated_format': 1, 'metadata': {
+            key: json.loads(value) for key, value in refs.items() if key.rpartition('/')[2].startswith('.z')}})
+    return {'version': 1, 'refs': refs}
@@ -57,6 +57,17 @@ class TestHdf(unittest.TestCase):
         with zran_xarray.open_index(self.index, group=chunk_path) as index:
             self.assertEqual(len(index.win), WINDOW_LENGTH)
 
+    def test_hdf_create_index_workers(self):
+        # Build the same index with a pool of workers
+        index_workers = self.dataset.parent.joinpath(str(self.dataset.stem) + '_index_workers.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(index_workers)
+        chunkindex.create_index(index_workers, self.dataset, workers=2)
+
+        # Check that the parallel build produces the same file as the sequential build
+        with open(self.index, 'rb') as f1, open(index_workers, 'rb') as f2:
+            self.assertEqual(f1.read(), f2.read())
+
     def test_hdf_read_slice1(self):
 
         with open(self.dataset, 'rb') as ds:
@@ -70,6 +81,23 @@ class TestHdf(unittest.TestCase):
                 check_read_slice(MultiDimensionalSlice((slice(1, 2), slice(0, 10))))
                 check_read_slice(MultiDimensionalSlice((slice(300, 305), slice(300, 305))))
 
+    def test_hdf_read_slice_index_version1(self):
+        # Build an index with the version 1 layout: one group per chunk
+        index_v1 = self.dataset.parent.joinpath(str(self.dataset.stem) + '_index_v1.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(index_v1)
+        chunkindex.create_index(index_v1, self.dataset, version=1)
+
+        with open(self.dataset, 'rb') as ds:
+            with open(index_v1, mode='rb') as index:
+
+                def check_read_slice(nd_slice):
+                    decompressed_data = chunkindex.read_slice(ds, index, 'x', nd_slice)
+                    self.assertTrue(np.array_equal(decompressed_data, xr.open_dataset(self.dataset).x[nd_slice]))
+
+                check_read_slice(MultiDimensionalSlice((slice(1, 2), slice(0, 10))))
+                check_read_slice(MultiDimensionalSlice((slice(299, 301), slice(290, 350))))
+
     def test_hdf_read_slice_in_group(self):
 
         with open(self.dataset, 'rb') as ds:
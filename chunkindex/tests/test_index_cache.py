@@ -0,0 +1,109 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import unittest
+import chunkindex
+import xarray as xr
+import os
+import numpy as np
+import contextlib
+import sys
+from chunkindex.core.index_cache import IndexCache
+from chunkindex.tests.create_datasets import create_netcdf_dataset_test, create_netcdf_dataset_many_chunks
+
+
+class TestIndexCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Create a test dataset and its index
+        self.dataset = create_netcdf_dataset_test()
+        self.index = self.dataset.parent.joinpath(str(self.dataset.stem) + '_index.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.index)
+        chunkindex.create_index(self.index, self.dataset)
+
+    def test_IndexCache_open_index(self):
+        cache = IndexCache()
+        with open(self.index, mode='rb') as index:
+            zindex = cache.open_index(index, 'x/0.0')
+            # The second opening of the same chunk index is avoided
+            self.assertIs(cache.open_index(index, 'x/0.0'), zindex)
+            # The index file is not opened again for another chunk
+            cache.open_index(index, 'x/0.1')
+        self.assertEqual(cache.stats, {'file_hits': 1, 'file_misses': 1, 'index_hits': 1, 'index_misses': 2,
+                                       'opens_avoided': 2})
+
+        # The entries of the closed index file are removed at the next opening
+        with open(self.index, mode='rb') as index:
+            cache.open_index(index, 'x/0.0')
+            self.assertEqual(len(cache.files), 1)
+            self.assertEqual(len(cache.indexes), 1)
+
+    def test_IndexCache_bounded(self):
+        cache = IndexCache(max_files=1, max_indexes=2)
+        with open(self.index, mode='rb') as index1, open(self.index, mode='rb') as index2:
+            for chunk in ('x/0.0', 'x/0.1', 'x/1.0'):
+                cache.open_index(index1, chunk)
+            self.assertEqual(len(cache.indexes), 2)
+            # Opening another index file closes the least recently used one and its chunk indexes
+            cache.open_index(index2, 'x/0.0')
+            self.assertEqual(list(cache.files), [index2])
+            self.assertEqual(len(cache.indexes), 1)
+
+    def test_IndexCache_read_slice(self):
+        cache = IndexCache()
+        nd_slice = (slice(290, 310), slice(0, 10))
+        with open(self.dataset, 'rb') as ds:
+            with open(self.index, mode='rb') as index:
+                for _ in range(3):
+                    data = chunkindex.read_slice(ds, index, 'x', nd_slice, cache=cache)
+                    self.assertTrue(np.array_equal(data, xr.open_dataset(self.dataset).x[nd_slice]))
+        # Two chunks are read by each call: only the first call opens the index
+        self.assertEqual(cache.index_misses, 2)
+        self.assertEqual(cache.file_misses, 1)
+        self.assertEqual(cache.opens_avoided, 5)
+
+    def test_IndexCache_default_cache(self):
+        # The shared cache keeps the index files given by their path open
+        nd_slice = (slice(290, 293), slice(0, 10))
+        chunkindex.read_slice(str(self.dataset), str(self.index), 'x', nd_slice)
+        self.assertIn(str(self.index), chunkindex.core.hdf.INDEX_CACHE.files)
+
+        # But not the file objects of the callers, whose index file is closed at the end of the call
+        with open(self.index, mode='rb') as index:
+            references = sys.getrefcount(index)
+            chunkindex.read_slice(str(self.dataset), index, 'x', nd_slice)
+            self.assertNotIn(index, chunkindex.core.hdf.INDEX_CACHE.files)
+            self.assertNotIn(index, {key[0] for key in chunkindex.core.hdf.INDEX_CACHE.indexes})
+            self.assertEqual(sys.getrefcount(index), references)
+
+    def test_IndexCache_changed_file(self):
+        # Build an index for a dataset and read it with the default cache
+        index = self.dataset.parent.joinpath('changed_index.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(index)
+        chunkindex.create_index(index, self.dataset)
+        nd_slice = (slice(290, 293), slice(0, 10))
+        data = chunkindex.read_slice(str(self.dataset), str(index), 'x', nd_slice)
+        self.assertTrue(np.array_equal(data, xr.open_dataset(self.dataset).x[nd_slice]))
+
+        # Replace the index file by the index of another dataset: the cached entries of the old file are not used
+        other = create_netcdf_dataset_many_chunks()
+        os.remove(index)
+        chunkindex.create_index(index, other)
+        data = chunkindex.read_slice(str(other), str(index), 'x', nd_slice)
+        self.assertTrue(np.array_equal(data, xr.open_dataset(other).x[nd_slice]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import unittest
+import numpy as np
+import zlib
+import os
+import contextlib
+import xarray
+from unittest import mock
+from pathlib import Path
+from chunkindex.core import zran_index, zran_h5py, zran_xarray
+from chunkindex.core.index_writer import IndexWriter
+
+
+class TestIndexWriter(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Create some compressed data
+        self.data = np.arange(1e6, dtype='float64')
+        self.compressed_data = zlib.compress(self.data.tobytes())
+        dataset_dir = Path('data')
+        dataset_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = dataset_dir / 'index_writer_test.nc'
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.index_path)
+
+    def check_index_file(self, chunk_ids, index):
+        # Read back the index of each chunk and decompress some data
+        offset = 100000
+        length = 10
+        with open(self.index_path, mode='rb') as f:
+            for chunk_id in chunk_ids:
+                zindex = zran_h5py.open_index(f, group=chunk_id)
+                self.assertEqual(len(zindex.outloc), len(index.points))
+                decompressed_data = zindex.decompress(self.compressed_data, offset=offset * 8, length=length * 8)
+                decompressed_data = np.frombuffer(decompressed_data, dtype='float64')
+                self.assertTrue(np.array_equal(decompressed_data, self.data[offset:offset + length]))
+
+        # The index can also be read with xarray
+        for chunk_id in chunk_ids:
+            with zran_xarray.open_index(self.index_path, group=chunk_id) as zindex:
+                self.assertEqual(zindex.uncompressed_size, index.uncompressed_size)
+                decompressed_data = zindex.decompress(self.compressed_data, offset=offset * 8, length=length * 8)
+                decompressed_data = np.frombuffer(decompressed_data, dtype='float64')
+                self.assertTrue(np.array_equal(decompressed_data, self.data[offset:offset + length]))
+
+    def test_IndexWriter_write(self):
+        # Write the index of the same data for several chunks, with a flush between the batches
+        index = zran_index.create_index(self.compressed_data, span=100 * 1024)
+        chunk_ids = [f'var/{i}.{j}' for i in range(2) for j in range(3)]
+        with IndexWriter(self.index_path, batch_size=4) as writer:
+            writer.add_variable('var', chunk_grid=(2, 3), span=100 * 1024)
+            for chunk_id in chunk_ids[::-1]:
+                writer.write(chunk_id, index)
+
+        self.check_index_file(chunk_ids, index)
+
+        # The layout is detected without opening the root group: a single open per chunk index
+        with mock.patch('xarray.open_dataset', wraps=xarray.open_dataset) as open_dataset:
+            zran_xarray.open_index(self.index_path, group='var/1.2').ds.close()
+        self.assertEqual(open_dataset.call_count, 1)
+
+    def test_IndexWriter_write_version1(self):
+        # Write the index of the same data for several chunks, with a flush between the batches
+        index = zran_index.create_index(self.compressed_data, span=100 * 1024)
+        chunk_ids = [f'var/0.{i}' for i in range(5)]
+        with IndexWriter(self.index_path, batch_size=2, version=1) as writer:
+            for chunk_id in chunk_ids:
+                writer.write(chunk_id, index)
+
+        self.check_index_file(chunk_ids, index)
+
+
+if __name__ == '__main__':
+    unittest.main()
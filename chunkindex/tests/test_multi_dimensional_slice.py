@@ -12,7 +12,9 @@
 #See the License for the specific language governing permissions and
 #limitations under the License.
 import unittest
-from chunkindex.util.multi_dimensional_slice import MultiDimensionalSlice
+import numpy as np
+from chunkindex.util.multi_dimensional_slice import MultiDimensionalSlice, linear_offset_bounds, \
+    linear_offset_ranges, slice_view, chunk_intersections, virtual_chunk_shape
 
 
 class TestMultiDimensionalSlice(unittest.TestCase):
@@ -39,6 +41,70 @@ class TestMultiDimensionalSlice(unittest.TestCase):
         s = MultiDimensionalSlice((slice(1, 5), slice(5, 5)))
         self.assertEqual(s.samples, 0)
 
+    def test_linear_offset_bounds(self):
+        shape = (4, 5, 6)
+        for nd_slice in ((slice(1, 3), slice(2, 4), slice(0, 6)), (slice(0, 4, 3), slice(None), slice(5, 6)),
+                         (slice(2, 3), slice(4, 5), slice(1, 2))):
+            indices = np.arange(np.prod(shape)).reshape(shape)[nd_slice].flatten()
+            self.assertEqual(linear_offset_bounds(nd_slice, shape), (indices[0], indices[-1] + 1))
+        # Empty slice
+        self.assertEqual(linear_offset_bounds((slice(1, 1), slice(0, 5)), (4, 5)), (0, 0))
+
+    def test_linear_offset_ranges(self):
+        self.assertEqual(linear_offset_ranges((slice(1, 3), slice(2, 4)), (4, 5)).tolist(), [[7, 9], [12, 14]])
+        # The dimensions fully covered by the slice are merged into a single range
+        self.assertEqual(linear_offset_ranges((slice(1, 3), slice(None)), (4, 5)).tolist(), [[5, 15]])
+        self.assertEqual(linear_offset_ranges((slice(None), slice(0, 4, 3), slice(None)), (2, 4, 3)).tolist(),
+                         [[0, 3], [9, 15], [21, 24]])
+        # Check all the samples of the slice against their indices
+        shape = (4, 5, 6)
+        for nd_slice in ((slice(1, 3), slice(2, 4), slice(0, 6)), (slice(0, 4, 3), slice(None), slice(1, 6, 2))):
+            indices = np.arange(np.prod(shape)).reshape(shape)[nd_slice].flatten()
+            ranges = linear_offset_ranges(nd_slice, shape)
+            self.assertTrue(np.array_equal(np.concatenate([np.arange(a, b) for a, b in ranges]), indices))
+
+    def test_slice_view(self):
+        shape = (4, 5, 6)
+        array = np.arange(np.prod(shape)).reshape(shape)
+        nd_slice = (slice(1, 4, 2), slice(2, 4), slice(1, 6, 2))
+        start, stop = linear_offset_bounds(nd_slice, shape)
+        self.assertTrue(np.array_equal(slice_view(array.flatten()[start:stop], nd_slice, shape), array[nd_slice]))
+
+    def test_chunk_intersections(self):
+        shape = (10, 7)
+        chunks = (3, 2)
+        array = np.arange(np.prod(shape)).reshape(shape)
+        for nd_slice in ((slice(2, 8), slice(1, 6)), (slice(0, 10, 4), slice(None)), (slice(9, 10), slice(6, 7))):
+            chunk_coords, in_chunk, in_out = chunk_intersections(nd_slice, shape, chunks)
+            # Rebuild the slice from the chunks
+            out = np.full(array[nd_slice].shape, -1)
+            for coords, sc, so in zip(chunk_coords, in_chunk, in_out):
+                chunk = array[tuple(slice(c * n, (c + 1) * n) for c, n in zip(coords, chunks))]
+                out[tuple(slice(*s) for s in so)] = chunk[tuple(slice(*s) for s in sc)]
+            self.assertTrue(np.array_equal(out, array[nd_slice]))
+        # The chunks between the samples of a slice with a large step are skipped
+        chunk_coords, _, _ = chunk_intersections((slice(0, 10, 7), slice(0, 1)), shape, chunks)
+        self.assertEqual(chunk_coords.tolist(), [[0, 0], [2, 0]])
+        # Empty slice
+        self.assertEqual(len(chunk_intersections((slice(3, 3), slice(None)), shape, chunks)[0]), 0)
+
+    def test_virtual_chunk_shape(self):
+        # Split along the first dimension, with a divisor of the chunk size
+        self.assertEqual(virtual_chunk_shape((300, 300), 4, 40000), (30, 300))
+        # Split along the second dimension when a row of the first one is too large
+        self.assertEqual(virtual_chunk_shape((10, 100, 50), 8, 1000), (1, 2, 50))
+        self.assertEqual(virtual_chunk_shape((7, 13), 4, 4), (1, 1))
+        # The chunks small enough are not split
+        self.assertEqual(virtual_chunk_shape((10, 10), 4, 400), (10, 10))
+        self.assertEqual(virtual_chunk_shape((), 4, 1), ())
+        # The virtual chunks are contiguous ranges of the chunk
+        chunks = (6, 4, 5)
+        shape = virtual_chunk_shape(chunks, 2, 24)
+        chunk = np.arange(np.prod(chunks)).reshape(chunks)
+        for start in np.ndindex(*[c // v for c, v in zip(chunks, shape)]):
+            block = chunk[tuple(slice(i * v, (i + 1) * v) for i, v in zip(start, shape))].ravel()
+            self.assertTrue(np.array_equal(np.diff(block), np.ones(block.size - 1)))
+
 
 if __name__ == '__main__':
     unittest.main()
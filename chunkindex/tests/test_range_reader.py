@@ -0,0 +1,100 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import unittest
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import fsspec
+from chunkindex.core.range_reader import RangeReader, RangeFile, BufferFile, coalesce_ranges
+
+
+class TestRangeReader(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.data = bytes(range(256)) * 100
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'data.bin')
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_RangeReader_read(self):
+        with open(self.path, 'rb') as f:
+            for dataset in (self.path, f, io.BytesIO(self.data)):
+                with RangeReader(dataset) as reader:
+                    # Read ranges from several threads at the same time
+                    ranges = [(i * 97, 1000) for i in range(100)]
+                    with ThreadPoolExecutor(max_workers=8) as executor:
+                        results = list(executor.map(lambda r: reader.read(*r), ranges))
+                    self.assertEqual(results, [self.data[o:o + n] for o, n in ranges])
+                    self.assertEqual(reader.reads, len(ranges))
+            # The position of the file object is not modified
+            self.assertEqual(f.tell(), 0)
+
+    def test_RangeFile(self):
+        with RangeReader(self.path) as reader:
+            f = RangeFile(reader, 1000)
+            f.seek(10)
+            self.assertEqual(f.read(5), self.data[1010:1015])
+            f.seek(5, 1)
+            self.assertEqual(f.tell(), 20)
+            self.assertEqual(f.read(3), self.data[1020:1023])
+
+    def test_coalesce_ranges(self):
+        merged, locations = coalesce_ranges([500, 0, 120, 90], [600, 100, 200, 110], max_gap=10)
+        # The overlapping ranges and the ranges separated by at most 10 bytes are merged
+        self.assertEqual(merged, [(0, 200), (500, 600)])
+        self.assertEqual(locations, [(1, 0, 100), (0, 0, 100), (0, 120, 200), (0, 90, 110)])
+        merged, _ = coalesce_ranges([0, 120], [100, 200], max_gap=0)
+        self.assertEqual(merged, [(0, 100), (120, 200)])
+
+    def test_RangeReader_read_ranges(self):
+        starts, ends = [5000, 0, 1100, 20000], [6000, 1000, 1200, 20010]
+        fs = fsspec.filesystem('file')
+
+        class CountingFileSystem(type(fs)):
+            calls = 0
+
+            def cat_ranges(self, *args, **kwargs):
+                CountingFileSystem.calls += 1
+                return super().cat_ranges(*args, **kwargs)
+
+        with CountingFileSystem().open(self.path) as f:
+            for dataset in (self.path, f):
+                with RangeReader(dataset) as reader:
+                    views = reader.read_ranges(starts, ends, max_gap=200)
+                    self.assertEqual([bytes(view) for view in views],
+                                     [self.data[start:end] for start, end in zip(starts, ends)])
+                    # The ranges are memoryviews of the 3 merged ranges read
+                    self.assertTrue(all(isinstance(view, memoryview) for view in views))
+                    self.assertEqual(reader.reads, 3)
+                    self.assertEqual(reader.bytes_read, 1200 + 1000 + 10)
+        # The fsspec file is read with a single call to cat_ranges()
+        self.assertEqual(CountingFileSystem.calls, 1)
+
+    def test_BufferFile(self):
+        f = BufferFile([(1000, memoryview(self.data)[1000:2000]), (0, self.data[:100])])
+        f.seek(1500)
+        self.assertEqual(bytes(f.read(10)), self.data[1500:1510])
+        f.seek(10)
+        self.assertEqual(f.read(10), self.data[10:20])
+        with self.assertRaises(ValueError):
+            f.read(500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import unittest
+import numpy as np
+import zlib
+import io
+from chunkindex.core.zran_index import create_index
+from chunkindex.core.read_planner import CostModel, plan_reads
+from chunkindex.util.shuffle import shuffle
+
+
+class TestReadPlanner(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Create some compressed data and its index with several index points
+        self.data = np.arange(1e6, dtype='float64')
+        self.compressed_data = zlib.compress(self.data.tobytes())
+        self.index = create_index(self.compressed_data, span=100 * 1024)
+        # One sample every 100000 samples, e.g. a pixel drill through a time series
+        self.ranges = np.array([[i * 8, i * 8 + 8] for i in range(0, 1000000, 100000)])
+
+    def test_plan_reads_latency(self):
+        # With a high latency, all the ranges are decompressed with a single read
+        plan = plan_reads(self.index, self.ranges, CostModel(latency=1, bandwidth=1e9, inflate_rate=1e9))
+        self.assertEqual(len(plan.reads), 1)
+        self.assertEqual(plan.requested_bytes, 80)
+        self.assertEqual(plan.inflated_bytes, self.ranges[-1, 1])
+
+    def test_plan_reads_bandwidth(self):
+        # With a low latency, each range is decompressed from its closest index point
+        plan = plan_reads(self.index, self.ranges, CostModel(latency=1e-6, bandwidth=1e6, inflate_rate=1e6))
+        self.assertEqual(len(plan.reads), len(self.ranges))
+        self.assertLess(plan.inflated_bytes, self.ranges[-1, 1] / 2)
+        self.assertLess(plan.cost, plan_reads(self.index, self.ranges, CostModel(latency=1, bandwidth=1e6,
+                                                                                 inflate_rate=1e6)).cost)
+        # The plan can be reported
+        self.assertIn(f"{len(self.ranges)} read(s)", str(plan))
+
+    def test_Index_decompress_ranges(self):
+        expected = self.data[::100000].tobytes()
+        for cost_model in (CostModel(latency=1), CostModel(latency=0)):
+            with io.BytesIO(self.compressed_data) as f:
+                data, plan = self.index.decompress_ranges(f, self.ranges, cost_model=cost_model)
+            self.assertEqual(data, expected)
+
+    def test_Index_decompress_ranges_shuffle(self):
+        compressed_data = zlib.compress(shuffle(self.data.tobytes(), 8))
+        index = create_index(compressed_data, span=100 * 1024)
+        ranges = np.array([[8, 80], [400000, 400800], [7999000, 8000000]])
+        expected = b''.join(self.data.tobytes()[a:b] for a, b in ranges)
+        for cost_model in (CostModel(latency=1), CostModel(latency=0)):
+            data, plan = index.decompress_ranges(compressed_data, ranges, shuffle=True, bps=8, cost_model=cost_model)
+            self.assertEqual(data, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import unittest
+import chunkindex
+import xarray as xr
+import os
+import numpy as np
+import contextlib
+import h5py
+import io
+import tracemalloc
+import asyncio
+import fsspec
+from fsspec.implementations.asyn_wrapper import AsyncFileSystemWrapper
+from chunkindex.core.reader import ChunkIndexReader, VariableInfo
+from chunkindex.core.read_planner import CostModel
+from chunkindex.tests.create_datasets import create_netcdf_dataset_test, create_netcdf_dataset_many_chunks
+
+
+class TestChunkIndexReader(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Create a test dataset and its index
+        self.dataset = create_netcdf_dataset_test()
+        self.index = self.dataset.parent.joinpath(str(self.dataset.stem) + '_index.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.index)
+        chunkindex.create_index(self.index, self.dataset)
+
+    def test_ChunkIndexReader_variable(self):
+        with open(self.dataset, 'rb') as ds:
+            with open(self.index, mode='rb') as index:
+                with ChunkIndexReader(ds, index) as reader:
+                    info = reader.variable('group_1/y')
+                    # The metadata is read only once
+                    self.assertIs(reader.variable('group_1/y'), info)
+
+        self.assertEqual(info.shape, (600, 600))
+        self.assertEqual(info.chunks, (300, 300))
+        self.assertEqual(info.chunk_grid, (2, 2))
+        self.assertEqual(info.dtype, np.dtype('int32'))
+        self.assertFalse(info.shuffle)
+        self.assertEqual((info.fillvalue, info.scale_factor, info.add_offset), (-999, 2, 100))
+        self.assertTrue(np.all(info.byte_offsets > 0))
+        self.assertTrue(np.all(info.byte_sizes > 0))
+
+    def test_ChunkIndexReader_read(self):
+        with open(self.dataset, 'rb') as ds:
+            with open(self.index, mode='rb') as index:
+                with ChunkIndexReader(ds, index) as reader:
+
+                    def check_read(var, nd_slice):
+                        data = reader.read(var, nd_slice)
+                        expected = xr.open_dataset(self.dataset)[var.split('/')[-1]][nd_slice].values
+                        self.assertTrue(np.allclose(data, expected, equal_nan=True))
+
+                    for var in ('x', 'y', 'group_1/x'):
+                        check_read(var, (slice(0, 1), slice(0, 10)))
+                        check_read(var, (slice(299, 301), slice(290, 350)))
+                        check_read(var, (slice(598, 600), slice(590, 600)))
+
+                    # The dataset is only opened to read the metadata of the variables
+                    reader.close()
+                    check_read('y', (slice(0, 20), slice(0, 5)))
+
+    def test_VariableInfo_from_index(self):
+        with h5py.File(self.dataset) as ds, h5py.File(self.index) as index:
+            for var in ('x', 'y', 'group_1/y'):
+                expected = VariableInfo.from_hdf5(ds[var])
+                info = VariableInfo.from_index(index[var])
+                for field in ('name', 'shape', 'chunks', 'dtype', 'shuffle', 'fill', 'fillvalue', 'scale_factor',
+                              'add_offset'):
+                    self.assertEqual(getattr(info, field), getattr(expected, field), f"{var}: {field}")
+                self.assertTrue(np.array_equal(info.byte_offsets, expected.byte_offsets))
+                self.assertTrue(np.array_equal(info.byte_sizes, expected.byte_sizes))
+
+    def test_ChunkIndexReader_read_metadata_index(self):
+        with open(self.dataset, 'rb') as ds:
+            with open(self.index, mode='rb') as index:
+                with ChunkIndexReader(ds, index, metadata='index') as reader:
+                    for var in ('x', 'y', 'group_1/x'):
+                        nd_slice = (slice(290, 310), slice(5, 400))
+                        data = reader.read(var, nd_slice)
+                        expected = xr.open_dataset(self.dataset)[var.split('/')[-1]][nd_slice].values
+                        self.assertTrue(np.allclose(data, expected, equal_nan=True))
+                    # The dataset has not been opened with h5py
+                    self.assertIsNone(reader.h5)
+
+        # The version 1 index files do not contain the metadata of the variables
+        index_v1 = self.dataset.parent.joinpath(str(self.dataset.stem) + '_index_v1.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(index_v1)
+        chunkindex.create_index(index_v1, self.dataset, version=1)
+        with ChunkIndexReader(self.dataset, index_v1, metadata='index') as reader:
+            with self.assertRaises(ValueError):
+                reader.variable('x')
+
+    def test_ChunkIndexReader_close(self):
+        nd_slice = ((290, 310), (10, 20))
+        # The index files opened by the cache of the reader are closed with the reader
+        with ChunkIndexReader(self.dataset, str(self.index)) as reader:
+            reader.read('x', nd_slice)
+            index_files = list(reader.cache.files.values())
+            self.assertTrue(index_files)
+        for index_file in index_files:
+            self.assertFalse(index_file.id.valid)
+
+        # But not those of a cache given by the caller
+        cache = chunkindex.IndexCache()
+        with ChunkIndexReader(self.dataset, str(self.index), cache=cache) as reader:
+            reader.read('x', nd_slice)
+        self.assertTrue(all(index_file.id.valid for index_file in cache.files.values()))
+        cache.clear()
+
+    def test_ChunkIndexReader_read_step(self):
+        with ChunkIndexReader(open(self.dataset, 'rb'), self.index) as reader:
+            for nd_slice in ((slice(3, 598, 7), slice(290, 310, 3)), (slice(None), slice(299, 300)),
+                             (slice(-5, None), slice(None, None, 50))):
+                for var in ('x', 'y'):
+                    data = reader.read(var, nd_slice)
+                    expected = xr.open_dataset(self.dataset)[var][nd_slice].values
+                    self.assertEqual(data.shape, expected.shape)
+                    self.assertTrue(np.allclose(data, expected, equal_nan=True))
+            reader.dataset.close()
+
+    def test_ChunkIndexReader_plans(self):
+        nd_slice = (slice(0, 600), slice(10, 11))
+        expected = xr.open_dataset(self.dataset).x[nd_slice].values
+        with open(self.dataset, 'rb') as ds:
+            for latency, several_reads in ((1, False), (0, True)):
+                with ChunkIndexReader(ds, self.index, cost_model=CostModel(latency=latency)) as reader:
+                    self.assertTrue(np.array_equal(reader.read('x', nd_slice), expected))
+                    # The plan of each chunk read is reported
+                    self.assertEqual(sorted(reader.plans), ['x/0.0', 'x/1.0'])
+                    # Without latency, the chunk is decompressed from each of its index points
+                    self.assertEqual(len(reader.plans['x/0.0'].reads) > 1, several_reads)
+
+    def test_ChunkIndexReader_max_gap(self):
+        nd_slice = (slice(0, 600), slice(10, 20))
+        expected = xr.open_dataset(self.dataset).y[nd_slice].values
+        for max_gap, merged in ((0, False), (10 ** 9, True)):
+            with ChunkIndexReader(self.dataset, self.index, max_gap=max_gap) as reader:
+                self.assertTrue(np.allclose(reader.read('y', nd_slice), expected, equal_nan=True))
+                n_reads = sum(len(plan.reads) for plan in reader.plans.values())
+                self.assertGreater(n_reads, 1)
+                # The compressed ranges of all the chunks are merged into a single read of the dataset
+                self.assertEqual(reader.range_reader.reads == 1, merged)
+
+    def test_ChunkIndexReader_max_workers(self):
+        nd_slice = (slice(100, 500), slice(250, 350))
+        for dataset in (self.dataset, io.BytesIO(self.dataset.read_bytes())):
+            with ChunkIndexReader(dataset, self.index, max_workers=4) as reader:
+                for var in ('x', 'y'):
+                    data = reader.read(var, nd_slice)
+                    expected = xr.open_dataset(self.dataset)[var][nd_slice].values
+                    self.assertTrue(np.allclose(data, expected, equal_nan=True))
+                    # The time spent in each stage is reported
+                    self.assertEqual(len(reader.plans), 4)
+                    for stage in ('metadata', 'intersection', 'index', 'read', 'decompress', 'assemble', 'total'):
+                        self.assertGreaterEqual(reader.timings[stage], 0)
+
+    def test_ChunkIndexReader_read_memory(self):
+        dataset = create_netcdf_dataset_many_chunks()
+        index = dataset.parent.joinpath(str(dataset.stem) + '_index.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(index)
+        chunkindex.create_index(index, dataset)
+
+        nd_slice = (slice(95, 105), slice(195, 205))
+        with open(dataset, 'rb') as ds:
+            with ChunkIndexReader(ds, index) as reader:
+                # Open the chunk indexes before measuring the memory used by the read
+                reader.read('x', nd_slice)
+                tracemalloc.start()
+                data = reader.read('x', nd_slice)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+        self.assertTrue(np.array_equal(data, xr.open_dataset(dataset).x[nd_slice].values))
+        # The peak memory depends on the size of the slice and of the chunks, not on the size of the variable
+        self.assertLess(peak, 4e6 / 10)
+
+    def test_read_slice_async(self):
+        fs = AsyncFileSystemWrapper(fsspec.filesystem('file'), asynchronous=True)
+        nd_slices = ((slice(290, 310), slice(5, 400)), (slice(3, 598, 7), slice(0, 1)))
+
+        async def read_all(var):
+            # Several slices are read concurrently
+            return await asyncio.gather(*[chunkindex.read_slice_async(str(self.dataset), self.index, var, nd_slice, fs)
+                                          for nd_slice in nd_slices])
+
+        for var in ('x', 'y', 'group_1/x'):
+            for nd_slice, data in zip(nd_slices, asyncio.run(read_all(var))):
+                expected = xr.open_dataset(self.dataset)[var.split('/')[-1]][nd_slice].values
+                self.assertTrue(np.allclose(data, expected, equal_nan=True))
+
+        # The plans and timings are reported as with read()
+        with ChunkIndexReader(str(self.dataset), self.index, metadata='index', max_workers=2, fs=fs) as reader:
+            data = asyncio.run(reader.read_async('x', (slice(100, 500), slice(250, 350))))
+            self.assertTrue(np.array_equal(data, xr.open_dataset(self.dataset).x[100:500, 250:350].values))
+            self.assertEqual(len(reader.plans), 4)
+            for stage in ('metadata', 'intersection', 'index', 'read', 'decompress', 'assemble', 'total'):
+                self.assertGreaterEqual(reader.timings[stage], 0)
+            self.assertIsNone(reader.h5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,9 @@
 #See the License for the specific language governing permissions and
 #limitations under the License.
 import unittest
-from chunkindex.util.shuffle import shuffle, unshuffle
+import numpy as np
+from chunkindex.util import shuffle as shuffle_module
+from chunkindex.util.shuffle import shuffle, unshuffle, shuffle_into, unshuffle_into
 
 
 class TestShuffle(unittest.TestCase):
@@ -27,6 +29,36 @@ class TestShuffle(unittest.TestCase):
             unshuffle(b'123456123456', 2),
             b'112233445566')
 
+    def test_unshuffle_into(self):
+        out = bytearray(12)
+        unshuffle_into(b'123456123456', 2, out)
+        self.assertEqual(out, b'112233445566')
+        # Unshuffle a range of samples of the planes into a view of a larger buffer
+        out = bytearray(b'xxxxxxxx')
+        unshuffle_into(b'123456123456', 2, memoryview(out)[2:6], offset=3)
+        self.assertEqual(out, b'xx4455xx')
+
+    def test_shuffle_into(self):
+        out = bytearray(12)
+        shuffle_into(b'112233445566', 2, out)
+        self.assertEqual(out, b'123456123456')
+        # Shuffle samples into a range of samples of the planes
+        out = bytearray(b'xxxxxxxxxxxx')
+        shuffle_into(b'4455', 2, out, offset=3)
+        self.assertEqual(out, b'xxx45xxxx45x')
+        with self.assertRaises(ValueError):
+            shuffle_into(b'4455', 2, out, offset=5)
+
+    def test_kernels_blocks(self):
+        # Buffers of several blocks of samples, with a partial last block
+        data = np.random.default_rng(0).integers(0, 256, 8 * (3 * shuffle_module.BLOCK_SAMPLES + 5), dtype='u1')
+        for bps in (2, 4, 8):
+            out = np.empty_like(data)
+            shuffle_into(data, bps, out)
+            self.assertEqual(out.tobytes(), shuffle(data, bps))
+            unshuffle_into(out, bps, out2 := np.empty_like(data))
+            self.assertTrue(np.array_equal(out2, data))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -86,6 +86,23 @@ class TestZranXarray(unittest.TestCase):
                 decompressed_data = np.frombuffer(decompressed_data, dtype='float64')
                 self.assertTrue(np.array_equal(decompressed_data, self.data[offset:offset + length]))
 
+    def test_ZranXarray_decompress_into(self):
+        # Create a zran index
+        index = zran_h5py.create_index(self.compressed_data, span=100 * 1024)
+        chunk_id = 'compressed_data/0.0'
+        # Write the zran_xarray index to the netcdf file
+        index.to_netcdf(self.index_path, group=chunk_id, mode="a", encoding=self.encoding)
+
+        # Open the zran_h5py index and decompress some data into a row of a result array
+        with open(self.index_path, mode='rb') as index:
+            zindex = zran_h5py.open_index(index, group=chunk_id)
+            offset = 100000
+            out = np.zeros((2, 10))
+            zindex.decompress_into(io.BytesIO(self.compressed_data), out[1], offset * 8, whence=0)
+
+        self.assertTrue(np.array_equal(out[1], self.data[offset:offset + 10]))
+        self.assertFalse(out[0].any())
+
 
 if __name__ == '__main__':
     unittest.main()
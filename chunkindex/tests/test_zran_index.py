@@ -12,10 +12,16 @@
 #See the License for the specific language governing permissions and
 #limitations under the License.
 import unittest
+import asyncio
+import fsspec
+from fsspec.implementations.asyn_wrapper import AsyncFileSystemWrapper
 import numpy as np
 import zlib
 import io
-from chunkindex.core.zran_index import Index, create_index
+import os
+import tempfile
+from chunkindex.core.zran_index import Index, ArrayIndex, InflateContext, create_index, inflate
+from chunkindex.util.shuffle import shuffle
 
 
 class TestZranIndex(unittest.TestCase):
@@ -63,6 +69,219 @@ class TestZranIndex(unittest.TestCase):
             decompressed_data = np.frombuffer(decompressed_data, dtype='float64')
             self.assertTrue(np.array_equal(decompressed_data, self.data[offset:offset + length]))
 
+    def test_ZranIndex_decompress_shuffle(self):
+        # Create a zran index of the shuffled data
+        compressed_data = zlib.compress(shuffle(self.data.tobytes(), 8))
+        index = create_index(compressed_data, span=100 * 1024)
+
+        class CountingBytesIO(io.BytesIO):
+            reads = 0
+
+            def read(self, *args):
+                CountingBytesIO.reads += 1
+                return super().read(*args)
+
+        for offset, length in ((0, 10), (123456, 1000), (999990, 10)):
+            CountingBytesIO.reads = 0
+            with CountingBytesIO(compressed_data) as f:
+                decompressed_data = index.decompress(f, offset * 8, length * 8, shuffle=True, bps=8)
+            self.assertTrue(np.array_equal(np.frombuffer(decompressed_data, dtype='float64'),
+                                           self.data[offset:offset + length]))
+            # The compressed data of the 8 byte planes is read with fewer reads than planes
+            self.assertLess(CountingBytesIO.reads, 8)
+
+    def test_ZranIndex_decompress_threads(self):
+        # Create a zran index with several index points
+        index = create_index(self.compressed_data, span=100 * 1024)
+        self.assertGreater(len(index.points), 2)
+
+        # The pieces of data between the index points are inflated in parallel
+        for offset, length in ((0, 1000000), (123456, 500000), (999990, 10)):
+            decompressed_data = index.decompress(self.compressed_data, offset * 8, length * 8, threads=4)
+            self.assertTrue(np.array_equal(np.frombuffer(decompressed_data, dtype='float64'),
+                                           self.data[offset:offset + length]))
+
+        # Same with the byte planes of shuffled data
+        compressed_data = zlib.compress(shuffle(self.data.tobytes(), 8))
+        index = create_index(compressed_data, span=100 * 1024)
+        decompressed_data = index.decompress(compressed_data, 8000, 8000000 - 16000, shuffle=True, bps=8, threads=4)
+        self.assertTrue(np.array_equal(np.frombuffer(decompressed_data, dtype='float64'), self.data[1000:-1000]))
+
+    def test_ZranIndex_decompress_into(self):
+        index = create_index(self.compressed_data, span=100 * 1024)
+        shuffled_data = zlib.compress(shuffle(self.data.tobytes(), 8))
+        shuffled_index = create_index(shuffled_data, span=100 * 1024)
+
+        for offset, length in ((0, 10), (123456, 1000), (999990, 10)):
+            for threads in (1, 4):
+                # Decompress into a view of a larger array
+                out = np.zeros(length + 2)
+                index.decompress_into(self.compressed_data, out[1:-1], offset * 8, threads=threads)
+                self.assertTrue(np.array_equal(out[1:-1], self.data[offset:offset + length]))
+                self.assertEqual((out[0], out[-1]), (0, 0))
+
+                # The shuffled data is un-shuffled into the buffer
+                out = bytearray(length * 8)
+                self.assertEqual(shuffled_index.decompress_into(shuffled_data, memoryview(out), offset * 8,
+                                                                shuffle=True, bps=8, threads=threads), length * 8)
+                self.assertTrue(np.array_equal(np.frombuffer(out, dtype='float64'), self.data[offset:offset + length]))
+
+        # The buffer must be contiguous
+        with self.assertRaises(ValueError):
+            index.decompress_into(self.compressed_data, np.zeros((10, 2))[:, 0], 0)
+
+    def test_ZranIndex_decompress_ranges_into(self):
+        shuffled_data = zlib.compress(shuffle(self.data.tobytes(), 8))
+        for compressed_data, shuffled in ((self.compressed_data, False), (shuffled_data, True)):
+            index = create_index(compressed_data, span=100 * 1024)
+            ranges = np.array([[10, 20], [5000, 5100], [900000, 900010]]) * 8
+            out = np.empty(120)
+            self.assertIs(index.decompress_ranges(compressed_data, ranges, shuffle=shuffled, bps=8, out=out)[0], out)
+            self.assertTrue(np.array_equal(out, np.concatenate([self.data[10:20], self.data[5000:5100],
+                                                                self.data[900000:900010]])))
+
+    def test_ArrayIndex(self):
+        index = create_index(self.compressed_data, span=100 * 1024)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for path in (None, os.path.join(tmp_dir, 'windows.npy')):
+                array_index = ArrayIndex.from_index(index, path=path)
+                self.assertEqual(array_index.outloc.dtype, np.int64)
+                if path is not None:
+                    # The windows are memory-mapped
+                    self.assertIsInstance(array_index.windows, np.memmap)
+
+                # The points are looked up at once, in any order
+                locs = [0, 5000000, 123456, 7999999, 123457]
+                for point, loc in zip(array_index.get_points(locs), locs):
+                    expected = index.get_point(loc)
+                    self.assertEqual((point.outloc, point.inloc, point.bits), (expected.outloc, expected.inloc,
+                                                                               expected.bits))
+                    self.assertEqual(bytes(point.window), bytes(expected.window))
+
+                for offset, length in ((0, 10), (123456, 1000), (999990, 10)):
+                    decompressed_data = array_index.decompress(self.compressed_data, offset * 8, length * 8)
+                    self.assertTrue(np.array_equal(np.frombuffer(decompressed_data, dtype='float64'),
+                                                   self.data[offset:offset + length]))
+                del array_index
+
+    def test_ArrayIndex_windows_read(self):
+        array_index = ArrayIndex.from_index(create_index(self.compressed_data, span=100 * 1024))
+        read_windows = array_index._read_windows
+        numbers = []
+
+        def count_windows(points):
+            numbers.extend(points)
+            return read_windows(points)
+
+        array_index._read_windows = count_windows
+        data = self.data.tobytes()
+        # With several threads, only the windows of the points that start the pieces are read, once each
+        offset, length = 123456, 400000
+        pieces = len([o for o in array_index.outloc if offset < o < offset + length]) + 1
+        self.assertEqual(array_index.decompress(self.compressed_data, offset, length, threads=2),
+                         data[offset:offset + length])
+        self.assertEqual(len(numbers), pieces)
+        numbers.clear()
+        out = bytearray(length)
+        array_index.decompress_into(self.compressed_data, out, offset, threads=2)
+        self.assertEqual(bytes(out), data[offset:offset + length])
+        self.assertEqual(len(numbers), pieces)
+
+    def test_InflateContext(self):
+        index = create_index(self.compressed_data, span=100 * 1024)
+        point = index.points[2]
+        # The context of a point is reused by the reads from that point
+        context = index.inflate_context(point)
+        self.assertIsInstance(context, InflateContext)
+        for offset in (100, 10, 5000):
+            data = index.decompress(self.compressed_data, point.outloc + offset, 80)
+            self.assertEqual(data, self.data.tobytes()[point.outloc + offset:point.outloc + offset + 80])
+            self.assertIs(index.inflate_context(point), context)
+        # The number of contexts kept is bounded, the context of a point used all along is kept
+        self.assertGreater(len(index.points), 20)
+        for other in index.points:
+            index.inflate_context(other)
+            self.assertIs(index.inflate_context(point), context)
+        self.assertLessEqual(len(index.contexts), 16)
+        self.assertIn(int(point.outloc), index.contexts)
+
+    def test_InflateCursor(self):
+        index = create_index(self.compressed_data, span=100 * 1024)
+        data = self.data.tobytes()
+        with io.BytesIO(self.compressed_data) as f:
+            cursor = index.cursor(f, whence=0)
+            # The sequential reads continue the decompression: only the new bytes are inflated
+            for offset in range(0, 800000, 8000):
+                self.assertEqual(cursor.read(offset, 8000), data[offset:offset + 8000])
+            self.assertEqual(cursor.restarts, 1)
+            self.assertEqual(cursor.inflated_bytes, 800000)
+            # A read before the position restarts from the closest index point
+            self.assertEqual(cursor.read(96, 16), data[96:112])
+            self.assertEqual(cursor.restarts, 2)
+            # So does a read after an index point beyond the position
+            self.assertEqual(cursor.read(len(data) - 16, 16), data[-16:])
+            self.assertEqual(cursor.restarts, 3)
+            self.assertLess(cursor.inflated_bytes, 800000 + 112 + 2 * 100 * 1024)
+
+        # With shuffled data, each byte plane has its own cursor
+        compressed_data = zlib.compress(shuffle(data, 8))
+        cursor = create_index(compressed_data, span=100 * 1024).cursor(compressed_data, shuffle=True, bps=8)
+        for offset in range(0, 80000, 8000):
+            self.assertEqual(cursor.read(offset, 8000), data[offset:offset + 8000])
+        self.assertEqual(cursor.read(8000000 - 800, 800), data[-800:])
+
+    def test_InflateCursor_end_of_data(self):
+        index = create_index(self.compressed_data, span=100 * 1024)
+        data = self.data.tobytes()
+        # The reads at or after the end of the data are empty, and the reads across it are short
+        cursor = index.cursor(self.compressed_data)
+        self.assertEqual(cursor.read(len(data) + 100, 8), b'')
+        self.assertEqual(cursor.read(len(data), 8), b'')
+        self.assertEqual(cursor.read(len(data) - 4, 8), data[-4:])
+        # So are the reads after the end of truncated compressed data, here between two index points
+        truncated = self.compressed_data[:int(index.points[1].inloc) + 8000]
+        cursor = index.cursor(truncated)
+        self.assertEqual(cursor.read(int(index.points[2].outloc) - 16, 16), b'')
+        self.assertEqual(cursor.read(0, 16), data[:16])
+
+        # With shuffled data, the byte planes are read up to the end of the data
+        compressed_data = zlib.compress(shuffle(data, 8))
+        cursor = create_index(compressed_data, span=100 * 1024).cursor(compressed_data, shuffle=True, bps=8)
+        self.assertEqual(cursor.read(len(data) - 80, 800), data[-80:])
+        self.assertEqual(cursor.read(len(data) + 800, 800), b'')
+
+    def test_inflate(self):
+        # Random data compressed with stored blocks, with index points in the middle of bytes
+        rng = np.random.default_rng(0)
+        data = shuffle(np.cumsum(rng.normal(size=500000)).tobytes(), 8)
+        compressed_data = zlib.compress(data, 1)
+        index = create_index(compressed_data, span=200 * 1024)
+        self.assertTrue(any(p.bits > 0 for p in index.points))
+
+        # Inflate the data with zlib from each index point
+        for point in index.points:
+            decompressed_data = inflate(compressed_data[point.inloc - int(point.bits > 0):], point.bits, point.window,
+                                        100, 100000)
+            self.assertEqual(decompressed_data, data[point.outloc + 100:point.outloc + 100100])
+
+    def test_ZranIndex_decompress_async(self):
+        # Write the shuffled compressed data after a header, in a file read through an asynchronous filesystem
+        compressed_data = zlib.compress(shuffle(self.data.tobytes(), 8))
+        index = create_index(compressed_data, span=100 * 1024)
+        fs = AsyncFileSystemWrapper(fsspec.filesystem('memory'), asynchronous=True)
+        fs.sync_fs.pipe_file('/chunk.bin', b'header' + compressed_data)
+
+        async def read_all():
+            # All the slices are decompressed concurrently
+            return await asyncio.gather(*[index.decompress_async(fs, '/chunk.bin', offset * 8, length * 8, base=6,
+                                                                 shuffle=True, bps=8)
+                                          for offset, length in ((0, 10), (123456, 1000), (999990, 10))])
+
+        for (offset, length), decompressed_data in zip(((0, 10), (123456, 1000), (999990, 10)),
+                                                       asyncio.run(read_all())):
+            self.assertTrue(np.array_equal(np.frombuffer(decompressed_data, dtype='float64'),
+                                           self.data[offset:offset + length]))
+
 
 if __name__ == '__main__':
     unittest.main()
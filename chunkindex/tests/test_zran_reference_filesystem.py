@@ -15,9 +15,14 @@ import unittest
 import chunkindex
 import numpy as np
 import zarr
+import json
+import base64
+import xarray as xr
 import os
 import contextlib
-from chunkindex.tests.create_datasets import create_netcdf_dataset_test, create_kerchunk_index
+import tracemalloc
+from chunkindex.tests.create_datasets import create_netcdf_dataset_test, create_kerchunk_index, \
+    create_references
 
 
 class TestZranReferenceFileSystem(unittest.TestCase):
@@ -95,6 +100,159 @@ class TestZranReferenceFileSystem(unittest.TestCase):
         # print(ds.x[-1, -n:])
         self.assertTrue(np.array_equal(decompressed_data, ds.x[-1, -n:]))
 
+    def test_ZranReferenceFileSystem_get_partial_slice(self):
+        ds = zarr.open(self.fs.get_mapper())
+        data = self.fs.get_partial_slice('x/1.0', (slice(10, 20, 3), slice(295, 300)))
+        self.assertTrue(np.array_equal(data, ds.x[310:320:3, 295:300]))
+
+    def test_ZranReferenceFileSystem_caches(self):
+        ds = zarr.open(self.fs.get_mapper())
+        for method in ('xarray', 'h5py'):
+            fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=str(self.kerchunk), method=method)
+            for var in ('x', 'group_1/x'):
+                for chunk in ('0.0', '1.1'):
+                    for start in range(0, 100, 10):
+                        data = np.frombuffer(fs.get_partial_values(f"{var}/{chunk}", start * 4, 40), dtype='int32')
+                        row, col = (0, 0) if chunk == '0.0' else (300, 300)
+                        self.assertTrue(np.array_equal(data, ds[var][row, col + start:col + start + 10]))
+            # The metadata, the chunk indexes and the dataset file are only opened once
+            self.assertEqual(fs.cache_stats, {'metadata_hits': 38, 'metadata_misses': 2, 'file_hits': 39,
+                                              'file_misses': 1, 'index_hits': 36, 'index_misses': 4})
+            fs.clear_caches()
+
+    def test_ZranReferenceFileSystem_evicted_file(self):
+        fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=str(self.kerchunk), max_files=1)
+        url, chunk_start, _ = fs._cat_common('x/0.0')
+        with fs.open_dataset_file(None, url) as reader:
+            # Another file evicts the file from the cache while it is read: it is closed after its last use
+            with fs.open_dataset_file(None, str(self.kerchunk)):
+                self.assertEqual(list(fs.file_cache), [(None, str(self.kerchunk))])
+            self.assertFalse(reader.file.closed)
+            self.assertEqual(len(reader.read(chunk_start, 100)), 100)
+        self.assertTrue(reader.file.closed)
+        fs.clear_caches()
+
+    @staticmethod
+    def count_cat_ranges(fs) -> list:
+        # Record the number of ranges of each cat_ranges() call to the underlying filesystems
+        calls = []
+        for proto_fs in fs.fss.values():
+            def cat_ranges(paths, *args, f=proto_fs.cat_ranges, **kwargs):
+                calls.append(len(paths))
+                return f(paths, *args, **kwargs)
+            proto_fs.cat_ranges = cat_ranges
+        return calls
+
+    def test_ZranReferenceFileSystem_get_partial_values_batch(self):
+        requests = [('x/0.0', 0, 40), ('x/1.1', 400, 4000), ('group_1/x/0.1', 1000, 40), ('x/0.0', 80000, 400),
+                    ('x/1.0', 359960, 40)]
+        expected = [self.fs.get_partial_values(*request) for request in requests]
+
+        # Count the calls to the underlying filesystem
+        fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=str(self.kerchunk), method='h5py')
+        calls = self.count_cat_ranges(fs)
+
+        self.assertEqual(fs.get_partial_values_batch(requests), expected)
+        # The compressed ranges of all the requests are fetched with a single call
+        self.assertEqual(len(calls), 1)
+
+        # The ranges separated by more than max_gap bytes are not merged
+        for max_gap, merged in ((0, False), (10 ** 9, True)):
+            fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=str(self.kerchunk), max_gap=max_gap)
+            calls = self.count_cat_ranges(fs)
+            self.assertEqual(fs.get_partial_values_batch(requests), expected)
+            self.assertEqual(calls == [1], merged)
+
+    def test_ZranReferenceFileSystem_inline_chunks(self):
+        # Inline the compressed data of a chunk in the references, as kerchunk does for the small chunks
+        with open(self.kerchunk) as f:
+            refs = json.load(f)
+        url, start, size = refs['refs']['x/0.0']
+        with open(url, 'rb') as f:
+            f.seek(start)
+            refs['refs']['x/0.0'] = 'base64:' + base64.b64encode(f.read(size)).decode()
+        fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=refs)
+
+        # The inlined chunk is decompressed with its index, as the other chunks
+        requests = [('x/0.0', 400, 40), ('x/0.1', 400, 40), ('x/0.0', 200000, 4000)]
+        expected = [self.fs.get_partial_values(*request) for request in requests]
+        self.assertEqual(fs.get_partial_values_batch(requests), expected)
+        self.assertEqual(fs.get_partial_values('x/0.0', 400, 40), expected[0])
+
+        # The negative offsets and the None lengths of the store requests apply to the inlined chunks
+        store = chunkindex.ZranStore(fs.get_mapper())
+        results = store.get_partial_values([('x/0.0', (-400, None)), ('x/0.0', (359000, None)), ('x/0.0', (-40, 8))])
+        self.assertEqual(results, [self.fs.get_partial_values('x/0.0', 360000 - 400, 400),
+                                   self.fs.get_partial_values('x/0.0', 359000, 1000),
+                                   self.fs.get_partial_values('x/0.0', 360000 - 40, 8)])
+        fs.clear_caches()
+        self.assertIsNone(fs.executor)
+
+    def test_ZranStore_get_partial_values(self):
+        store = chunkindex.ZranStore(self.fs.get_mapper())
+        inputs = [(f"{var}/{chunk}", (start, 4000)) for var in ('x', 'group_1/x')
+                  for chunk in ('0.0', '0.1', '1.0', '1.1') for start in range(0, 360000 - 4000, 24000)]
+        inputs += [('x/0.0', (-400, None)), ('x/9.9', (0, 40))]
+        # Open the chunk indexes before measuring the memory kept by the call
+        store.get_partial_values(inputs)
+
+        # One buffer per input, in the order of the inputs, None for the missing chunks
+        tracemalloc.start()
+        results = store.get_partial_values(inputs)
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(len(results), len(inputs))
+        for (key, (start, length)), result in zip(inputs[:-2], results):
+            self.assertEqual(result, self.fs.get_partial_values(key, start, length))
+        self.assertEqual(results[-2], self.fs.get_partial_values('x/0.0', 360000 - 400, 400))
+        self.assertIsNone(results[-1])
+
+        # The data is decompressed directly into the buffers returned: joining them into a single bytes object, as
+        # done before, would keep one more copy of the data and allocate another one
+        total = sum(len(result) for result in results[:-1])
+        self.assertLess(retained, 1.1 * total)
+
+    def test_ZranReferenceFileSystem_virtual_chunks(self):
+        fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=str(self.kerchunk), virtual_chunk_size=40000)
+        # The chunks of 300 x 300 samples are presented as virtual chunks of 30 x 300 samples, i.e. 36000 bytes
+        self.assertEqual(fs.virtual_chunks('x'), (30, 300))
+        self.assertEqual(fs.physical_chunk('x/13.1'), ('x/1.1', 90 * 300 * 4, 30 * 300 * 4))
+        self.assertIsNone(fs.physical_chunk('x/.zattrs'))
+
+        ds = zarr.open(fs.get_mapper(), mode='r')
+        expected = xr.open_dataset(self.dataset, mask_and_scale=False)
+        for var in ('x', 'group_1/x'):
+            self.assertEqual(ds[var].chunks, (30, 300))
+            self.assertIsNone(ds[var].compressor)
+            self.assertTrue(np.array_equal(ds[var][:], expected.x.values))
+            self.assertTrue(np.array_equal(ds[var][295:305, 3:9], expected.x[295:305, 3:9].values))
+
+        # The virtual chunks are ranges of the uncompressed chunks of the dataset
+        self.assertEqual(fs.cat('x/13.1'), self.fs.get_partial_values('x/1.1', 108000, 36000))
+        self.assertEqual(fs.get_partial_values('x/13.1', 400, 40), self.fs.get_partial_values('x/1.1', 108400, 40))
+        self.assertEqual(fs.get_partial_values_batch([('x/13.1', -40, None)]),
+                         [self.fs.get_partial_values('x/1.1', 144000 - 40, 40)])
+        # The missing virtual chunks are reported as the missing chunks
+        out = fs.cat(['x/99.0', 'x/.zattrs'], on_error='return')
+        self.assertIsInstance(out['x/99.0'], FileNotFoundError)
+        self.assertEqual(out['x/.zattrs'], self.fs.cat('x/.zattrs'))
+
+    def test_ZranReferenceFileSystem_virtual_chunks_consolidated(self):
+        refs = create_references(self.dataset, consolidated=True)
+        fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=refs, virtual_chunk_size=40000)
+
+        # The consolidated metadata present the virtual chunks as the .zarray of the variables
+        zmetadata = json.loads(fs.cat('.zmetadata'))['metadata']
+        for var in ('x', 'y', 'group_1/x'):
+            self.assertEqual(zmetadata[var + '/.zarray'], json.loads(fs.cat(var + '/.zarray')))
+            self.assertIsNone(zmetadata[var + '/.zarray']['compressor'])
+
+        ds = zarr.open_consolidated(fs.get_mapper(), mode='r')
+        expected = xr.open_dataset(self.dataset, mask_and_scale=False)
+        for var in ('x', 'y', 'group_1/x'):
+            self.assertEqual(ds[var].chunks, (30, 300))
+            self.assertTrue(np.array_equal(ds[var][295:305, 3:9], expected[var.split('/')[-1]][295:305, 3:9].values))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -15,6 +15,8 @@ import unittest
 import numpy as np
 import zlib
 import io
+import os
+import tempfile
 from chunkindex.core import zran_xarray
 
 
@@ -53,6 +55,26 @@ class TestZranXarray(unittest.TestCase):
             decompressed_data = np.frombuffer(decompressed_data, dtype='float64')
             self.assertTrue(np.array_equal(decompressed_data, self.data[offset:offset + length]))
 
+    def test_ZranXarray_decompress_into(self):
+        index = zran_xarray.create_index(self.compressed_data, span=100 * 1024)
+
+        # Decompress into a row of a result array
+        offset = int(index.outloc[-1] / 8) + 1
+        out = np.zeros((2, 10))
+        index.decompress_into(self.compressed_data, out[1], offset * 8)
+        self.assertTrue(np.array_equal(out[1], self.data[offset:offset + 10]))
+        self.assertFalse(out[0].any())
+
+    def test_ZranXarray_open_index(self):
+        index = zran_xarray.create_index(self.compressed_data, span=100 * 1024)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # A chunk index written alone is opened without group
+            path = os.path.join(tmp_dir, 'index.nc')
+            index.to_netcdf(path)
+            with zran_xarray.open_index(path) as zindex:
+                decompressed_data = zindex.decompress(self.compressed_data, offset=800000, length=80)
+                self.assertTrue(np.array_equal(np.frombuffer(decompressed_data, 'float64'), self.data[100000:100010]))
+
 
 if __name__ == '__main__':
     unittest.main()
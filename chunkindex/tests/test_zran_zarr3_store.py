@@ -0,0 +1,122 @@
+#Copyright 2025 Centre National d'Etudes Spatiales
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+import unittest
+import asyncio
+import json
+import chunkindex
+import numpy as np
+import xarray as xr
+import zarr
+import os
+import contextlib
+from chunkindex.tests.create_datasets import create_netcdf_dataset_test, create_references
+
+ZARR3 = int(zarr.__version__.split('.')[0]) >= 3
+if ZARR3:
+    from zarr.abc.store import RangeByteRequest, OffsetByteRequest, SuffixByteRequest
+    from zarr.core.buffer import default_buffer_prototype
+
+
+@unittest.skipUnless(ZARR3, "the zarr v3 store API requires zarr >= 3")
+class TestZranStoreV3(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Create a test dataset, its references and its zran index
+        self.dataset = create_netcdf_dataset_test()
+        self.references = create_references(self.dataset, consolidated=True)
+        self.index = self.dataset.parent.joinpath(str(self.dataset.stem) + '_index.nc')
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.index)
+        chunkindex.create_index(self.index, self.dataset)
+
+        self.fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=self.references)
+        self.store = chunkindex.ZranStoreV3(self.fs)
+        self.expected = xr.open_dataset(self.dataset, mask_and_scale=False)
+
+    def get(self, key, byte_range=None):
+        data = asyncio.run(self.store.get(key, default_buffer_prototype(), byte_range))
+        return None if data is None else data.to_bytes()
+
+    def test_ZranStoreV3_open_group(self):
+        # The chunks are read decompressed by zarr
+        for consolidated in (False, True):
+            group = zarr.open_group(self.store, mode='r', zarr_format=2, use_consolidated=consolidated)
+            for var in ('x', 'y', 'group_1/x'):
+                self.assertIsNone(group[var].metadata.compressor)
+                self.assertTrue(np.array_equal(group[var][290:310, 5:400],
+                                               self.expected[var.split('/')[-1]][290:310, 5:400].values))
+            self.assertIn('group_1', [name for name, _ in group.groups()])
+
+    def test_ZranStoreV3_get(self):
+        # A chunk is presented uncompressed
+        chunk = self.get('x/0.1')
+        self.assertEqual(chunk, self.expected.x[0:300, 300:600].values.tobytes())
+
+        # The byte ranges of a chunk are slices of the chunk, decompressed alone
+        for byte_range, expected in ((RangeByteRequest(400, 800), chunk[400:800]),
+                                     (OffsetByteRequest(359000), chunk[359000:]),
+                                     (SuffixByteRequest(40), chunk[-40:]),
+                                     (SuffixByteRequest(10 ** 6), chunk),
+                                     (RangeByteRequest(359990, 360100), chunk[359990:])):
+            self.assertEqual(self.get('x/0.1', byte_range), expected)
+
+        # The metadata are presented without the compression of the chunks
+        zarray = json.loads(self.get('x/.zarray'))
+        self.assertEqual((zarray['compressor'], zarray['filters']), (None, None))
+        self.assertEqual(self.get('x/.zarray', RangeByteRequest(0, 10)), self.get('x/.zarray')[:10])
+        zmetadata = json.loads(self.get('.zmetadata'))
+        self.assertEqual(zmetadata['metadata']['group_1/x/.zarray']['filters'], None)
+        self.assertIsNone(self.get('x/9.9'))
+
+    def test_ZranStoreV3_get_partial_values(self):
+        key_ranges = [(f"{var}/{chunk}", RangeByteRequest(start, start + 4000)) for var in ('x', 'group_1/x')
+                      for chunk in ('0.0', '1.1') for start in range(0, 360000 - 4000, 60000)]
+        key_ranges += [('x/.zarray', None), ('x/.zarray', RangeByteRequest(0, 10)), ('x/9.9', RangeByteRequest(0, 4)),
+                       ('y/1.0', None)]
+
+        results = asyncio.run(self.store.get_partial_values(default_buffer_prototype(), key_ranges))
+        self.assertEqual(len(results), len(key_ranges))
+        for (key, byte_range), result in zip(key_ranges[:-4], results):
+            self.assertEqual(result.to_bytes(), self.fs.get_partial_values(key, byte_range.start, 4000))
+        zarray = self.get('x/.zarray')
+        self.assertEqual(results[-4].to_bytes(), zarray)
+        self.assertEqual(results[-3].to_bytes(), zarray[:10])
+        self.assertIsNone(results[-2])
+        self.assertEqual(results[-1].to_bytes(), self.expected.y[300:600, 0:300].values.tobytes())
+
+    def test_ZranStoreV3_virtual_chunks(self):
+        # xarray reads the virtual chunks of the variables
+        fs = chunkindex.ZranReferenceFileSystem(index=self.index, fo=self.references, virtual_chunk_size=40000)
+        ds = xr.open_zarr(chunkindex.ZranStoreV3(fs), zarr_format=2, consolidated=False, mask_and_scale=False,
+                          chunks=None)
+        self.assertEqual(ds.x.encoding['chunks'], (30, 300))
+        self.assertTrue(np.array_equal(ds.x[290:310, 5:400].values, self.expected.x[290:310, 5:400].values))
+
+    def test_ZranStoreV3_list(self):
+        async def collect(iterator):
+            return [key async for key in iterator]
+
+        self.assertTrue(asyncio.run(self.store.exists('x/0.0')))
+        self.assertFalse(asyncio.run(self.store.exists('x/9.9')))
+        self.assertEqual(sorted(asyncio.run(collect(self.store.list()))), sorted(self.fs.references))
+        self.assertIn('group_1/x/.zarray', asyncio.run(collect(self.store.list_prefix('group_1/'))))
+        self.assertEqual(sorted(asyncio.run(collect(self.store.list_dir('group_1/x')))),
+                         sorted(['.zarray', '.zattrs', '0.0', '0.1', '1.0', '1.1']))
+        # The store is read-only
+        with self.assertRaises(ValueError):
+            asyncio.run(self.store.delete('x/0.0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,6 +13,7 @@
 #limitations under the License.
 import math
 from typing import Iterable
+import numpy as np
 
 
 def slice_intersection(s: slice, o: slice) -> slice:
@@ -92,3 +93,171 @@ class MultiDimensionalSlice(tuple):
 
         # Return the slice overlap
         return MultiDimensionalSlice([slice_intersection(s, o) for s, o in zip(self, other)])
+
+
+def _resolve(nd_slice: Iterable[slice], shape: Iterable[int]) -> tuple[list[range], list[int]]:
+    # Return the indices selected along each dimension and the row-major strides of the array (in samples)
+    shape = [int(n) for n in shape]
+    ranges = [range(*s.indices(n)) for s, n in zip(nd_slice, shape)]
+    if len(ranges) != len(shape):
+        raise ValueError('Dimension mismatch')
+    if any(r.step <= 0 for r in ranges):
+        raise NotImplementedError('Only slices with a positive step are supported')
+    strides = [math.prod(shape[d + 1:]) for d in range(len(shape))]
+    return ranges, strides
+
+
+def linear_offset_bounds(nd_slice: Iterable[slice], shape: Iterable[int]) -> tuple[int, int]:
+    """
+    Return the first and last (excluded) row-major linear offsets of the samples of a multidimensional slice in an
+    array.
+
+    The bounds are computed from the first and last samples of the slice only: O(number of dimensions).
+
+    :param nd_slice: the multidimensional slice in the array
+    :param shape: the shape of the array
+    :return: the offsets (start, stop) in samples, (0, 0) if the slice is empty.
+    """
+    ranges, strides = _resolve(nd_slice, shape)
+    if any(len(r) == 0 for r in ranges):
+        return 0, 0
+    first = sum(r[0] * st for r, st in zip(ranges, strides))
+    last = sum(r[-1] * st for r, st in zip(ranges, strides))
+    return first, last + 1
+
+
+def linear_offset_ranges(nd_slice: Iterable[slice], shape: Iterable[int]) -> np.ndarray:
+    """
+    Return the row-major linear offset ranges of the samples of a multidimensional slice in an array.
+
+    Each range is a run of contiguous samples. The innermost dimensions fully covered by the slice are merged into a
+    single run, so that the number of ranges is the number of samples of the slice divided by the length of the runs.
+
+    Example: the slice [1:3, 2:4] of an array of shape (4, 5) gives the ranges [[7, 9], [12, 14]].
+
+    :param nd_slice: the multidimensional slice in the array
+    :param shape: the shape of the array
+    :return: an array of shape (n, 2) of the offsets (start, stop) of the ranges in samples, in increasing order.
+    """
+    shape = [int(n) for n in shape]
+    ranges, strides = _resolve(nd_slice, shape)
+    if any(len(r) == 0 for r in ranges):
+        return np.empty((0, 2), dtype='i8')
+
+    # Merge the innermost dimensions fully covered by the slice
+    d = len(ranges) - 1
+    run = 1
+    while d >= 0 and ranges[d] == range(shape[d]):
+        run *= len(ranges[d])
+        d -= 1
+
+    # A dimension with a step of 1 makes contiguous runs with the merged dimensions
+    base = 0
+    if d >= 0 and ranges[d].step == 1:
+        base = ranges[d].start * strides[d]
+        run *= len(ranges[d])
+        d -= 1
+
+    # Offsets of the runs: all the combinations of the indices of the outer dimensions
+    starts = np.full(1, base, dtype='i8')
+    for r, st in zip(ranges[:d + 1], strides[:d + 1]):
+        starts = np.add.outer(starts, np.arange(r.start, r.stop, r.step, dtype='i8') * st).ravel()
+
+    # Merge the runs that follow each other, e.g. the last and first rows of two consecutive planes
+    stops = starts + run
+    keep = np.ones(len(starts), dtype=bool)
+    keep[1:] = starts[1:] != stops[:-1]
+    return np.stack([starts[keep], stops[np.append(keep[1:], True)]], axis=1)
+
+
+def slice_view(samples: np.ndarray, nd_slice: Iterable[slice], shape: Iterable[int]) -> np.ndarray:
+    """
+    Return a read-only view, with the shape of a multidimensional slice, of the samples of an array read between the
+    bounds given by linear_offset_bounds(), without copy.
+
+    :param samples: the 1D array of the samples from the first to the last sample of the slice
+    :param nd_slice: the multidimensional slice in the array
+    :param shape: the shape of the array
+    :return: the view of the samples of the slice
+    """
+    ranges, strides = _resolve(nd_slice, shape)
+    return np.lib.stride_tricks.as_strided(samples, shape=[len(r) for r in ranges],
+                                           strides=[st * r.step * samples.itemsize for r, st in zip(ranges, strides)],
+                                           writeable=False)
+
+
+def chunk_intersections(nd_slice: Iterable[slice], shape: Iterable[int],
+                        chunks: Iterable[int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the chunks of a chunked array that intersect a multidimensional slice, with the location of the samples of
+    the slice in each chunk and in the array of the slice.
+
+    The chunks are computed from the chunk grid, dimension by dimension: the cost depends on the number of chunks
+    touched by the slice, not on the number of chunks of the array.
+
+    :param nd_slice: the multidimensional slice in the array
+    :param shape: the shape of the array
+    :param chunks: the shape of the chunks
+    :return: three arrays, for the n chunks that intersect the slice in row-major order:
+        - the location of the chunks in the chunk grid, of shape (n, ndim)
+        - the (start, stop, step) of the slice in each chunk, of shape (n, ndim, 3)
+        - the (start, stop) of the samples of each chunk in the array of the slice, of shape (n, ndim, 2)
+    """
+    ranges, _ = _resolve(nd_slice, shape)
+    chunks = [int(c) for c in chunks]
+
+    # Compute the intersections along each dimension
+    per_dim = []
+    for r, cs in zip(ranges, chunks):
+        if len(r) == 0:
+            ndim = len(ranges)
+            return np.empty((0, ndim), 'i8'), np.empty((0, ndim, 3), 'i8'), np.empty((0, ndim, 2), 'i8')
+        coords = np.arange(r.start // cs, r[-1] // cs + 1, dtype='i8')
+        chunk_start = coords * cs
+        # First sample of the slice in each chunk and number of samples of the slice in the chunk
+        first = r.start + np.maximum(0, -(-(chunk_start - r.start) // r.step)) * r.step
+        end = np.minimum(chunk_start + cs, r.stop)
+        count = np.where(first < end, (end - first - 1) // r.step + 1, 0)
+        # Skip the chunks between two samples of a slice with a step greater than the chunks
+        keep = count > 0
+        coords, chunk_start, first, count = coords[keep], chunk_start[keep], first[keep], count[keep]
+        out_start = (first - r.start) // r.step
+        per_dim.append((coords, np.stack([first - chunk_start, first - chunk_start + (count - 1) * r.step + 1,
+                                          np.full_like(first, r.step)], axis=1),
+                        np.stack([out_start, out_start + count], axis=1)))
+
+    # Combine the dimensions: the chunks touched are all the combinations of the chunks touched along each dimension
+    grid = [g.ravel() for g in np.meshgrid(*[np.arange(len(d[0])) for d in per_dim], indexing='ij')]
+    chunk_coords = np.stack([d[0][g] for d, g in zip(per_dim, grid)], axis=1)
+    in_chunk = np.stack([d[1][g] for d, g in zip(per_dim, grid)], axis=1)
+    in_out = np.stack([d[2][g] for d, g in zip(per_dim, grid)], axis=1)
+    return chunk_coords, in_chunk, in_out
+
+
+def virtual_chunk_shape(chunks: Iterable[int], itemsize: int, max_size: int) -> tuple[int, ...]:
+    """
+    Return the shape of the largest virtual chunks of at most max_size bytes that split a chunk into contiguous ranges
+    of its row-major samples.
+
+    A virtual chunk is contiguous in the chunk when it spans the whole chunk along the dimensions after a given
+    dimension and one sample along the dimensions before it. Its size along that dimension divides the size of the
+    chunk, so that the virtual chunks also tile the chunk grid of the array.
+
+    :param chunks: the shape of the chunks
+    :param itemsize: the size of the samples (in bytes)
+    :param max_size: the maximum size of the virtual chunks (in bytes), a single row of samples being kept if it is
+    larger
+    :return: the shape of the virtual chunks, the shape of the chunks if they are not larger than max_size
+    """
+    chunks = [int(c) for c in chunks]
+    for d in range(len(chunks)):
+        row_size = math.prod(chunks[d + 1:]) * itemsize
+        if row_size * chunks[d] <= max_size:
+            break
+        if row_size <= max_size or d == len(chunks) - 1:
+            # Largest divisor of the chunk size that fits in max_size
+            n = max(1, max_size // row_size)
+            while chunks[d] % n:
+                n -= 1
+            return tuple([1] * d + [n] + chunks[d + 1:])
+    return tuple(chunks)
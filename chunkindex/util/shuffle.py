@@ -13,6 +13,9 @@
 #limitations under the License.
 import numpy as np
 
+BLOCK_SAMPLES = 65536  # number of samples (un)shuffled at once by the kernels, to keep the blocks in the CPU cache
+TRANSPOSE_BYTES = 4096  # below this size, a single transposed copy is faster than the copy of each plane
+
 
 def shuffle(barray, shuffle_opt):
     """
@@ -50,3 +53,61 @@ def unshuffle(barray, shuffle_opt):
     # Reshape the array to 1D reading line by line, i.e. the first sample, then the second, etc. 
     array = np.reshape(array, (1, -1)).squeeze().tobytes()
     return array
+
+
+def _planes_and_samples(shuffled, samples, bps: int, offset: int, count: int | None) -> tuple[np.ndarray, np.ndarray]:
+    # Return the byte planes of the shuffled buffer as an array of shape (bps, n), and the samples of the unshuffled
+    # buffer as an array of shape (count, bps), checking the range [offset, offset + count) of samples in the planes
+    planes = np.frombuffer(shuffled, dtype='u1').reshape(bps, -1)
+    samples = np.frombuffer(samples, dtype='u1').reshape(-1, bps)
+    if count is None:
+        count = len(samples)
+    if len(samples) != count or offset < 0 or offset + count > planes.shape[1]:
+        raise ValueError(f"Invalid range of samples [{offset}, {offset + count}) for planes of "
+                         f"{planes.shape[1]} samples and a buffer of {len(samples)} samples")
+    return planes[:, offset:offset + count], samples
+
+
+def unshuffle_into(barray, bps: int, out, offset: int = 0, count: int = None) -> None:
+    """
+    Apply byte-unshuffle to a range of samples of the input binary array, writing the samples into out.
+
+    The bytes are copied plane by plane, by blocks of samples that fit in the CPU cache, without any intermediate copy.
+
+    :param barray: input binary array: bps byte planes of the same number of samples
+    :param bps:    number of bytes per sample
+    :param out:    writable C-contiguous buffer (bytearray, memoryview, numpy array...) of count * bps bytes
+    :param offset: the first sample to unshuffle in each plane
+    :param count:  the number of samples to unshuffle. Default: the number of samples of out
+    """
+    planes, samples = _planes_and_samples(barray, out, bps, offset, count)
+    if samples.nbytes <= TRANSPOSE_BYTES:
+        samples[:] = planes.T
+        return
+    for start in range(0, len(samples), BLOCK_SAMPLES):
+        block = samples[start:start + BLOCK_SAMPLES]
+        for i in range(bps):
+            block[:, i] = planes[i, start:start + BLOCK_SAMPLES]
+
+
+def shuffle_into(barray, bps: int, out, offset: int = 0, count: int = None) -> None:
+    """
+    Apply byte-shuffle to the input binary array, writing the bytes into a range of samples of the planes of out.
+
+    This is the reverse of unshuffle_into(): the bytes are copied plane by plane, by blocks of samples that fit in the
+    CPU cache.
+
+    :param barray: input binary array of count * bps bytes
+    :param bps:    number of bytes per sample
+    :param out:    writable C-contiguous buffer of bps byte planes of the same number of samples
+    :param offset: the first sample to write in each plane
+    :param count:  the number of samples to shuffle. Default: the number of samples of barray
+    """
+    planes, samples = _planes_and_samples(out, barray, bps, offset, count)
+    if samples.nbytes <= TRANSPOSE_BYTES:
+        planes[:] = samples.T
+        return
+    for start in range(0, len(samples), BLOCK_SAMPLES):
+        block = samples[start:start + BLOCK_SAMPLES]
+        for i in range(bps):
+            planes[i, start:start + BLOCK_SAMPLES] = block[:, i]